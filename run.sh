@@ -4,6 +4,7 @@ SOURCE_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )"
 LOG_PATH="${SOURCE_DIR}"
 DRIVER_PATH="${SOURCE_DIR}/src/drivers"
 
-nohup unbuffer python3 $DRIVER_PATH/mya-nee.py | tee $LOG_PATH/mya-nee.log &
+# mya-nee rotates its own log (see "logFile" in config.json), stderr only gets warnings, errors and crashes
+nohup python3 $DRIVER_PATH/mya-nee.py > /dev/null 2> $LOG_PATH/mya-nee.stderr.log &
 nohup unbuffer python3 $DRIVER_PATH/mya-nee-telegram.py | tee $LOG_PATH/mya-nee-telegram.log &
 
@@ -3,6 +3,7 @@ import discord
 
 # --- STL Imports ---
 import importlib.util
+import importlib
 import asyncio
 import pathlib
 import json
@@ -19,45 +20,84 @@ myanee      = importlib.util.module_from_spec( moduleSpec )
 
 sys.modules[moduleSpec.name] = myanee
 moduleSpec.loader.exec_module( myanee )
+importlib.import_module( "myanee.metrics" )
+importlib.import_module( "myanee.logstream" )
 
 
 
-while True:
+# Worker processes (see YoutubeDLPool) import this script as well, but only need the module above
+if __name__ == "__main__":
 
-    # Discord client setup
-    configuration = {}
+    # Logging and prometheus metrics are set up for as long as the process runs, across reboots
     with open( rootPath / "config.json", 'r' ) as configFile:
         configuration = json.load( configFile )
 
-    discordClient = discord.Client()
-    root          = myanee.MyaNee.MyaNee()
-
-    @discordClient.event
-    async def on_ready():
-        await root.initialize( discordClient, configuration["prefix"] )
-
-    @discordClient.event
-    async def on_message( message: discord.Message ):
-        await root.onMessage( message )
-
-    @discordClient.event
-    async def on_voice_state_update( member: discord.Member, before: discord.VoiceState, after: discord.VoiceState ):
-        if before.channel != None and after.channel == None:
-            await root.onChannelLeave( before.channel, member )
-
-        elif before.channel == None and after.channel != None:
-            await root.onChannelJoin( after.channel, member )
-
-    # Run
-    root.log( "run" )
-    discordClient.run( configuration["token"] )
-    root.log( "stop" )
-
-    root.release()
-
-    # Decide what to do after stopping
-    if root.status == "rebooting": # restart the event loop and redefine everything
-        asyncio.set_event_loop( asyncio.new_event_loop() )
-    else: # terminate
-        root.log( "terminate" )
-        break
\ No newline at end of file
+    # Logs are written by a thread of their own: to a rotating json lines file if configured, and to stderr
+    # (only warnings and errors if there is a file)
+    logSinks = []
+    if configuration.get( "logFile", "" ):
+        logSinks.append( myanee.logstream.RotatingFileSink(
+            rootPath / configuration["logFile"],
+            maxBytes = int( configuration.get("logMaxBytes", 16 * 2**20) ),
+            backupCount = int( configuration.get("logBackups", 5) ),
+            level = myanee.stream.DEBUG if configuration.get( "logDebug", False ) else myanee.stream.INFO
+        ) )
+    logSinks.append( myanee.logstream.ConsoleSink(level=myanee.stream.WARNING if logSinks else myanee.stream.INFO) )
+    logWriter = myanee.logstream.LogWriter( logSinks )
+
+    metricsPort = configuration.get( "metricsPort", 0 )
+    if metricsPort:
+        metricsServer = myanee.metrics.MetricsServer( myanee.metrics.registry, metricsPort )
+        metricsServer.start()
+
+
+
+    while True:
+
+        # Discord client setup
+        configuration = {}
+        with open( rootPath / "config.json", 'r' ) as configFile:
+            configuration = json.load( configFile )
+
+        discordClient = discord.Client()
+        root          = myanee.MyaNee.MyaNee( logWriter )
+
+        @discordClient.event
+        async def on_ready():
+            await root.initialize(
+                discordClient,
+                configuration["prefix"],
+                downloadCacheSize = configuration.get( "downloadCacheSize", None ),
+                downloadRateLimit = configuration.get( "downloadRateLimit", None ),
+                numberOfDownloads = configuration.get( "numberOfDownloads", 2 ),
+                audioMixer = configuration.get( "audioMixer", False ),
+                crossfade = configuration.get( "crossfade", 0.0 )
+            )
+
+        @discordClient.event
+        async def on_message( message: discord.Message ):
+            await root.onMessage( message )
+
+        @discordClient.event
+        async def on_voice_state_update( member: discord.Member, before: discord.VoiceState, after: discord.VoiceState ):
+            if before.channel != None and after.channel == None:
+                await root.onChannelLeave( before.channel, member )
+
+            elif before.channel == None and after.channel != None:
+                await root.onChannelJoin( after.channel, member )
+
+        # Run
+        root.log( "run" )
+        discordClient.run( configuration["token"] )
+        root.log( "stop" )
+
+        root.release()
+
+        # Decide what to do after stopping
+        if root.status == "rebooting": # restart the event loop and redefine everything
+            asyncio.set_event_loop( asyncio.new_event_loop() )
+        else: # terminate
+            root.log( "terminate" )
+            break
+
+    logWriter.close()
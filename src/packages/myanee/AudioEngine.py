@@ -0,0 +1,299 @@
+# --- External Imports ---
+import discord
+import numpy
+
+# --- STL Imports ---
+import collections
+import threading
+
+
+class Deck:
+    """An audio source feeding the AudioEngine, read a few frames ahead of playback.
+    Opus sources (see OggOpusSource) are decoded to PCM so that they can be mixed."""
+
+    __slots__ = ("source", "tag", "buffer", "isExhausted", "envelope", "envelopePosition", "_decoder",
+                 "_stateLock", "_isFilling", "_isReleased")
+
+    def __init__(self, source: discord.AudioSource, tag=None):
+        self.source           = source
+        self.tag              = tag
+        self.buffer           = collections.deque() # int16 frames
+        self.isExhausted      = False
+        self.envelope         = None                # gain of each remaining sample during a fade
+        self.envelopePosition = 0
+        self._decoder         = discord.opus.Decoder() if source.is_opus() else None
+        self._stateLock       = threading.Lock()    # guards the flags below, never held while reading
+        self._isFilling       = False
+        self._isReleased      = False
+
+
+    def fill(self, numberOfFrames: int, maxReads: int):
+        """Read frames from the source until 'numberOfFrames' are buffered, at most 'maxReads' of them.
+        Reading may block (e.g.: on ffmpeg's pipe), so this is called without holding the engine's lock;
+        a deck that is cleaned up in the meantime releases its source once the read returns."""
+        with self._stateLock:
+            if self._isReleased:
+                return
+            self._isFilling = True
+
+        try:
+            while not self.isExhausted and len(self.buffer) < numberOfFrames and 0 < maxReads:
+                maxReads -= 1
+                data = self.source.read()
+                if data and self._decoder != None:
+                    data = self._decoder.decode(data)
+
+                if len(data) == AudioEngine.frameSize:
+                    self.buffer.append(numpy.frombuffer(data, dtype=numpy.int16))
+                else: # ffmpeg sources end with an empty read instead of an incomplete frame
+                    self.isExhausted = True
+        finally:
+            with self._stateLock:
+                self._isFilling = False
+                isReleased = self._isReleased
+            if isReleased:
+                self.source.cleanup()
+
+
+    def pop(self):
+        """Next buffered frame with the envelope applied (float32 while fading), or None if there is none"""
+        if not self.buffer:
+            return None
+
+        frame = self.buffer.popleft()
+        if self.envelope is None:
+            return frame
+
+        begin = self.envelopePosition
+        self.envelopePosition += AudioEngine.samplesPerFrame
+        gains = self.envelope[begin:self.envelopePosition]
+        return (frame.reshape(-1, AudioEngine.channels) * gains[:, None]).reshape(-1)
+
+
+    def fade(self, numberOfFrames: int, fadeIn: bool):
+        """Fade in or out over the next frames (equal power, so crossfades keep the loudness)"""
+        numberOfSamples = max(numberOfFrames, 1) * AudioEngine.samplesPerFrame
+        phase = numpy.linspace(0.0, numpy.pi / 2.0, numberOfSamples, dtype=numpy.float32)
+        self.envelope         = numpy.sin(phase) if fadeIn else numpy.cos(phase)
+        self.envelopePosition = 0
+
+
+    @property
+    def isFadeOver(self):
+        return self.envelope is not None and len(self.envelope) <= self.envelopePosition
+
+
+    @property
+    def isFinished(self):
+        return self.isExhausted and not self.buffer
+
+
+    def cleanup(self):
+        """Release the source, or let fill do it if it is reading from it right now"""
+        with self._stateLock:
+            if self._isReleased:
+                return
+            self._isReleased = True
+            if self._isFilling:
+                return
+        self.source.cleanup()
+
+
+
+
+class AudioEngine(discord.AudioSource):
+    """An audio source that mixes frames of several decoders in-process, so that one voice client
+    plays everything without being restarted:
+        - the current track, which continues with the next one (see setNext) either gaplessly
+          or crossfaded over the last 'crossfade' seconds
+        - overlays (e.g.: soundboard clips), which are mixed on top of the current track
+
+    read is called by discord's player thread, the other methods may be called from any thread
+    (they don't wait for sources to be read, see Deck.fill).
+    'onStarted' is called with the tag of each deck that the engine continues with (see setNext),
+    and 'onFinished' with the tag of each deck that stops being the current one (except by stop),
+    on whatever thread caused it.
+    The engine outlives the players of the voice client, so cleanup doesn't release anything (see stop)."""
+
+    samplingRate    = 48000
+    channels        = 2
+    samplesPerFrame = 960                                 # per channel (20 ms)
+    frameSize       = samplesPerFrame * channels * 2      # bytes of a 16 bit PCM frame
+
+    # Frames over which a skipped track fades out
+    skipFadeFrames = 5
+
+    def __init__(self,
+                 crossfade=0.0,
+                 onStarted: callable=None,
+                 onFinished: callable=None):
+        self._crossfadeFrames = int(crossfade * self.samplingRate / self.samplesPerFrame)
+        self._onStarted       = onStarted
+        self._onFinished      = onFinished
+        self._lock            = threading.Lock()
+        self._current         = None # deck of the current track
+        self._next            = None # deck that follows the current one
+        self._fading          = []   # decks that fade out
+        self._overlays        = []
+        self._silence         = bytes(self.frameSize)
+
+
+    def play(self, source: discord.AudioSource, tag=None):
+        """Replace the current track with a source right away (taking it over if it was set as the next one)"""
+        with self._lock:
+            if self._next != None and self._next.source is source:
+                self._next = None
+            finished = self.retire(self._current)
+            self._current = Deck(source, tag=tag)
+        self.notify([], finished)
+
+
+    def setNext(self, source: discord.AudioSource, tag=None):
+        """Set the source that follows the current track (None unsets it)"""
+        with self._lock:
+            if self._next != None:
+                self._next.cleanup()
+            self._next = Deck(source, tag=tag) if source != None else None
+
+
+    def overlay(self, source: discord.AudioSource):
+        """Mix a source on top of whatever is playing"""
+        with self._lock:
+            self._overlays.append(Deck(source))
+
+
+    def skip(self):
+        """Fade out the current track and continue with the next one (if any)"""
+        with self._lock:
+            finished = self.retire(self._current)
+            self._current = None
+            started, _ = self.advance()
+        self.notify(started, finished)
+
+
+    def stop(self):
+        """Stop everything without calling back"""
+        with self._lock:
+            decks = [self._current, self._next] + self._fading + self._overlays
+            self._current, self._next, self._fading, self._overlays = None, None, [], []
+        for deck in decks:
+            if deck != None:
+                deck.cleanup()
+
+
+    def retire(self, deck: Deck):
+        """Fade out a deck that is replaced, and return its tag to report it finished"""
+        if deck == None:
+            return []
+        deck.fade(self.skipFadeFrames, fadeIn=False)
+        self._fading.append(deck)
+        return [deck.tag]
+
+
+    def advance(self):
+        """Start the next deck if the current one is (about to be) finished.
+        Returns the tags of the started and finished decks."""
+        if self._next == None:
+            return [], []
+
+        finished = []
+        if self._current != None:
+            remaining = len(self._current.buffer)
+            if not self._current.isExhausted or self._crossfadeFrames < remaining:
+                return [], []
+            if remaining: # crossfade over the rest of the current track
+                self._current.fade(remaining, fadeIn=False)
+                self._fading.append(self._current)
+                self._next.fade(remaining, fadeIn=True)
+            else:
+                self._current.cleanup()
+            finished.append(self._current.tag)
+
+        self._current, self._next = self._next, None
+        return [self._current.tag], finished
+
+
+    def read(self):
+        # Frames are read from the sources outside the lock, since that may block (e.g.: on ffmpeg's pipe)
+        # and the lock is only taken to change which decks play
+        with self._lock:
+            current, following = self._current, self._next
+            decks = self._fading + self._overlays
+
+        if current != None:
+            # Read ahead to know when the crossfade has to start (catching up twice as fast as playback)
+            current.fill(self._crossfadeFrames + 1, 2)
+        if following != None and (current == None or current.isExhausted): # about to continue with it
+            following.fill(1, 1)
+        for deck in decks:
+            deck.fill(1, 1)
+
+        with self._lock:
+            finished = []
+
+            if self._current != None:
+                if self._current.isFinished and self._next == None:
+                    finished.append(self._current.tag)
+                    self._current.cleanup()
+                    self._current = None
+
+            started, advanced = self.advance()
+            finished += advanced
+
+            frames = []
+            for deck in [self._current] + self._fading + self._overlays:
+                if deck != None:
+                    frame = deck.pop()
+                    if frame is not None:
+                        frames.append(frame)
+
+            # Drop the decks that are done
+            for deck in [deck for deck in self._fading if deck.isFinished or deck.isFadeOver]:
+                self._fading.remove(deck)
+                deck.cleanup()
+            for deck in [deck for deck in self._overlays if deck.isFinished]:
+                self._overlays.remove(deck)
+                deck.cleanup()
+            if self._current != None and self._current.isFadeOver:
+                self._current.envelope = None
+
+            isIdle = self.isIdle
+
+        self.notify(started, finished)
+
+        if not frames:
+            return b"" if isIdle else self._silence
+        elif len(frames) == 1 and frames[0].dtype == numpy.int16:
+            return frames[0].tobytes() # nothing to mix
+        else:
+            mixed = numpy.sum(frames, axis=0, dtype=numpy.float32)
+            return numpy.clip(mixed, -32768.0, 32767.0).astype(numpy.int16).tobytes()
+
+
+    def notify(self, started: list, finished: list):
+        for tag in finished:
+            if self._onFinished != None:
+                self._onFinished(tag)
+        for tag in started:
+            if self._onStarted != None:
+                self._onStarted(tag)
+
+
+    def is_opus(self):
+        return False
+
+
+    def cleanup(self):
+        pass
+
+
+    @property
+    def isIdle(self):
+        """Whether there is nothing to play (the player stops then)"""
+        return self._current == None and self._next == None and not self._fading and not self._overlays
+
+
+    @property
+    def currentTag(self):
+        current = self._current
+        return current.tag if current != None else None
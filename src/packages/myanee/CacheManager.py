@@ -0,0 +1,233 @@
+# --- STL Imports ---
+import threading
+import asyncio
+import json
+import time
+import os
+
+# --- Internal Imports ---
+from .TrackList import TrackList
+from .Track import Track
+from .Loggee import Loggee
+from .stream import Stream
+from .utilities import URLUtilities
+
+
+class CacheManager(Loggee):
+    """Keep the files in the directory of a TrackList (and its subdirectories) within 'budget' bytes by deleting the tracks that are least worth keeping.
+    Tracks are ranked by plays per byte, decayed by the time since their last play (see score).
+    Files derived from a track (e.g.: its opus copy, see OpusCache) are listed by 'relatedFiles'; they count towards the size of the track and are deleted with it.
+    Tracks for which 'isProtected' returns True (queued or playing) and files younger than 'gracePeriod' seconds are never evicted.
+    Evicted tracks with a url leave a tombstone behind, so they keep their statistics if they are downloaded again (see restore)."""
+
+    def __init__(self,
+                 trackList: TrackList,
+                 logStream: Stream,
+                 budget: int,
+                 isProtected: callable=None,
+                 relatedFiles: callable=None,
+                 halfLife=30*24*3600.0,
+                 gracePeriod=3600.0,
+                 checkDelay=5.0,
+                 clock=time.time):
+        Loggee.__init__(self, logStream, name="CacheManager")
+        self._trackList     = trackList
+        self._budget        = budget
+        self._isProtected   = isProtected if isProtected != None else (lambda track: False)
+        self._relatedFiles  = relatedFiles if relatedFiles != None else (lambda track: [])
+        self._halfLife      = halfLife
+        self._gracePeriod   = gracePeriod
+        self._checkDelay    = checkDelay
+        self._clock         = clock
+
+        self._loop          = None
+        self._checkHandle   = None
+        self._task          = None
+
+        # cache key of the url => dict of an evicted track
+        self._tombstonePath = trackList.directory / "evicted_tracks.json"
+        self._tombstones    = {}
+        self._writeLock     = threading.Lock() # one write of the file at a time
+        self._writeTask     = None
+        self._isDirty       = False            # whether the tombstones changed since the last write started
+        if self._tombstonePath.is_file():
+            with open(self._tombstonePath, 'r') as file:
+                self._tombstones = json.load(file)
+
+
+    def start(self):
+        """Check the budget on the running event loop now and whenever a track is added"""
+        self._loop = asyncio.get_running_loop()
+        self._trackList.addListener(self)
+        self.scheduleCheck(0.0)
+
+
+    def stop(self):
+        if self._loop != None:
+            self._trackList.removeListener(self)
+            if self._checkHandle != None:
+                self._checkHandle.cancel()
+                self._checkHandle = None
+            self._loop = None
+
+
+    def scheduleCheck(self, delay: float):
+        """Run enforce after 'delay' seconds unless a check is scheduled already"""
+        if self._loop != None and self._checkHandle == None:
+            self._checkHandle = self._loop.call_later(delay, self.onCheck)
+
+
+    def onCheck(self):
+        self._checkHandle = None
+        if self._task == None or self._task.done():
+            self._task = self._loop.create_task(self.enforce())
+
+
+    async def enforce(self):
+        """Evict tracks until the directory fits into the budget. Returns the evicted tracks."""
+        loop = asyncio.get_running_loop()
+        files, total = await loop.run_in_executor(None, self.scan)
+        if total <= self._budget:
+            return []
+
+        victims = self.selectVictims(files, total - self._budget)
+        filePaths = []
+        for track in victims:
+            filePaths.append(track.filePathString)
+            filePaths += [str(filePath) for filePath in self._relatedFiles(track)]
+            self.evict(track)
+
+        if victims:
+            await loop.run_in_executor(None, self.deleteFiles, filePaths)
+            await asyncio.shield(self.saveTombstones())
+            self.log("evicted {} tracks from {}".format(len(victims), self._trackList.directory))
+
+        return victims
+
+
+    def scan(self):
+        """Return (file path, size, modification time) of all files in the directory and its subdirectories, and their total size"""
+        files = []
+        directories = [self._trackList.directory]
+        while directories:
+            try:
+                with os.scandir(directories.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                directories.append(entry.path)
+                            elif entry.is_file():
+                                status = entry.stat()
+                                files.append((entry.path, status.st_size, status.st_mtime))
+                        except OSError:
+                            pass
+            except OSError: # removed in the meantime
+                pass
+        return files, sum(size for filePath, size, modified in files)
+
+
+    def selectVictims(self, files: list, excess: int):
+        """Pick the lowest scoring tracks until their sizes (including their related files) add up to 'excess' bytes"""
+        now = self._clock()
+        sizes = {filePath : size for filePath, size, modified in files}
+        candidates = []
+        for filePath, size, modified in files:
+            track = self._trackList.getTrackByFilePath(filePath)
+            if track != None and modified + self._gracePeriod < now and not self._isProtected(track):
+                size += sum(sizes.get(str(relatedPath), 0) for relatedPath in self._relatedFiles(track))
+                candidates.append((self.score(track, size, now, self._halfLife), size, track))
+
+        candidates.sort(key=lambda item: item[0])
+
+        victims = []
+        for score, size, track in candidates:
+            if excess <= 0:
+                break
+            victims.append(track)
+            excess -= size
+        return victims
+
+
+    def evict(self, track: Track):
+        """Remove a track from the list and remember it if it can be downloaded again"""
+        if track.hasURL():
+            self._tombstones[URLUtilities.cacheKey(track.url)] = track.dict()
+        self._trackList.removeTrack(track)
+
+
+    def restore(self, url: str):
+        """Return the dict of an evicted track with a matching url or None.
+        The tombstone is kept until the track was downloaded again (see forget)."""
+        return self._tombstones.get(URLUtilities.cacheKey(url), None)
+
+
+    def forget(self, url: str):
+        """Drop the tombstone of a track whose file exists again"""
+        data = self._tombstones.pop(URLUtilities.cacheKey(url), None)
+        if data != None and self._loop != None:
+            self.saveTombstones()
+
+
+    def saveTombstones(self):
+        """Write the tombstones off the event loop and return the task doing it.
+        Changes made while a write is running are written by the same task afterwards."""
+        self._isDirty = True
+        if self._writeTask == None or self._writeTask.done():
+            self._writeTask = asyncio.get_running_loop().create_task(self.writeChanges())
+        return self._writeTask
+
+
+    async def writeChanges(self):
+        loop = asyncio.get_running_loop()
+        while self._isDirty:
+            self._isDirty = False
+            await loop.run_in_executor(None, self.writeTombstones, dict(self._tombstones))
+
+
+    def writeTombstones(self, tombstones: dict):
+        """Replace the file with a snapshot of the tombstones, so it is never left half written"""
+        temporaryPath = self._tombstonePath.with_name(self._tombstonePath.name + ".tmp")
+        with self._writeLock:
+            with open(temporaryPath, 'w') as file:
+                json.dump(tombstones, file, indent="    ")
+            os.replace(temporaryPath, self._tombstonePath)
+
+
+    @staticmethod
+    def deleteFiles(filePaths: list):
+        for filePath in filePaths:
+            try:
+                os.remove(filePath)
+            except FileNotFoundError:
+                pass
+
+
+    @staticmethod
+    def score(track: Track, size: int, now: float, halfLife: float):
+        """Value of keeping a track per byte: plays, halved for every 'halfLife' seconds since the last one"""
+        age = max(0.0, now - track.lastPlayedTimeStamp)
+        return (1.0 + track.playCount) * 0.5 ** (age / halfLife) / max(size, 1)
+
+
+    # TrackList listener interface
+
+    def onTrackAdded(self, track: Track):
+        self.scheduleCheck(self._checkDelay)
+
+
+    def onTrackRemoved(self, track: Track):
+        pass
+
+
+    def onTrackUpdated(self, track: Track):
+        pass
+
+
+    @property
+    def budget(self):
+        return self._budget
+
+
+    @property
+    def numberOfTombstones(self):
+        return len(self._tombstones)
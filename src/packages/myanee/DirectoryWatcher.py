@@ -0,0 +1,218 @@
+# --- STL Imports ---
+import pathlib
+import asyncio
+import ctypes
+import ctypes.util
+import struct
+import os
+
+# --- Internal Imports ---
+from .Loggee import Loggee
+from .stream import Stream
+
+
+class DirectoryWatcher(Loggee):
+    """Report files that get created, deleted or renamed in a directory (non-recursive).
+    Uses inotify where available and falls back to polling the directory otherwise.
+    Callbacks are invoked on the event loop:
+        - onCreated(filePath)
+        - onDeleted(filePath)
+        - onMoved(sourcePath, targetPath)
+        - onOverflow(): events were lost, the whole directory should be rescanned
+    """
+
+    # inotify constants from <sys/inotify.h>
+    IN_CLOSE_WRITE  = 0x00000008
+    IN_MOVED_FROM   = 0x00000040
+    IN_MOVED_TO     = 0x00000080
+    IN_DELETE       = 0x00000200
+    IN_Q_OVERFLOW   = 0x00004000
+    IN_ISDIR        = 0x40000000
+    IN_NONBLOCK     = 0o00004000
+    IN_CLOEXEC      = 0o02000000
+
+    _eventHeader = struct.Struct("iIII")
+
+    def __init__(self,
+                 directory: pathlib.Path,
+                 logStream: Stream,
+                 onCreated=None,
+                 onDeleted=None,
+                 onMoved=None,
+                 onOverflow=None,
+                 pollInterval=5.0,
+                 usePolling=False):
+        Loggee.__init__(self, logStream, name="DirectoryWatcher")
+        self._directory    = pathlib.Path(directory)
+        self._onCreated    = onCreated
+        self._onDeleted    = onDeleted
+        self._onMoved      = onMoved
+        self._onOverflow   = onOverflow
+        self._pollInterval = pollInterval
+        self._usePolling   = usePolling
+
+        self._loop         = None
+        self._fileDescriptor = None
+        self._pendingMoves = {} # cookie => source path of IN_MOVED_FROM events waiting for their IN_MOVED_TO
+        self._pollTask     = None
+
+
+    async def start(self):
+        """Start watching on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+
+        if not self._usePolling and self.startINotify():
+            self.log("watching {} with inotify".format(self._directory))
+        else:
+            self.log("polling {} every {} seconds".format(self._directory, self._pollInterval))
+            self._pollTask = self._loop.create_task(self.poll())
+
+
+    def stop(self):
+        if self._fileDescriptor != None:
+            self._loop.remove_reader(self._fileDescriptor)
+            os.close(self._fileDescriptor)
+            self._fileDescriptor = None
+
+        if self._pollTask != None:
+            self._pollTask.cancel()
+            self._pollTask = None
+
+
+    def startINotify(self):
+        """Try setting up an inotify watch and return whether it succeeded"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fileDescriptor = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if fileDescriptor < 0:
+                return False
+
+            watchDescriptor = libc.inotify_add_watch(
+                fileDescriptor,
+                os.fsencode(str(self._directory)),
+                self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_DELETE
+            )
+            if watchDescriptor < 0:
+                os.close(fileDescriptor)
+                return False
+
+        except (OSError, AttributeError):
+            return False
+
+        self._fileDescriptor = fileDescriptor
+        self._loop.add_reader(fileDescriptor, self.readINotify)
+        return True
+
+
+    def readINotify(self):
+        try:
+            buffer = os.read(self._fileDescriptor, 0x10000)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(buffer):
+            watchDescriptor, mask, cookie, length = self._eventHeader.unpack_from(buffer, offset)
+            offset += self._eventHeader.size
+            name = buffer[offset:offset+length].rstrip(b'\0')
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                self.log("event queue overflow in {}".format(self._directory))
+                self.notify(self._onOverflow)
+                continue
+
+            if mask & self.IN_ISDIR or not name:
+                continue
+
+            filePath = self._directory / os.fsdecode(name)
+            if mask & self.IN_MOVED_FROM:
+                self._pendingMoves[cookie] = filePath
+            elif mask & self.IN_MOVED_TO:
+                sourcePath = self._pendingMoves.pop(cookie, None)
+                if sourcePath != None:
+                    self.notify(self._onMoved, sourcePath, filePath)
+                else: # moved in from somewhere else
+                    self.notify(self._onCreated, filePath)
+            elif mask & self.IN_CLOSE_WRITE:
+                self.notify(self._onCreated, filePath)
+            elif mask & self.IN_DELETE:
+                self.notify(self._onDeleted, filePath)
+
+        # The two halves of a rename usually arrive in the same read,
+        # give stragglers a moment before treating them as deletions
+        if self._pendingMoves:
+            self._loop.call_later(0.1, self.flushPendingMoves, set(self._pendingMoves.keys()))
+
+
+    def flushPendingMoves(self, cookies: set):
+        """Sources of renames whose targets never showed up were moved out of the directory"""
+        for cookie in cookies:
+            sourcePath = self._pendingMoves.pop(cookie, None)
+            if sourcePath != None:
+                self.notify(self._onDeleted, sourcePath)
+
+
+    async def poll(self):
+        """Diff the directory contents whenever its modification time changes"""
+        lastModified = None
+        snapshot     = None
+
+        while True:
+            try:
+                modified = os.stat(self._directory).st_mtime_ns
+            except OSError:
+                modified = None
+
+            if modified != lastModified:
+                lastModified = modified
+                current = await self._loop.run_in_executor(None, self.scan)
+                if snapshot != None:
+                    self.diff(snapshot, current)
+                snapshot = current
+
+            await asyncio.sleep(self._pollInterval)
+
+
+    def scan(self):
+        """Map file names to inode numbers"""
+        try:
+            with os.scandir(self._directory) as entries:
+                return {entry.name : entry.inode() for entry in entries if entry.is_file()}
+        except OSError:
+            return {}
+
+
+    def diff(self, old: dict, new: dict):
+        removed = {name : inode for name, inode in old.items() if not name in new}
+        added   = {name : inode for name, inode in new.items() if not name in old}
+
+        # A file that disappeared and reappeared with the same inode was renamed
+        removedByInode = {inode : name for name, inode in removed.items()}
+        for name, inode in added.items():
+            sourceName = removedByInode.pop(inode, None)
+            if sourceName != None:
+                self.notify(self._onMoved, self._directory / sourceName, self._directory / name)
+            else:
+                self.notify(self._onCreated, self._directory / name)
+
+        for name in removedByInode.values():
+            self.notify(self._onDeleted, self._directory / name)
+
+
+    def notify(self, callback: callable, *args):
+        if callback != None:
+            try:
+                callback(*args)
+            except Exception as exception:
+                self.log("error while handling event in {}\n{}".format(self._directory, exception))
+
+
+    @property
+    def directory(self):
+        return self._directory
+
+
+    @property
+    def isPolling(self):
+        return self._pollTask != None
@@ -1,120 +1,324 @@
 # --- External Imports ---
-import yt_dlp as youtube_dl
+from yt_dlp.utils import DownloadCancelled
 
 # --- STL Imports ---
 import pathlib
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import time
 
 # --- Internal Imports ---
-from .utilities import YOUTUBE_DL_OPTIONS, DOWNLOAD_DIR, URLUtilities
+from .utilities import YOUTUBE_DL_OPTIONS, DOWNLOAD_DIR, DATA_DIR, URLUtilities
+from .URLInfoCache import URLInfoCache
+from .YoutubeDLPool import YoutubeDLPool
+from .GrowingFileReader import GrowingFileReader
 from .Loggee import Loggee
 from .stream import Stream
-from .Track import Track
+from . import metrics
 
 
-class DownloadManager(Loggee):
+DOWNLOADS_QUEUED    = metrics.registry.gauge("myanee_downloads_queued", "Downloads waiting for a worker")
+DOWNLOADS_ACTIVE    = metrics.registry.gauge("myanee_downloads_active", "Downloads in progress")
+DOWNLOAD_DURATION   = metrics.registry.histogram("myanee_download_duration_seconds", "Time a worker spent on a successful download")
+DOWNLOAD_FAILURES   = metrics.registry.counter("myanee_download_failures_total", "Downloads that failed (not counting cancelled ones)")
+DOWNLOAD_BYTES      = metrics.registry.counter("myanee_download_bytes_total", "Size of the finished downloads")
+
 
-    def __init__(self, logStream: Stream):
+class DownloadManager(Loggee):
+    """Download youtube urls with a fixed number of concurrent workers.
+    Each url has a single future that every caller requesting it shares, and the downloads and
+    metadata queries run in a pool of youtube_dl processes (see YoutubeDLPool)."""
+
+    def __init__(self,
+                 logStream: Stream,
+                 numberOfWorkers=2,
+                 pool: YoutubeDLPool=None,
+                 infoCache: URLInfoCache=None,
+                 rateLimit=None):
+        """'numberOfWorkers' bounds the number of simultaneous downloads, and 'rateLimit' the bytes per second
+        they may take up together (unlimited if None or 0). One manager is meant to serve the whole process."""
         Loggee.__init__(self, logStream, name="DownloadManager")
-        self._queue = []
-        self._current = ""
+        self._ownsInfoCache   = infoCache == None
+        self._infoCache       = infoCache if infoCache != None else URLInfoCache(DATA_DIR / "url_info.sqlite")
+        self._infoFutures     = {} # cache key => future of its info dict
+        self._numberOfWorkers = numberOfWorkers
+        self._rateLimit       = rateLimit
+        self._ownsPool        = pool == None
+        self._pool            = pool if pool != None else YoutubeDLPool(numberOfProcesses=numberOfWorkers + 1) # one left for metadata queries
+
+        # The queue and the workers are bound to the event loop of the first request
+        self._loop      = None
+        self._queue     = None
+        self._workers   = []
+
+        # All forms of a link share the same download (see URLUtilities.cacheKey)
+        self._futures   = {} # cache key => future of the downloaded file path
+        self._active    = {} # cache key => file path of running downloads
+        self._released  = {} # cache key => future that is done once the worker of its running download let go of it
+        self._cancelled = set() # keys of running downloads to abort, until their workers let go of them
 
         DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
     async def enqueue(self, url: str, filePath="", settings={}):
-        """Queue youtube url to be processed and return the file path it will be downloaded to"""
-        filePath = pathlib.Path(filePath)
-        if filePath == pathlib.Path(""):
-            filePath = self.urlToFilePath(url)
+        """Queue youtube url to be processed and return the file path it was downloaded to"""
+        future = await self.request(url, filePath=filePath, settings=settings)
+        return await asyncio.shield(future)
+
+
+    async def request(self, url: str, filePath="", settings={}):
+        """Queue youtube url to be processed (unless it already is) and return the future of its file path"""
+        self.start()
 
-        if not self.isEnqueued(url):
-            self._queue.append((url, filePath))
+        key = URLUtilities.cacheKey(url)
+        future = self._futures.get(key, None)
+        if future == None or future.done():
+            filePath = pathlib.Path(filePath)
+            if filePath == pathlib.Path(""):
+                filePath = await self.urlToFilePath(url)
 
-        if not self._current:
-            await self.recurse()
+            # Another caller may have queued the url while its info was being fetched
+            future = self._futures.get(key, None)
+            if future != None and not future.done():
+                return future
 
-        return filePath
+            future = self._loop.create_future()
+            self._futures[key] = future
+            self._queue.put_nowait((key, url, filePath, dict(settings)))
 
+        return future
 
-    async def recurse(self):
-        """Process youtube urls in the queue until empty"""
-        if self._queue:
-            url, filePath = self._queue.pop(0)
-            await self.download(url, filePath)
-            await self.recurse()
+
+    def cancel(self, url: str):
+        """Drop a queued url or abort its running download. Returns False if the url is unknown."""
+        key = URLUtilities.cacheKey(url)
+        future = self._futures.get(key, None)
+        if future == None or future.done():
+            return False
+
+        if key in self._active:
+            # Running downloads are aborted from their progress hook
+            self._cancelled.add(key)
+        else:
+            # Workers skip urls whose futures are done
+            del self._futures[key]
+        future.cancel()
+        return True
+
+
+    def start(self):
+        """Start the workers on the running event loop, and the youtube_dl processes"""
+        if self._loop == None:
+            self._loop    = asyncio.get_running_loop()
+            self._queue   = asyncio.Queue()
+            self._workers = [self._loop.create_task(self.work()) for index in range(self._numberOfWorkers)]
+            self._pool.start()
+            DOWNLOADS_QUEUED.setFunction(self._queue.qsize)
+            DOWNLOADS_ACTIVE.setFunction(self._active.__len__)
+
+
+    def stop(self):
+        """Cancel all queued and running downloads and stop the workers"""
+        for key in list(self._futures.keys()):
+            self.cancel(key)
+
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._queue   = None
+        self._loop    = None
+        DOWNLOADS_QUEUED.remove()
+        DOWNLOADS_ACTIVE.remove()
+
+        if self._ownsPool:
+            self._pool.stop()
+        if self._ownsInfoCache:
+            self._infoCache.close()
+
+
+    async def work(self):
+        """Process queued urls one after the other"""
+        while True:
+            key, url, filePath, settings = await self._queue.get()
+            future = self._futures.get(key, None)
+            released = None
+
+            try:
+                # A cancelled download of the same url (requested again) may still be winding down
+                while key in self._released and future != None and not future.done():
+                    await asyncio.shield(self._released[key])
+
+                if future == None or future.done(): # cancelled while queued
+                    continue
+
+                released = self._loop.create_future()
+                self._released[key] = released
+                self._active[key] = filePath
+                begin = time.perf_counter()
+                await self.download(url, filePath, settings)
+                DOWNLOAD_DURATION.observe(time.perf_counter() - begin)
+                if not future.done():
+                    future.set_result(filePath)
+
+            except Exception as exception:
+                if not isinstance(exception, DownloadCancelled):
+                    DOWNLOAD_FAILURES.inc()
+                if not future.done():
+                    future.set_exception(exception)
+
+            finally:
+                if released != None: # acknowledge the cancellation (if any) and let the next download of the url start
+                    self._active.pop(key, None)
+                    self._cancelled.discard(key)
+                    del self._released[key]
+                    released.set_result(None)
+                if future != None and self._futures.get(key, None) is future:
+                    del self._futures[key]
+                self._queue.task_done()
+
+
+    async def waitForData(self, url: str, size: int, pollInterval=0.1):
+        """Wait until 'size' bytes of a queued url are on disk or its download ended"""
+        key = URLUtilities.cacheKey(url)
+        future = self._futures.get(key, None)
+        filePath = self._active.get(key, None)
+        while future != None and not future.done():
+            if filePath != None:
+                for path in (self.partialFilePath(filePath), filePath):
+                    try:
+                        if size <= path.stat().st_size:
+                            return
+                    except OSError:
+                        pass
+
+            await asyncio.wait([future], timeout=pollInterval)
+            filePath = self._active.get(key, filePath)
+
+
+    def openStream(self, url: str):
+        """Return a stream of a url that is still being downloaded, or None if it isn't"""
+        key      = URLUtilities.cacheKey(url)
+        future   = self._futures.get(key, None)
+        filePath = self._active.get(key, None)
+        if future == None or future.done() or filePath == None:
+            return None
+        return GrowingFileReader([self.partialFilePath(filePath), filePath], isFinished=future.done)
 
 
     def isEnqueued(self, url: str):
         """Checks whether the specified youtube url is to be downloaded"""
-        return next((True for item in self._queue if item[0]==url), False)
+        return URLUtilities.cacheKey(url) in self._futures
 
 
-    def isDownloaded(self, url: str):
+    async def isDownloaded(self, url: str):
         """Checks whether the specified youtube url was already processed"""
-        return self.urlToFilePath(url).is_file()
+        return (await self.urlToFilePath(url)).is_file()
 
 
-    async def download(self, url: str, filePath: pathlib.Path):
+    async def download(self, url: str, filePath: pathlib.Path, settings={}):
+        """Download a url in the process pool, forwarding its progress to progressHook"""
         try:
-            self._current = url
+            self.log("Downloading {} to {}".format(url, filePath))
+            await self._pool.download(
+                url,
+                self.downloadSettings(url, filePath, settings),
+                onProgress  = self.progressHook,
+                isCancelled = lambda: self.isCancelled(url)
+            )
+            self.log("Finished downloading {} to {}".format(url, filePath))
 
-            settings = YOUTUBE_DL_OPTIONS
-            settings["outtmpl"] = str(filePath)
+        except DownloadCancelled:
+            self.log("Cancelled downloading {}".format(url))
+            raise
 
-            try:
-                with youtube_dl.YoutubeDL(settings) as youtube:
-                    self.log("Downloading {} to {}".format(url, filePath))
+        except Exception as exception:
+            self.error("Error downloading {}\n{}".format(url, exception))
 
-                    with ThreadPoolExecutor() as pool:
-                        loop = asyncio.get_running_loop()
-                        await loop.run_in_executor(
-                            pool,
-                            lambda: youtube.extract_info(url, download=True)
-                        )
 
-                    self.log("Finished downloading {} to {}".format(url, filePath))
+    def downloadSettings(self, url: str, filePath: pathlib.Path, settings={}):
+        """youtube_dl options of a download (progress hooks are added by the process that runs it)"""
+        settings = dict(YOUTUBE_DL_OPTIONS, **settings)
+        settings["outtmpl"] = str(filePath)
+        if self._rateLimit:
+            # Each worker gets an equal share, so the limit holds however many downloads are running
+            settings.setdefault("ratelimit", max(int(self._rateLimit) // self._numberOfWorkers, 1))
+        return settings
 
-            except Exception as exception:
-                self.error("Error downloading {}\n{}".format(url, exception))
 
-        finally:
-            self._current = ""
+    def isCancelled(self, url: str):
+        return URLUtilities.cacheKey(url) in self._cancelled
 
 
-    def urlToFilePath(self, url: str):
+    async def urlToFilePath(self, url: str):
         """Converts a youtube video link to a file path in the downloads dir"""
         if self.isYoutubeURL(url):
-            settings = YOUTUBE_DL_OPTIONS.copy()
-            settings["progress_hooks"] = [self.progressHook]
-
-            try:
-                with youtube_dl.YoutubeDL(settings) as youtube:
-                    info = youtube.extract_info(url, download=False)
-                    return self.videoTitleToFilePath(info["title"], ".{}".format(info["ext"]))
-            except Exception as exception:
-                self.error("Error while querying youtube url: {}\n{}".format(url, exception))
-
+            info = await self.getInfo(url)
+            return self.videoTitleToFilePath(info["title"], ".{}".format(info["ext"]), videoID=info["id"])
         else:
             self.error("Provided link is not a valid youtube URL: {}".format(url))
 
 
+    async def getInfo(self, url: str):
+        """Return the trimmed info dict of a url from the cache, or query it in the process pool.
+        Concurrent queries of the same url share a single request."""
+        info = self._infoCache.get(url)
+        if info != None:
+            return info
+
+        key = URLUtilities.cacheKey(url)
+        future = self._infoFutures.get(key, None)
+        if future == None:
+            future = asyncio.ensure_future(self.extractInfo(url))
+            self._infoFutures[key] = future
+            future.add_done_callback(lambda future: self._infoFutures.pop(key, None))
+
+        return await asyncio.shield(future)
+
+
+    async def extractInfo(self, url: str):
+        """Metadata query, executed in the process pool"""
+        try:
+            info = await self._pool.extract(url, YOUTUBE_DL_OPTIONS.copy())
+        except Exception as exception:
+            self.error("Error while querying youtube url: {}\n{}".format(url, exception))
+
+        return self._infoCache.set(url, info)
+
+
     def progressHook(self, info: dict):
         """Gets called on events from youtube_dl"""
         if info["status"] == "finished":
             self.log("Finished downloading to {}".format(info["filename"]))
+            DOWNLOAD_BYTES.inc(info.get("downloaded_bytes", None) or info.get("total_bytes", None) or 0)
 
         elif info["status"] == "error":
             self.error("Error downloading to {}".format(info["filename"]))
 
 
     @staticmethod
-    def videoTitleToFilePath(title: str, extension: str):
-        """ASCIIfy a video title"""
+    def partialFilePath(filePath: pathlib.Path):
+        """Where youtube_dl writes a file until it is complete"""
+        return pathlib.Path(str(filePath) + ".part")
+
+
+    @property
+    def numberOfQueuedDownloads(self):
+        """Urls waiting for a free worker"""
+        return len(self._futures) - len(self._active)
+
+
+    @property
+    def numberOfActiveDownloads(self):
+        return len(self._active)
+
+
+    @staticmethod
+    def videoTitleToFilePath(title: str, extension: str, videoID=""):
+        """ASCIIfy a video title and tag it with the video id, so videos with the same title don't collide"""
         fileName = "".join([char if ord(char) < 128 else "_" for char in title])
         fileName = fileName.replace(" ", "_").replace("/", "_").replace(".", "_").lower()
         fileName = "".join(currentChar for currentChar, nextChar in zip(fileName, fileName[1:]+'_') if not (currentChar=='_' and nextChar=='_'))
+        if videoID:
+            fileName = "{}_[{}]".format(fileName.rstrip("_"), videoID.replace("/", "_"))
         return DOWNLOAD_DIR / (fileName + extension)
 
 
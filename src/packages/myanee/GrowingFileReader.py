@@ -0,0 +1,73 @@
+# --- STL Imports ---
+import pathlib
+import time
+import io
+
+
+class GrowingFileReader(io.RawIOBase):
+    """Read-only stream of a file that is still being written (e.g.: a download in progress).
+    Reads block until some data is available, and the end of the file is only reported once
+    'isFinished' returns True or no data arrived for 'timeout' seconds.
+    'filePaths' are tried in order, so a partial file that gets renamed on completion
+    can be passed along with its final path."""
+
+    def __init__(self,
+                 filePaths: list,
+                 isFinished: callable,
+                 pollInterval=0.05,
+                 timeout=30.0):
+        io.RawIOBase.__init__(self)
+        self._filePaths    = [pathlib.Path(filePath) for filePath in filePaths]
+        self._isFinished   = isFinished
+        self._pollInterval = pollInterval
+        self._timeout      = timeout
+        self._file         = None
+
+
+    def readable(self):
+        return True
+
+
+    def read(self, size=-1):
+        """Return at least one byte unless the file is complete"""
+        lastProgress = time.monotonic()
+        while not self.closed:
+            if self.open():
+                data = self._file.read(size)
+                if data:
+                    return data
+
+            # Check whether the writer finished before reading, so no data written in between is missed
+            if self._isFinished():
+                return self._file.read(size) if self.open() else b""
+
+            if self._timeout < time.monotonic() - lastProgress:
+                return b""
+
+            time.sleep(self._pollInterval)
+
+        return b""
+
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+    def open(self):
+        """Open the first existing file path, and keep reading from it even if it is renamed later"""
+        if self._file == None:
+            for filePath in self._filePaths:
+                try:
+                    self._file = open(filePath, "rb", buffering=0)
+                    break
+                except FileNotFoundError:
+                    pass
+        return self._file != None
+
+
+    def close(self):
+        if self._file != None:
+            self._file.close()
+        io.RawIOBase.close(self)
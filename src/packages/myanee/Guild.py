@@ -3,17 +3,35 @@ import discord
 
 # --- STL Imports ---
 import datetime
+import asyncio
+import time
+import io
+import os
 from functools import wraps
 
 # --- Internal Imports ---
 from .TrackList import TrackList
 from .Track import Track
+from .TrackSampler import TrackSampler
 from .DownloadManager import DownloadManager
+from .CacheManager import CacheManager
+from .OpusCache import OpusCache
+from .LoudnessAnalyzer import LoudnessAnalyzer
+from .AudioEngine import AudioEngine
+from .ImageCatalog import ImageCatalog
 from .TextChannel import TextChannel
-from .VoiceChannel import VoiceChannel
+from .VoiceChannel import VoiceChannel, MeasuredSource
 from .stream import Stream
 from .Loggee import Loggee
-from .utilities import URLUtilities, randomItem, stringChunks, AUDIO_DIR, IMAGE_DIR, DOWNLOAD_DIR, DATA_DIR, SOURCE_DIR
+from .utilities import URLUtilities, randomItem, stringChunks, IMAGE_DIR, DATA_DIR, SOURCE_DIR
+from . import metrics
+
+
+COMMANDS            = metrics.registry.counter( "myanee_commands_total", "Commands run", ("command",) )
+COMMAND_FAILURES    = metrics.registry.counter( "myanee_command_failures_total", "Commands that raised an exception", ("command",) )
+COMMAND_DURATION    = metrics.registry.histogram( "myanee_command_duration_seconds", "Time from receiving a command until it's done", ("command",) )
+QUEUE_LENGTH        = metrics.registry.gauge( "myanee_audio_queue_length", "Tracks in the audio queue", ("guild",) )
+PLAYBACK_START      = metrics.registry.histogram( "myanee_playback_start_seconds", "Time from starting a track until its first audio frame is read" )
 
 
 def requireActiveTextChannel( function: callable ):
@@ -37,12 +55,22 @@ def requireActiveVoiceChannel( function: callable ):
 
 class Guild(Loggee):
 
+    # Tracks played within this time are not drawn at random
+    audioRule = datetime.timedelta( days=2 )
+
     def __init__( self,
                   guild: discord.Guild,
                   downloadList: TrackList,
                   audioList: TrackList,
                   eventHooks: dict,
-                  logStream: Stream ):
+                  logStream: Stream,
+                  cacheManager: CacheManager=None,
+                  opusCache: OpusCache=None,
+                  downloadManager: DownloadManager=None,
+                  imageCatalog: ImageCatalog=None,
+                  sampler: TrackSampler=None,
+                  audioMixer=False,
+                  crossfade=0.0 ):
         Loggee.__init__( self, logStream, name=str(guild.name) )
         self._guild             = guild
         self._downloadList      = downloadList
@@ -50,13 +78,51 @@ class Guild(Loggee):
         self._eventHooks        = eventHooks
         self._textChannels      = []
         self._voiceChannels     = []
-        self._downloadManager   = DownloadManager( logStream )
+        self._ownsDownloads     = downloadManager == None
+        self._downloadManager   = downloadManager if downloadManager != None else DownloadManager( logStream )
+        self._cacheManager      = cacheManager
+        self._opusCache         = opusCache
+
+        # Shared with the other guilds and kept up to date by a directory watcher (see MyaNee),
+        # otherwise the image directory is scanned once
+        self._imageCatalog      = imageCatalog if imageCatalog != None else ImageCatalog( IMAGE_DIR, logStream )
 
         self._currentTrack      = None
         self._audioQueue        = []
-        self._audioRule         = datetime.timedelta( days=2 )
         self._inRadioMode       = False
 
+        # Bytes of a download to wait for before its playback starts (None waits for the complete file)
+        self._playbackBufferSize = 0x40000
+
+        # Number of queued tracks to download and warm up ahead of time (see prefetch)
+        self._prefetchDepth     = 2
+        self._nextRadioTrack    = None
+        self._preparedTrack     = None
+        self._preparedSource    = None
+
+        # Number of url arguments of a command that are resolved at the same time (see playCommand)
+        self._resolutionSlots   = asyncio.Semaphore( 4 )
+
+        # Track that was started last and when (see onFirstFrame)
+        self._startRequest      = None
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+        # Plays all tracks and overlays through a single player if enabled (otherwise each track starts a new one)
+        self._engine = None
+        if audioMixer:
+            self._engine = AudioEngine(
+                crossfade,
+                onStarted = lambda track: self.runOnLoop( self.onEngineStarted, track ),
+                onFinished = lambda track: self.runOnLoop( self.onEngineFinished, track )
+            )
+
+        # Draws random tracks that satisfy the audio rule and are not queued (created on first use unless shared, see MyaNee)
+        self._ownsSampler       = sampler == None
+        self._sampler           = sampler
+
         self._activeTextChannel  = None
         self._activeVoiceChannel = None
 
@@ -69,6 +135,7 @@ class Guild(Loggee):
             "skip"          : self.skipCommand,
             "next"          : self.nextCommand,
             "stop"          : self.stopCommand,
+            "overlay"       : self.overlayCommand,
             "radio"         : self.radioCommand,
             "list"          : self.listCommand,
             "status"        : self.statusCommand
@@ -79,6 +146,11 @@ class Guild(Loggee):
             "shutdown"      : self.shutdownCommand
         }
 
+        for command in self._commands:
+            COMMANDS.inc( 0, command=command )
+            COMMAND_FAILURES.inc( 0, command=command )
+        QUEUE_LENGTH.setFunction( lambda: len(self._audioQueue), guild=self.name )
+
         self.update()
 
 
@@ -95,8 +167,16 @@ class Guild(Loggee):
             self.log( "Register hidden command '{}' with arguments '{}'".format(command, arguments) )
             await self._hiddenCommands[command]( message, *arguments )
         elif command in self._commands:
-            self.log( "Register command '{}' with arguments '{}'".format(command, arguments) )
-            await self._commands[command]( message, *arguments )
+            self.log( "Register command '{}' with arguments '{}'".format(command, arguments), command=command )
+            COMMANDS.inc( command=command )
+            begin = time.perf_counter()
+            try:
+                await self._commands[command]( message, *arguments )
+            except Exception:
+                COMMAND_FAILURES.inc( command=command )
+                raise
+            finally:
+                COMMAND_DURATION.observe( time.perf_counter() - begin, command=command )
             await message.add_reaction( "💖" )
         else:
             await self._activeTextChannel.send( "Wakarimasen! >.<'", reference=message )
@@ -113,16 +193,20 @@ class Guild(Loggee):
     async def showCommand( self, message: discord.Message, *args ):
         """Post an image/gif matching the argument in the active text channel"""
         for arg in args:
-            filePaths = list( IMAGE_DIR.glob("*{}*".format(arg)) )
+            fileNames = self._imageCatalog.find( arg )
 
-            if filePaths:
-                filePath = randomItem( filePaths )
-                with open( filePath, "rb" ) as file:
-                    await self._activeTextChannel.send( file=discord.File(file) )
+            if fileNames:
+                await self._activeTextChannel.send( file=await self.makeImageFile(randomItem(fileNames)) )
             else:
                 self.log( "no hits for image request '{}'".format(arg) )
 
 
+    async def makeImageFile( self, fileName: str ):
+        """Attachment of an image, which stays readable until the message was sent (see OutboundQueue)"""
+        data = await self._imageCatalog.load( fileName )
+        return discord.File( io.BytesIO(data), filename=fileName )
+
+
     async def connectCommand( self, message: discord.Message, *args ):
         """Connect to the sender's voice channel"""
         try:
@@ -147,6 +231,8 @@ class Guild(Loggee):
     async def disconnectCommand( self, message: discord.Message, *args ):
         """Disconnect from the active voice channel"""
         print(self._activeVoiceChannel)
+        if self._engine != None:
+            self._engine.stop()
         await self._activeVoiceChannel.disconnect()
         self._activeVoiceChannel = None
 
@@ -160,41 +246,101 @@ class Guild(Loggee):
             else:
                 self.error( "No active voice channel!" )
 
-        # Loop through arguments
-        for arg in args:
-            track = None
+        # Urls are resolved (and downloaded) concurrently, while their tracks are still queued in the order
+        # of the arguments: each one as soon as it and the ones before it are ready
+        resolutions = [
+            asyncio.ensure_future( self.resolveURL(arg) ) if URLUtilities.isURL( arg ) else None
+            for arg in args
+        ]
 
-            if arg == '#': # special case: play random audio file subject to the 24h rule
-                track = self.getRandomTrack()
+        # Loop through arguments
+        try:
+            for arg, resolution in zip( args, resolutions ):
+                track = None
 
-                if track == None:
-                    await self._activeTextChannel.send( "mya-nee ran out of things to play >.<'" )
-                    self.error( "none of the available tracks satisfy the 24h rule" )
+                if arg == '#': # special case: play random audio file subject to the 24h rule
+                    track = self.getRandomTrack()
 
-            elif URLUtilities.isURL( arg ): # url -> assume it's a youtube link
-                filePath = await self._downloadManager.enqueue( arg )
-                track = self._downloadList.getTrackByFilePath( filePath )
+                    if track == None:
+                        await self._activeTextChannel.send( "mya-nee ran out of things to play >.<'" )
+                        self.error( "none of the available tracks satisfy the 24h rule" )
 
-                if track == None:
-                    track = Track(
-                        filePath,
-                        Track.formatDateTime(Track.defaultDateTime()),
-                        url=arg
-                    )
-                    self._downloadList.addTrack( track, existOK=False )
+                elif resolution != None: # url -> assume it's a youtube link
+                    track = await resolution
 
-            else: # not a url -> play local audio from the audio dir or the track list
-                for trackList in (self._audioList, self._downloadList):
-                    hits = trackList.getTracksByPartialName( arg )
+                else: # not a url -> play local audio from the audio dir or the track list
+                    for trackList in (self._audioList, self._downloadList):
+                        hits = trackList.getTracksByPartialName( arg )
 
-                    if hits:
-                        track = randomItem( hits )
-                        break
+                        if hits:
+                            track = randomItem( hits )
+                            break
 
-            if track != None:
-                self.enqueueAudio( track )
-            else:
-                self.error( "Could not find matching audio for request '{}'".format(arg) )
+                if track != None:
+                    self.enqueueAudio( track )
+                else:
+                    self.error( "Could not find matching audio for request '{}'".format(arg) )
+        finally:
+            # Arguments after a failed one are dropped (downloads that already started are finished anyway)
+            pending = [ resolution for resolution in resolutions if resolution != None ]
+            for resolution in pending:
+                resolution.cancel()
+            await asyncio.gather( *pending, return_exceptions=True )
+
+
+    async def resolveURL( self, url: str ):
+        """Get the track of a url (see downloadTrack), waiting for a free slot first"""
+        async with self._resolutionSlots:
+            return await self.downloadTrack( url )
+
+
+    async def downloadTrack( self, url: str ):
+        """Get the track of a url, downloading it if necessary"""
+        # Any form of a known link is (re)downloaded to its track's file without asking youtube for its title
+        track = self._downloadList.getTrackByURL( url )
+        isRestored = False
+        if track == None and self._cacheManager != None:
+            data = self._cacheManager.restore( url )
+            if data != None: # evicted earlier => download to the same file and keep its statistics
+                track = self._downloadList.makeTrackFromDict( data )
+                track = self._downloadList.getTrackByFullName( self._downloadList.addTrack(track, existOK=True) )
+                isRestored = True
+
+        filePath = track.filePath if track != None else await self._downloadManager.urlToFilePath( url )
+
+        if not filePath.is_file():
+            download = await self._downloadManager.request( url, filePath=filePath )
+            if self._cacheManager != None: # a tombstone of the track is dropped once its file exists
+                download.add_done_callback( lambda future: self.onDownloadDone(url, future) )
+            if self._playbackBufferSize == None:
+                await asyncio.shield( download )
+            else: # play while downloading (see playAudio)
+                await self._downloadManager.waitForData( url, self._playbackBufferSize )
+                if download.done():
+                    download.result() # raise download errors
+
+        if track == None:
+            track = self._downloadList.getTrackByFilePath( filePath )
+
+        if track == None:
+            track = Track(
+                filePath,
+                Track.formatDateTime(Track.defaultDateTime()),
+                url=url
+            )
+            self._downloadList.addTrack( track, existOK=False )
+        elif not track.hasURL(): # registered by the directory watcher
+            track.setURL( url )
+
+        if isRestored and filePath.is_file():
+            self._cacheManager.forget( url )
+
+        return track
+
+
+    def onDownloadDone( self, url: str, download: asyncio.Future ):
+        if not download.cancelled() and download.exception() == None:
+            self._cacheManager.forget( url )
 
 
     @requireActiveVoiceChannel
@@ -204,14 +350,14 @@ class Guild(Loggee):
         self._currentTrack = None
 
         # Stop playing current track
-        self._activeVoiceChannel.stop()
+        self.skipPlayback()
 
 
     @requireActiveVoiceChannel
     async def nextCommand( self, message: discord.Message, *args ):
         """Stop playing the current audio file and queue the next one (if any), but update the time stamp"""
         self._currentTrack._playCount -= 1 # dirty
-        self._activeVoiceChannel.stop()
+        self.skipPlayback()
 
 
     @requireActiveVoiceChannel
@@ -219,13 +365,35 @@ class Guild(Loggee):
         """Stop playing audio and reset playback state"""
         # Reset audio state
         self._inRadioMode = False
+        for track in self._audioQueue:
+            self.sampler.include( track )
         self._audioQueue  = []
+        self.discardPrefetched()
 
         # Prevent the currently playing track from getting updated
         self._currentTrack = None
 
-        # Stop playing current track
-        self._activeVoiceChannel.stop()
+        # Stop playing current track and overlays
+        if self._engine != None:
+            self._engine.stop()
+        else:
+            self._activeVoiceChannel.stop()
+
+
+    @requireActiveVoiceChannel
+    async def overlayCommand( self, message: discord.Message, *args ):
+        """Play audio from the audio directory over the current track"""
+        for arg in args:
+            hits = self._audioList.getTracksByPartialName( arg )
+            if not hits:
+                self.error( "Could not find matching audio for overlay request '{}'".format(arg) )
+
+            track = randomItem( hits )
+            if self._engine != None:
+                self._engine.overlay( VoiceChannel.prepare(track.filePath, gain=LoudnessAnalyzer.gain(track)) )
+                self.startEngine()
+            else: # only the audio engine can mix
+                self.enqueueAudio( track )
 
 
     async def radioCommand( self, message: discord.Message, *args ):
@@ -238,8 +406,7 @@ class Guild(Loggee):
                 self.error( "No active voice channel!" )
 
         try: # respond
-            with open( IMAGE_DIR / "mya-nee_approval.png", "rb" ) as file:
-                await self._activeTextChannel.send( "besto radio", file=discord.File(file) )
+            await self._activeTextChannel.send( "besto radio", file=await self.makeImageFile("mya-nee_approval.png") )
         finally: # enable radio mode and start playing
             self._inRadioMode = True
             self.recurseAudio()
@@ -269,12 +436,11 @@ class Guild(Loggee):
                         for searchTerm in args[1:]:
                             items += [path.stem for path in directory.glob(searchTerm)]
                     else:
-                        with open( IMAGE_DIR / "hackerman.gif", "rb" ) as file:
-                            await self._activeTextChannel.send(
-                                "Uragirimono! >.<'",
-                                reference=message,
-                                file=discord.File(file)
-                            )
+                        await self._activeTextChannel.send(
+                            "Uragirimono! >.<'",
+                            reference=message,
+                            file=await self.makeImageFile("hackerman.gif")
+                        )
                         self.error( "permission to '{}' denied for user '{}'".format(directory, message.author) )
                 else:
                     self.error( "could not find directory for list request '{}'".format(arg) )
@@ -324,6 +490,9 @@ class Guild(Loggee):
         if self._activeVoiceChannel != None and self._activeVoiceChannel.id == voiceChannel.id:
             if len(self._activeVoiceChannel.members) == 1:
                 self._inRadioMode = False
+                self.discardPrefetched()
+                if self._engine != None:
+                    self._engine.stop()
                 await self._activeVoiceChannel.disconnect()
                 self._activeVoiceChannel = None
 
@@ -333,8 +502,24 @@ class Guild(Loggee):
         self.log( "'{}' joined '{}'".format(member.name, voiceChannel.name) )
 
 
+    def isUsingTrack( self, track: Track ):
+        """Whether a track is playing, queued or prefetched (as the next radio pick or prepared source) in this guild"""
+        return track is self._currentTrack \
+               or track is self._nextRadioTrack \
+               or track is self._preparedTrack \
+               or any( item is track for item in self._audioQueue )
+
+
     def release( self ):
         """In lieu of a destructor"""
+        if self._ownsSampler and self._sampler != None:
+            self._sampler.close()
+        self.discardPrefetched()
+        if self._engine != None:
+            self._engine.stop()
+        if self._ownsDownloads:
+            self._downloadManager.stop()
+        QUEUE_LENGTH.remove( guild=self.name )
         self._downloadList.writeToFile()
         self._audioList.writeToFile()
 
@@ -342,19 +527,96 @@ class Guild(Loggee):
     def audioHook( self, *args ):
         """Executed after each call to AudioChannel::play"""
         if self._currentTrack != None:
-            self._currentTrack.updateLastPlayed()
+            self.finishTrack( self._currentTrack )
             self._currentTrack = None
 
-            self._downloadList.writeToFile()
-            self._audioList.writeToFile()
-
         self.recurseAudio()
 
 
+    def finishTrack( self, track: Track ):
+        """Update the statistics of a track that was played"""
+        track.updateLastPlayed()
+        self._downloadList.writeToFile()
+        self._audioList.writeToFile()
+
+
+    def onEngineStarted( self, track: Track ):
+        """Called when the audio engine continued with the prepared track on its own"""
+        if self._engine.currentTag is not track: # stopped or replaced in the meantime
+            return
+
+        if self._currentTrack != None and self._currentTrack is not track:
+            self.finishTrack( self._currentTrack )
+
+        if self._audioQueue and self._audioQueue[0] is track:
+            self._audioQueue.pop( 0 )
+            self.sampler.include( track )
+        elif track is self._nextRadioTrack:
+            self._nextRadioTrack = None
+            self.sampler.include( track )
+
+        if track is self._preparedTrack: # the engine owns its source now
+            self._preparedTrack, self._preparedSource = None, None
+
+        self._currentTrack = track
+        self.log( "Now playing {}".format(track) )
+        self.prefetch()
+
+
+    def onEngineFinished( self, track: Track ):
+        """Called when a track stops being the current one of the audio engine"""
+        if track is self._currentTrack:
+            self.finishTrack( track )
+            self._currentTrack = None
+
+        # Nothing was prepared (e.g.: the next track is still being downloaded)
+        if self._engine.currentTag == None:
+            self.recurseAudio()
+
+
+    def engineHook( self, *args ):
+        """Executed when the player of the audio engine stops"""
+        self.runOnLoop( self.onEngineStopped )
+
+
+    def onEngineStopped( self ):
+        # Something was queued right as the engine ran out
+        if not self._engine.isIdle:
+            self.startEngine()
+
+
+    def startEngine( self ):
+        """Start a player for the audio engine unless one is running"""
+        if self._activeVoiceChannel != None and not self._activeVoiceChannel.isPlaying():
+            self._activeVoiceChannel.play( None, hook=self.engineHook, source=self._engine )
+
+
+    def skipPlayback( self ):
+        if self._engine != None:
+            self._engine.skip()
+        else:
+            self._activeVoiceChannel.stop()
+
+
+    def runOnLoop( self, function: callable, *args ):
+        """Call a function on the event loop (from any thread)"""
+        if self._loop != None:
+            self._loop.call_soon_threadsafe( function, *args )
+        else:
+            function( *args )
+
+
     def enqueueAudio( self, track: Track ):
         """Append audio queue"""
+        if track is self._nextRadioTrack: # pick another one for the radio
+            self.sampler.include( track )
+            self._nextRadioTrack = None
+
+        self.sampler.exclude( track )
+
         if self._audioQueue or self._currentTrack != None:
             self._audioQueue.append( track )
+            self.prefetch()
         else:
             self._audioQueue.append( track )
             self.recurseAudio()
@@ -363,6 +625,7 @@ class Guild(Loggee):
     def recurseAudio( self ):
         if self._audioQueue:
             track = self._audioQueue.pop( 0 )
+            self.sampler.include( track )
             self.playAudio( track )
 
         elif self._inRadioMode:
@@ -374,22 +637,144 @@ class Guild(Loggee):
     @requireActiveVoiceChannel
     def playAudio( self, track: Track ):
         self._currentTrack = track
+        self._startRequest = ( track, time.perf_counter() )
         self.log( "Now playing {}".format(track) )
 
-        self._activeVoiceChannel.play( track.filePath, hook=self.audioHook )
+        # Tracks that are still being downloaded are streamed from the partial file
+        stream = self._downloadManager.openStream( track.url ) if track.hasURL() else None
+
+        # Use the ffmpeg process started by prefetch if there is one
+        source = None
+        if stream == None and track is self._preparedTrack:
+            source = self._preparedSource
+            self._preparedTrack, self._preparedSource = None, None
+
+        try:
+            if source == None:
+                source = self.prepareSource( track, stream=stream )
+
+            if self._engine != None:
+                self._engine.play( source, tag=track )
+                self.startEngine()
+        except Exception as exception:
+            self.error( "error during playback\n{}".format(exception) )
+
+        if self._engine == None: # reports its own errors
+            self._activeVoiceChannel.play( track.filePath, hook=self.audioHook, source=source )
+        self.prefetch()
+
+
+    def prepareSource( self, track: Track, stream=None ):
+        """Audio source of a track (see VoiceChannel.prepare) that reports when it starts playing"""
+        source = VoiceChannel.prepare(
+            track.filePath,
+            stream = stream,
+            opusPath = self.getOpusPath( track ) if stream == None else None,
+            gain = LoudnessAnalyzer.gain( track )
+        )
+        return MeasuredSource( source, lambda: self.onFirstFrame(track) )
+
+
+    def onFirstFrame( self, track: Track ):
+        """Called on the player's thread when the first frame of a track is read"""
+        request = self._startRequest
+        if request != None and request[0] is track:
+            self._startRequest = None
+            PLAYBACK_START.observe( time.perf_counter() - request[1] )
+
+
+    def prefetch( self ):
+        """Make sure the next few tracks (and the next radio pick) are downloaded and their files are cached,
+        and start transcoding the very next one, so that playback continues without a gap"""
+        upcoming = self._audioQueue[:self._prefetchDepth]
+        if self._inRadioMode and len( upcoming ) < self._prefetchDepth:
+            if self._nextRadioTrack == None:
+                # The playing track's time stamp is only updated once it finishes
+                candidates = [ track for track in self.sampler.sampleBatch(2) if not track is self._currentTrack ]
+                if candidates: # keep it from being drawn again until it's played
+                    self._nextRadioTrack = candidates[0]
+                    self.sampler.exclude( self._nextRadioTrack )
+            if self._nextRadioTrack != None:
+                upcoming.append( self._nextRadioTrack )
+
+        for track in upcoming:
+            if not track.isDownloaded():
+                if track.hasURL() and self._loop != None: # evicted or still downloading
+                    asyncio.run_coroutine_threadsafe(
+                        self._downloadManager.request( track.url, filePath=track.filePath ),
+                        self._loop
+                    )
+            else: # warm up the file that is going to be played
+                opusPath = self.getOpusPath( track )
+                self.warmUp( opusPath if opusPath != None else track.filePath )
+
+        # Prepare the source of the next track
+        nextTrack = upcoming[0] if upcoming else None
+        if nextTrack is not self._preparedTrack:
+            self.discardPreparedSource()
+            if nextTrack != None and nextTrack.isDownloaded() and self._activeVoiceChannel != None:
+                try:
+                    self._preparedSource = self.prepareSource( nextTrack )
+                    self._preparedTrack  = nextTrack
+                    if self._engine != None: # continue with it without a gap
+                        self._engine.setNext( self._preparedSource, tag=nextTrack )
+                except Exception as exception:
+                    self.log( "failed to prepare {}\n{}".format(nextTrack.name, exception) )
+
+
+    def getOpusPath( self, track: Track ):
+        """Path to the opus copy of a track, requesting one if there is none"""
+        opusPath = None
+        if self._opusCache != None and track.directory == self._downloadList.directory:
+            opusPath = self._opusCache.get( track )
+            if opusPath == None:
+                self._opusCache.request( track )
+        return opusPath
+
+
+    @staticmethod
+    def warmUp( filePath ):
+        """Ask the kernel to read a file into the page cache in the background (where supported)"""
+        if hasattr( os, "posix_fadvise" ):
+            try:
+                fileDescriptor = os.open( filePath, os.O_RDONLY )
+                try:
+                    os.posix_fadvise( fileDescriptor, 0, 0, os.POSIX_FADV_WILLNEED )
+                finally:
+                    os.close( fileDescriptor )
+            except OSError:
+                pass
+
+
+    def discardPreparedSource( self ):
+        if self._preparedSource != None:
+            if self._engine != None:
+                self._engine.setNext( None ) # cleans it up
+            else:
+                self._preparedSource.cleanup()
+        self._preparedTrack, self._preparedSource = None, None
+
+
+    def discardPrefetched( self ):
+        """Forget the next radio pick and the prepared source"""
+        if self._nextRadioTrack != None:
+            self.sampler.include( self._nextRadioTrack )
+            self._nextRadioTrack = None
+        self.discardPreparedSource()
 
 
     def getRandomTrack( self ):
         """Get a random track from the download dir (subject to the 24h rule)"""
-        def isEligible( name: str, track: Track ):
-            return (track.lastPlayed <= datetime.datetime.now() - self._audioRule) and not (track in self._audioQueue)
-        hits = self._downloadList.getTracksByFilter( isEligible )
-
-        if hits:
-            return randomItem( hits )
+        # Prefer the track picked by prefetch
+        track, self._nextRadioTrack = self._nextRadioTrack, None
+        if track != None:
+            self.sampler.include( track )
         else:
+            track = self.sampler.sample()
+
+        if track == None:
             self.log( "none of the available tracks satisfy the 24h rule" )
-            return None
+        return track
 
 
     def update( self ):
@@ -397,7 +782,7 @@ class Guild(Loggee):
         self._voiceChannels = []
 
         for channel in self._guild.text_channels:
-            self._textChannels.append( TextChannel(channel) )
+            self._textChannels.append( TextChannel(channel, self._stream) )
 
         for channel in self._guild.voice_channels:
             self._voiceChannels.append( VoiceChannel(channel, self._stream) )
@@ -418,6 +803,13 @@ class Guild(Loggee):
             self.error( "Failed to set active text channel" )
 
 
+    @property
+    def sampler( self ):
+        if self._sampler == None:
+            self._sampler = TrackSampler( self._downloadList, self.audioRule )
+        return self._sampler
+
+
     @property
     def id( self ):
         return self._guild.id
@@ -0,0 +1,130 @@
+# --- STL Imports ---
+import collections
+import threading
+import fnmatch
+import pathlib
+import asyncio
+import os
+
+# --- Internal Imports ---
+from .SubstringIndex import SubstringIndex
+from .Loggee import Loggee
+from .stream import Stream
+from . import metrics
+
+
+IMAGE_REQUESTS  = metrics.registry.counter("myanee_image_requests_total", "Images read from the image catalog", ("result",))
+
+
+class ImageCatalog(Loggee):
+    """Names of the files in the image directory, searchable by substring (see SubstringIndex), and the contents
+    of the recently posted ones in a least recently used cache of at most 'cacheSize' bytes.
+    Hook it up to a DirectoryWatcher to keep it in sync with the directory."""
+
+    def __init__(self, directory: pathlib.Path, logStream: Stream, cacheSize=0x2000000):
+        Loggee.__init__(self, logStream, name="ImageCatalog")
+        self._directory   = pathlib.Path(directory)
+        self._index       = SubstringIndex()
+        self._cacheSize   = cacheSize
+        self._cache       = collections.OrderedDict() # file name => bytes, least recently used first
+        self._cachedBytes = 0
+        self._lock        = threading.Lock()
+
+        IMAGE_REQUESTS.inc(0, result="hit")
+        IMAGE_REQUESTS.inc(0, result="miss")
+
+        self.update()
+
+
+    def update(self):
+        """Rescan the directory"""
+        try:
+            with os.scandir(self._directory) as entries:
+                fileNames = [entry.name for entry in entries if entry.is_file()]
+        except OSError:
+            fileNames = []
+
+        self._index.clear()
+        self._index.update(fileNames)
+        with self._lock:
+            self._cache.clear()
+            self._cachedBytes = 0
+
+
+    def onFileCreated(self, filePath: pathlib.Path):
+        """Register a new (or rewritten) file"""
+        self.discard(filePath.name)
+        self._index.add(filePath.name)
+
+
+    def onFileDeleted(self, filePath: pathlib.Path):
+        self.discard(filePath.name)
+        self._index.remove(filePath.name)
+
+
+    def onFileMoved(self, sourcePath: pathlib.Path, targetPath: pathlib.Path):
+        self.onFileDeleted(sourcePath)
+        self.onFileCreated(targetPath)
+
+
+    def find(self, pattern: str):
+        """Names of the files that match '*pattern*' (like glob)"""
+        if any(character in pattern for character in "*?["): # match all names (an empty query returns them)
+            return [fileName for fileName in self._index.query("") if fnmatch.fnmatchcase(fileName, "*{}*".format(pattern))]
+        return self._index.query(pattern)
+
+
+    def read(self, fileName: str):
+        """Contents of a file, from the cache if possible"""
+        with self._lock:
+            data = self._cache.get(fileName)
+            if data != None:
+                self._cache.move_to_end(fileName)
+                IMAGE_REQUESTS.inc(result="hit")
+                return data
+
+        IMAGE_REQUESTS.inc(result="miss")
+        with open(self._directory / fileName, "rb") as file:
+            data = file.read()
+
+        # Files that would take up much of the cache are not worth evicting the others for
+        if len(data) <= self._cacheSize // 4 and fileName in self._index:
+            with self._lock:
+                if not fileName in self._cache:
+                    self._cache[fileName] = data
+                    self._cachedBytes += len(data)
+                while self._cacheSize < self._cachedBytes:
+                    evicted, evictedData = self._cache.popitem(last=False)
+                    self._cachedBytes -= len(evictedData)
+        return data
+
+
+    async def load(self, fileName: str):
+        """Contents of a file, read off the event loop unless it's cached"""
+        with self._lock:
+            isCached = fileName in self._cache
+        if isCached:
+            return self.read(fileName)
+        return await asyncio.get_running_loop().run_in_executor(None, self.read, fileName)
+
+
+    def discard(self, fileName: str):
+        """Drop a file from the cache"""
+        with self._lock:
+            data = self._cache.pop(fileName, None)
+            if data != None:
+                self._cachedBytes -= len(data)
+
+
+    @property
+    def directory(self):
+        return self._directory
+
+
+    @property
+    def cachedBytes(self):
+        return self._cachedBytes
+
+
+    def __len__(self):
+        return len(self._index)
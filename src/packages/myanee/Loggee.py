@@ -1,5 +1,8 @@
+# --- STL Imports ---
+import time
+
 # --- Internal Imports
-from .stream import Stream
+from .stream import Stream, formatRecord, DEBUG, INFO, WARNING, ERROR
 
 
 class Loggee:
@@ -17,13 +20,27 @@ class Loggee:
                 self._stream.write( "{}\n".format(exception) )
 
 
-    def log( self, content: str ):
-        if self._name:
-            content = "[{}] {}".format(self._name, content)
+    def log( self, content: str, level=INFO, **fields ):
+        """Emit a record of the message to the log stream. Keyword arguments are kept as fields of the record
+        by streams that store them (see LogWriter)."""
+        record = { "time" : time.time(), "level" : level, "name" : self._name, "message" : content }
+        if fields:
+            record.update( fields )
+
+        if isinstance( self._stream, Stream ):
+            self._stream.emit( record )
+        else: # e.g.: sys.stderr
+            self._stream.write( formatRecord(record) )
+
+
+    def debug( self, content: str, **fields ):
+        self.log( content, level=DEBUG, **fields )
+
 
-        self._stream.write( content + '\n' )
+    def warning( self, content: str, **fields ):
+        self.log( content, level=WARNING, **fields )
 
 
-    def error( self, message: str ):
-        self.log( message )
+    def error( self, message: str, **fields ):
+        self.log( message, level=ERROR, **fields )
         raise Exception( message )
\ No newline at end of file
@@ -0,0 +1,166 @@
+# --- STL Imports ---
+import threading
+import asyncio
+import bisect
+import time
+import sys
+import os
+
+# --- Internal Imports ---
+from .Loggee import Loggee
+from .stream import Stream
+from . import metrics
+
+
+class LoopWatchdog(Loggee):
+    """Measure the lag of the event loop (how late it runs a periodic heartbeat) and find what blocks it.
+    A thread samples the stack of the loop's thread whenever the heartbeat is more than 'threshold'
+    seconds overdue, and logs the blocking call along with the guild command that was running (if any).
+    Lags are kept in a histogram (see buckets), stalls per command (see slowCommands)."""
+
+    # Upper bounds of the lag histogram in seconds (the last bucket is everything above)
+    buckets = ( 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0 )
+
+    # Frames of the blocked stack to log
+    stackDepth = 4
+
+    def __init__(self,
+                 logStream: Stream,
+                 interval=0.1,
+                 threshold=0.25,
+                 clock: callable=time.monotonic):
+        Loggee.__init__(self, logStream, name="LoopWatchdog")
+        self._interval  = interval
+        self._threshold = threshold
+        self._clock     = clock
+        self._lock      = threading.Lock()
+        self._counts    = [0] * (len(self.buckets) + 1)
+        self._lagSum    = 0.0
+        self._maxLag    = 0.0
+        self._slowCommands = {} # command name => [number of stalls, longest stall]
+
+        self._task      = None
+        self._thread    = None
+        self._stopped   = threading.Event()
+        self._loopThreadID = None
+        self._lastBeat  = 0.0
+
+
+    def start(self):
+        """Watch the running event loop"""
+        if self._task == None:
+            self._loopThreadID = threading.get_ident()
+            self._lastBeat = self._clock()
+            self._stopped.clear()
+            self._task   = asyncio.get_running_loop().create_task(self.beat())
+            self._thread = threading.Thread(target=self.watch, name="loop watchdog", daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        if self._task != None:
+            self._task.cancel()
+            self._stopped.set()
+            self._thread.join()
+            self._task, self._thread = None, None
+
+
+    async def beat(self):
+        while True:
+            expected = self._clock() + self._interval
+            await asyncio.sleep(self._interval)
+            self._lastBeat = self._clock()
+            self.record(max(self._lastBeat - expected, 0.0))
+
+
+    def record(self, lag: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, lag)] += 1
+            self._lagSum += lag
+            self._maxLag  = max(self._maxLag, lag)
+        LOOP_LAG.observe(lag)
+
+
+    def watch(self):
+        """Main function of the watchdog thread"""
+        stall = None # (begin, command, location) of the current stall
+        while not self._stopped.wait(self._interval):
+            lastBeat = self._lastBeat
+            overdue  = self._clock() - lastBeat - self._interval
+            if stall == None and self._threshold < overdue:
+                command, location = self.inspect()
+                stall = (lastBeat, command, location)
+                self.warning("event loop blocked for {:.2f} s{} at\n{}".format(
+                    overdue,
+                    " in command '{}'".format(command) if command else "",
+                    location
+                ))
+            elif stall != None and stall[0] != lastBeat: # the loop is running again
+                duration = lastBeat - stall[0] - self._interval
+                self.log("event loop was blocked for {:.2f} s".format(duration))
+                if stall[1]:
+                    with self._lock:
+                        entry = self._slowCommands.setdefault(stall[1], [0, 0.0])
+                        entry[0] += 1
+                        entry[1]  = max(entry[1], duration)
+                stall = None
+
+
+    def inspect(self):
+        """Name of the guild command on the stack of the loop's thread (if any) and the innermost frames"""
+        frame = sys._current_frames().get(self._loopThreadID, None)
+        command, frames = None, []
+        while frame != None:
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            if len(frames) < self.stackDepth:
+                frames.append("    {}:{} in {}".format(os.path.basename(code.co_filename), frame.f_lineno, name))
+            if command == None and name.startswith("Guild.") and name.endswith("Command"):
+                command = name[len("Guild."):-len("Command")]
+            frame = frame.f_back
+        return command, "\n".join(frames)
+
+
+    def percentile(self, fraction: float):
+        """Upper bound of the bucket that holds the given fraction of the lags (inf if it's the last one)"""
+        with self._lock:
+            counts = list(self._counts)
+        target = fraction * sum(counts)
+        total  = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            if target <= total and count:
+                return bound
+        return 0.0
+
+
+    def summary(self):
+        return "loop lag p50 <= {} s, p99 <= {} s, max {:.3f} s over {} beats".format(
+            self.percentile(0.5),
+            self.percentile(0.99),
+            self._maxLag,
+            sum(self._counts)
+        )
+
+
+    @property
+    def histogram(self):
+        """Pairs of bucket upper bounds and the number of lags in them (not cumulative)"""
+        with self._lock:
+            return list(zip(self.buckets + (float("inf"),), self._counts))
+
+
+    @property
+    def lagSum(self):
+        return self._lagSum
+
+
+    @property
+    def slowCommands(self):
+        with self._lock:
+            return { command : tuple(entry) for command, entry in self._slowCommands.items() }
+
+
+
+
+LOOP_LAG = metrics.registry.histogram("myanee_loop_lag_seconds", "How late the event loop ran its heartbeat", buckets=LoopWatchdog.buckets)
@@ -0,0 +1,155 @@
+# --- STL Imports ---
+from concurrent.futures import Executor, ProcessPoolExecutor
+import subprocess
+import asyncio
+import shutil
+import math
+import re
+
+# --- Internal Imports ---
+from .TrackList import TrackList
+from .Track import Track
+from .Loggee import Loggee
+from .stream import Stream
+from .utilities import processContext
+
+
+def measureLoudness(filePath: str, executable="ffmpeg"):
+    """Integrated loudness of a file in LUFS (EBU R128) or None if ffmpeg fails. Runs in a worker process."""
+    try:
+        result = subprocess.run(
+            [executable, "-nostdin", "-hide_banner", "-i", filePath, "-vn", "-af", "ebur128=framelog=quiet", "-f", "null", "-"],
+            capture_output=True,
+            text=True,
+            errors="replace"
+        )
+    except OSError:
+        return None
+
+    # The summary at the end holds the integrated loudness
+    matches = re.findall(r"I:\s+(-?[0-9.]+|-inf)\s+LUFS", result.stderr)
+    return float(matches[-1]) if result.returncode == 0 and matches else None
+
+
+
+
+class LoudnessAnalyzer(Loggee):
+    """Measure the loudness of each track in a TrackList once, in a process pool, and store it in the track
+    so the list persists it. Playback applies the resulting gain (see gain) without analyzing the file again."""
+
+    # LUFS that all tracks are normalized to
+    targetLoudness = -18.0
+
+    # Bounds of the normalization gain (linear)
+    minimumGain = 0.05
+    maximumGain = 4.0
+
+    def __init__(self,
+                 trackList: TrackList,
+                 logStream: Stream,
+                 executor: Executor=None,
+                 measure: callable=measureLoudness,
+                 executable="ffmpeg"):
+        Loggee.__init__(self, logStream, name="LoudnessAnalyzer")
+        self._trackList    = trackList
+        self._ownsExecutor = executor == None
+        self._executor     = executor
+        self._measure      = measure
+        self._executable   = executable
+        self._loop         = None
+        self._queue        = None
+        self._task         = None
+
+
+    @staticmethod
+    def isSupported(executable="ffmpeg"):
+        return shutil.which(executable) != None
+
+
+    @classmethod
+    def gain(cls, track: Track):
+        """Linear factor that brings a track to the target loudness, scaled by its volume (in percent)"""
+        gain = track.volume / 100.0
+        if track.hasLoudness() and math.isfinite(track.loudness):
+            gain *= 10.0 ** ((cls.targetLoudness - track.loudness) / 20.0)
+        return min(max(gain, cls.minimumGain), cls.maximumGain)
+
+
+    def start(self):
+        """Analyze all unmeasured tracks on the running event loop, and new ones as they are added"""
+        self._loop  = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        if self._executor == None:
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=processContext())
+
+        # Find unmeasured tracks without creating the ones that are still in the snapshot
+        for row in self._trackList.rows():
+            if math.isnan(row[7]):
+                self._queue.put_nowait(row[0])
+
+        self._trackList.addListener(self)
+        self._task = self._loop.create_task(self.work())
+
+
+    def stop(self):
+        if self._loop != None:
+            self._trackList.removeListener(self)
+            self._task.cancel()
+            if self._ownsExecutor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self._loop = None
+
+
+    async def work(self):
+        while True:
+            name  = await self._queue.get()
+            track = self.getTrack(name)
+            if track == None or track.hasLoudness() or not track.isDownloaded():
+                continue
+
+            loudness = await self._loop.run_in_executor(self._executor, self._measure, track.filePathString, self._executable)
+            if loudness == None:
+                self.log("failed to measure the loudness of {}".format(track.name))
+                loudness = -math.inf # don't try again
+
+            # The track may have been removed in the meantime
+            if self.getTrack(name) is track:
+                track.setLoudness(loudness)
+                if self._queue.empty():
+                    self._trackList.writeToFile()
+
+
+    def getTrack(self, name: str):
+        try:
+            return self._trackList.getTrackByFullName(name)
+        except KeyError:
+            return None
+
+
+    @property
+    def numberOfPendingTracks(self):
+        return self._queue.qsize() if self._queue != None else 0
+
+
+    # TrackList listener interface
+
+    def onTrackAdded(self, track: Track):
+        if not track.hasLoudness():
+            self.enqueue(track.name)
+
+
+    def onTrackRemoved(self, track: Track):
+        pass
+
+
+    def onTrackUpdated(self, track: Track):
+        # Downloads are listed before they are complete, and skipped by work until then
+        if not track.hasLoudness() and track.isDownloaded():
+            self.enqueue(track.name)
+
+
+    def enqueue(self, name: str):
+        """Queue a track for measuring (tracks may be added and updated from other threads)"""
+        if self._loop != None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, name)
@@ -2,14 +2,25 @@
 import discord
 
 # --- STL Imports ---
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
 import sys
 
 # --- Internal Imports ---
 from .Guild import Guild
+from .DownloadManager import DownloadManager
 from .TrackList import TrackList
+from .TrackSampler import TrackSampler
+from .storage import SQLiteTrackStorage
+from .DirectoryWatcher import DirectoryWatcher
+from .LoopWatchdog import LoopWatchdog
+from .CacheManager import CacheManager
+from .OpusCache import OpusCache
+from .ImageCatalog import ImageCatalog
+from .LoudnessAnalyzer import LoudnessAnalyzer
 from .Loggee import Loggee
-from .stream import Stream, StreamMultiplex
-from .utilities import SOURCE_DIR, AUDIO_DIR, DOWNLOAD_DIR
+from .stream import StreamMultiplex
+from .utilities import AUDIO_DIR, DOWNLOAD_DIR, IMAGE_DIR, processContext
 
 
 class Status:
@@ -40,14 +51,24 @@ def requiresInitialized( function: callable ):
 
 class MyaNee( StreamMultiplex, Loggee ):
 
-    def __init__( self ):
-        StreamMultiplex.__init__( self, sys.stderr )
+    def __init__( self, *logStreams ):
+        """Logs go to 'logStreams' (e.g.: a LogWriter), or stderr if there are none"""
+        StreamMultiplex.__init__( self, *(logStreams if logStreams else (sys.stderr,)) )
         Loggee.__init__( self, self, name="MyaNee" )
 
         self._discordClient = None
         self._prefix        = ""
         self._downloadList  = None
         self._audioList     = None
+        self._watchers      = []
+        self._images        = None
+        self._cacheManager  = None
+        self._opusCache     = None
+        self._analyzers     = []
+        self._analysisPool  = None
+        self._downloads     = None
+        self._sampler       = None
+        self._watchdog      = None
         self._guilds        = {}
         self._status        = Status( "" )
 
@@ -75,15 +96,39 @@ class MyaNee( StreamMultiplex, Loggee ):
 
 
     def clear( self ):
+        """Release everything from a previous initialization (e.g.: before reconnecting) and reset"""
+        self.release()
+
         self._discordClient = None
         self._prefix        = ""
         self._downloadList  = None
         self._audioList     = None
+        self._watchers      = []
+        self._images        = None
+        self._cacheManager  = None
+        self._opusCache     = None
+        self._analyzers     = []
+        self._analysisPool  = None
+        self._downloads     = None
+        self._sampler       = None
+        self._watchdog      = None
         self._guilds        = {}
         self._status        = Status( "" )
 
 
-    async def initialize( self, discordClient: discord.Client, prefix: str ):
+    async def initialize( self,
+                          discordClient: discord.Client,
+                          prefix: str,
+                          downloadCacheSize=None,
+                          downloadRateLimit=None,
+                          numberOfDownloads=2,
+                          audioMixer=False,
+                          crossfade=0.0 ):
+        """'downloadCacheSize' is the number of bytes the downloads (and their opus copies) may take up (unlimited if None or 0).
+        All guilds share 'numberOfDownloads' simultaneous downloads, which may take up 'downloadRateLimit'
+        bytes per second together (unlimited if None or 0).
+        'audioMixer' enables gapless playback, crossfades of 'crossfade' seconds and overlays (see AudioEngine).
+        The mixer decodes everything it plays, so it is exclusive with the opus copies (see OpusCache)."""
         self.setStatus( "initializing" )
 
         self.clear()
@@ -91,8 +136,72 @@ class MyaNee( StreamMultiplex, Loggee ):
         self._discordClient = discordClient
         self._prefix        = prefix
 
-        self._downloadList  = TrackList( DOWNLOAD_DIR, self )
-        self._audioList     = TrackList( AUDIO_DIR, self )
+        # Report whatever blocks the event loop
+        self._watchdog = LoopWatchdog( self )
+        self._watchdog.start()
+
+        # Load the track lists off the event loop
+        loop = asyncio.get_running_loop()
+        self._downloadList, self._audioList = await asyncio.gather(
+            loop.run_in_executor( None, self.makeTrackList, DOWNLOAD_DIR ),
+            loop.run_in_executor( None, self.makeTrackList, AUDIO_DIR )
+        )
+
+        for trackList in ( self._downloadList, self._audioList ):
+            watcher = DirectoryWatcher(
+                trackList.directory,
+                self,
+                onCreated  = trackList.onFileCreated,
+                onDeleted  = trackList.onFileDeleted,
+                onMoved    = trackList.onFileMoved,
+                onOverflow = trackList.update
+            )
+            await watcher.start()
+            self._watchers.append( watcher )
+
+        # Images are looked up by name in memory, and the ones posted often are kept there too
+        self._images = await loop.run_in_executor( None, ImageCatalog, IMAGE_DIR, self )
+        if IMAGE_DIR.is_dir():
+            watcher = DirectoryWatcher(
+                IMAGE_DIR,
+                self,
+                onCreated  = self._images.onFileCreated,
+                onDeleted  = self._images.onFileDeleted,
+                onMoved    = self._images.onFileMoved,
+                onOverflow = self._images.update
+            )
+            await watcher.start()
+            self._watchers.append( watcher )
+
+        # A url requested by several guilds is downloaded once
+        self._downloads = DownloadManager( self, numberOfWorkers=int(numberOfDownloads), rateLimit=downloadRateLimit )
+        self._downloads.start()
+
+        if downloadCacheSize:
+            self._cacheManager = CacheManager(
+                self._downloadList,
+                self,
+                int( downloadCacheSize ),
+                isProtected = self.isTrackInUse,
+                relatedFiles = self.getRelatedFiles
+            )
+
+        # Tracks are measured once in the background, and normalized when played
+        if LoudnessAnalyzer.isSupported():
+            self._analysisPool = ProcessPoolExecutor( max_workers=1, mp_context=processContext() )
+            for trackList in ( self._downloadList, self._audioList ):
+                analyzer = LoudnessAnalyzer( trackList, self, executor=self._analysisPool )
+                analyzer.start()
+                self._analyzers.append( analyzer )
+
+        # Downloads are converted to opus once, so playing them needs no encoding
+        # (unless the mixer plays them, which would decode and encode them again anyway)
+        if OpusCache.isSupported() and not audioMixer:
+            self._opusCache = OpusCache( self._downloadList, self, normalize=bool(self._analyzers) )
+            self._opusCache.start()
+
+        # Random tracks are drawn from the rows of the download list, the same way in every guild
+        self._sampler = TrackSampler( self._downloadList, Guild.audioRule )
 
         for discordGuild in self._discordClient.guilds:
             guild = Guild(
@@ -103,14 +212,35 @@ class MyaNee( StreamMultiplex, Loggee ):
                     "reboot" : self.reboot,
                     "shutdown" : self.shutdown
                 },
-                self
+                self,
+                cacheManager = self._cacheManager,
+                opusCache = self._opusCache,
+                downloadManager = self._downloads,
+                imageCatalog = self._images,
+                sampler = self._sampler,
+                audioMixer = audioMixer,
+                crossfade = float( crossfade )
             )
             guild.setActiveTextChannel()
             self._guilds[discordGuild.id] = guild
 
+        if self._cacheManager != None:
+            self._cacheManager.start()
+
         self.setStatus( "running" )
 
 
+    def makeTrackList( self, directory ):
+        """Create a track list backed by an sqlite database, migrating the json track list if there is one.
+        The list starts from its binary snapshot if that is up to date."""
+        directory.mkdir( parents=True, exist_ok=True )
+        storage = SQLiteTrackStorage(
+            directory / "track_list.sqlite",
+            jsonFilePath = directory / "track_list.json"
+        )
+        return TrackList( directory, self, storage=storage, columnar=True, useSnapshot=True )
+
+
     @requiresInitialized
     async def reboot( self ):
         self.setStatus( "rebooting" )
@@ -123,10 +253,61 @@ class MyaNee( StreamMultiplex, Loggee ):
         await self._discordClient.close()
 
 
+    def isTrackInUse( self, track ):
+        """Whether a track is playing or queued in any guild"""
+        return any( guild.isUsingTrack(track) for guild in self._guilds.values() )
+
+
+    def getRelatedFiles( self, track ):
+        """Files derived from a downloaded track, which are evicted along with it"""
+        return [ self._opusCache.cachePath(track) ] if self._opusCache != None else []
+
+
+    def stopAnalyzers( self ):
+        for analyzer in self._analyzers:
+            analyzer.stop()
+
+        if self._analysisPool != None:
+            self._analysisPool.shutdown( wait=False, cancel_futures=True )
+            self._analysisPool = None
+
+        self._analyzers = []
+
+
+    def stopWatchdog( self ):
+        if self._watchdog != None:
+            self._watchdog.stop()
+            self.log( self._watchdog.summary() )
+            self._watchdog = None
+
+
     def release( self ):
+        for watcher in self._watchers:
+            watcher.stop()
+
+        if self._cacheManager != None:
+            self._cacheManager.stop()
+
+        if self._opusCache != None:
+            self._opusCache.stop()
+
+        self.stopAnalyzers()
+
         for id, guild in self._guilds.items():
             guild.release()
 
+        if self._sampler != None:
+            self._sampler.close()
+
+        if self._downloads != None:
+            self._downloads.stop()
+
+        self.stopWatchdog()
+
+        for trackList in ( self._downloadList, self._audioList ):
+            if trackList != None:
+                trackList.close()
+
 
     def setStatus( self, status: str ):
         self.log( status )
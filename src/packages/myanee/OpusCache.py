@@ -0,0 +1,231 @@
+# --- External Imports ---
+import discord
+
+# --- STL Imports ---
+import pathlib
+import asyncio
+import shutil
+import os
+
+# --- Internal Imports ---
+from .TrackList import TrackList
+from .Track import Track
+from .LoudnessAnalyzer import LoudnessAnalyzer
+from .Loggee import Loggee
+from .stream import Stream
+
+
+class OggOpusSource(discord.AudioSource):
+    """Plays an Ogg Opus file by handing its packets to discord as they are, without ffmpeg or encoding.
+    The file must be 48 kHz stereo with 20 ms packets, which is what OpusCache creates (see OpusCache.isPlayable)."""
+
+    def __init__(self, filePath: pathlib.Path):
+        self._file    = open(filePath, "rb")
+        self._packets = discord.oggparse.OggStream(self._file).iter_packets()
+
+
+    def read(self):
+        for packet in self._packets:
+            if not (packet.startswith(b"OpusHead") or packet.startswith(b"OpusTags")):
+                return packet
+        return b""
+
+
+    def is_opus(self):
+        return True
+
+
+    def cleanup(self):
+        self._file.close()
+
+
+
+
+class OpusCache(Loggee):
+    """Ogg Opus copies of the tracks of a TrackList, kept in a subdirectory of the list's directory.
+    Tracks are converted with ffmpeg once, in the background, when they are added or requested; sources
+    that already are opus in 20 ms packets are only remuxed. Cached copies are deleted along with their tracks.
+    The playback gain of a track (see LoudnessAnalyzer.gain) is applied to its copy, so if 'normalize' is set,
+    tracks are only converted once their loudness was measured."""
+
+    # Samples (at 48 kHz) in the opus packets that discord expects (20 ms)
+    packetDuration = 960
+
+    # ffmpeg arguments for 48 kHz stereo opus in 20 ms frames (what discord expects)
+    _encodeArguments = ["-c:a", "libopus", "-ar", "48000", "-ac", "2", "-frame_duration", "20", "-application", "audio"]
+
+    def __init__(self,
+                 trackList: TrackList,
+                 logStream: Stream,
+                 bitRate="128k",
+                 numberOfWorkers=1,
+                 normalize=False,
+                 executable="ffmpeg"):
+        Loggee.__init__(self, logStream, name="OpusCache")
+        self._trackList  = trackList
+        self._directory  = trackList.directory / "opus_cache"
+        self._bitRate    = bitRate
+        self._normalize  = normalize
+        self._executable = executable
+        self._loop       = None
+        self._semaphore  = None
+        self._pending    = {} # track name => conversion task
+        self._numberOfWorkers = numberOfWorkers
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+
+    @staticmethod
+    def isSupported(executable="ffmpeg"):
+        return shutil.which(executable) != None
+
+
+    def start(self):
+        """Convert tracks on the running event loop as they are added to the list"""
+        self._loop      = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self._numberOfWorkers)
+        self._trackList.addListener(self)
+
+
+    def stop(self):
+        if self._loop != None:
+            self._trackList.removeListener(self)
+            for task in self._pending.values():
+                task.cancel()
+            self._pending = {}
+            self._loop = None
+
+
+    def get(self, track: Track):
+        """Path to the opus copy of a track, or None if it isn't cached (yet)"""
+        cachePath = self.cachePath(track)
+        try:
+            if os.stat(track.filePathString).st_mtime <= cachePath.stat().st_mtime:
+                return cachePath
+        except OSError:
+            pass
+        return None
+
+
+    def request(self, track: Track):
+        """Schedule the conversion of a track unless it is cached or pending. Can be called from any thread."""
+        if self._loop != None and self.get(track) == None:
+            self._loop.call_soon_threadsafe(self.schedule, track)
+
+
+    def schedule(self, track: Track):
+        if self._loop != None and not track.name in self._pending and track.isDownloaded() and (track.hasLoudness() or not self._normalize):
+            task = self._loop.create_task(self.convert(track))
+            self._pending[track.name] = task
+            task.add_done_callback(lambda task: self._pending.pop(track.name, None))
+
+
+    async def convert(self, track: Track):
+        """Remux the track if it already is opus and needs no gain, and encode it otherwise"""
+        async with self._semaphore:
+            if self.get(track) != None:
+                return
+
+            cachePath     = self.cachePath(track)
+            temporaryPath = pathlib.Path(str(cachePath) + ".tmp")
+            gain          = LoudnessAnalyzer.gain(track)
+            try:
+                # Copying succeeds for other codecs the ogg container supports too (e.g.: vorbis),
+                # and opus sources may use other frame durations than the 20 ms that are played
+                isCopied = gain == 1.0 and await self.runFFmpeg(track.filePath, temporaryPath, ["-c:a", "copy"]) \
+                           and await asyncio.get_running_loop().run_in_executor(None, self.isPlayable, temporaryPath)
+                if not isCopied:
+                    arguments = self._encodeArguments + ["-b:a", self._bitRate]
+                    if gain != 1.0:
+                        arguments += ["-af", "volume={:.4f}".format(gain)]
+                    if not await self.runFFmpeg(track.filePath, temporaryPath, arguments):
+                        self.log("failed to convert {}".format(track.name))
+                        return
+                os.replace(temporaryPath, cachePath)
+            finally:
+                temporaryPath.unlink(missing_ok=True)
+
+
+    async def runFFmpeg(self, sourcePath: pathlib.Path, targetPath: pathlib.Path, arguments: list):
+        process = await asyncio.create_subprocess_exec(
+            self._executable, "-nostdin", "-v", "error", "-y",
+            "-i", str(sourcePath),
+            "-vn", "-map_metadata", "-1",
+            *arguments,
+            "-f", "ogg", str(targetPath),
+            stdout = asyncio.subprocess.DEVNULL,
+            stderr = asyncio.subprocess.DEVNULL
+        )
+        try:
+            return await process.wait() == 0
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+
+    @staticmethod
+    def isPlayable(filePath: pathlib.Path):
+        """Whether an ogg file is opus whose audio packets all are 20 ms long (what OggOpusSource plays)"""
+        try:
+            with open(filePath, "rb") as file:
+                packets = discord.oggparse.OggStream(file).iter_packets()
+                if not next(packets, b"").startswith(b"OpusHead"):
+                    return False
+                for packet in packets:
+                    if not packet.startswith(b"OpusTags") and OpusCache.getPacketDuration(packet) != OpusCache.packetDuration:
+                        return False
+                return True
+        except (OSError, discord.oggparse.OggError):
+            return False
+
+
+    @staticmethod
+    def getPacketDuration(packet: bytes):
+        """Samples (at 48 kHz) in an opus packet, from its table of contents byte (see RFC 6716, section 3.1)"""
+        if not packet:
+            return 0
+
+        configuration = packet[0] >> 3
+        if configuration < 12:   # SILK: 10, 20, 40 or 60 ms frames
+            frameSize = (480, 960, 1920, 2880)[configuration % 4]
+        elif configuration < 16: # hybrid: 10 or 20 ms frames
+            frameSize = (480, 960)[configuration % 2]
+        else:                    # CELT: 2.5, 5, 10 or 20 ms frames
+            frameSize = (120, 240, 480, 960)[configuration % 4]
+
+        code = packet[0] & 0b11
+        if code == 0:
+            numberOfFrames = 1
+        elif code < 3:
+            numberOfFrames = 2
+        else: # the frame count follows
+            numberOfFrames = packet[1] & 0b111111 if 1 < len(packet) else 0
+        return frameSize * numberOfFrames
+
+
+    def cachePath(self, track: Track):
+        return self._directory / (track.name + ".opus")
+
+
+    # TrackList listener interface
+
+    def onTrackAdded(self, track: Track):
+        self.request(track)
+
+
+    def onTrackRemoved(self, track: Track):
+        task = self._pending.pop(track.name, None)
+        if task != None:
+            task.cancel()
+        self.cachePath(track).unlink(missing_ok=True)
+
+
+    def onTrackUpdated(self, track: Track):
+        # The track may just have been measured
+        if self._normalize and track.hasLoudness() and not track.name in self._pending:
+            self.request(track)
+
+
+    @property
+    def directory(self):
+        return self._directory
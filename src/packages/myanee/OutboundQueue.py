@@ -0,0 +1,196 @@
+# --- External Imports ---
+import discord
+
+# --- STL Imports ---
+import collections
+import threading
+import asyncio
+import time
+
+# --- Internal Imports ---
+from .Loggee import Loggee
+from .stream import Stream, ERROR
+from . import metrics
+
+
+MESSAGES_SENT   = metrics.registry.counter("myanee_messages_sent_total", "Messages sent to discord")
+TEXTS_POSTED    = metrics.registry.counter("myanee_texts_posted_total", "Texts queued for sending, several of which may share a message")
+
+
+class RateLimitBucket:
+    """Allows 'capacity' requests per 'period' seconds (discord allows 5 messages per 5 seconds and channel)"""
+
+    def __init__(self, capacity=5, period=5.0, clock: callable=time.monotonic):
+        self._capacity     = capacity
+        self._period       = period
+        self._clock        = clock
+        self._times        = collections.deque() # of the requests within the last period
+        self._blockedUntil = 0.0
+
+
+    def delay(self):
+        """Seconds to wait before the next request"""
+        now = self._clock()
+        while self._times and self._period <= now - self._times[0]:
+            self._times.popleft()
+
+        delay = self._blockedUntil - now
+        if self._capacity <= len(self._times):
+            delay = max(delay, self._times[0] + self._period - now)
+        return max(delay, 0.0)
+
+
+    def consume(self):
+        self._times.append(self._clock())
+
+
+    def block(self, seconds: float):
+        """Make no requests for a while (e.g.: discord said so)"""
+        self._blockedUntil = max(self._blockedUntil, self._clock() + seconds)
+
+
+
+
+class OutboundQueue(Loggee):
+    """Sends the messages of a channel in order, one at a time and within its rate limit (see RateLimitBucket).
+    Texts that queue up in the meantime are packed into as few code block messages as the length limit allows,
+    while messages with files or references are sent as they are. Texts may be posted from any thread."""
+
+    # Characters per discord message
+    limit = 2000
+
+    def __init__(self, sendFunction: callable, logStream: Stream, name="", bucket: RateLimitBucket=None):
+        """'sendFunction' is a coroutine function taking the content and keyword arguments of a message"""
+        Loggee.__init__(self, logStream, name=name)
+        self._send   = sendFunction
+        self._bucket = bucket if bucket != None else RateLimitBucket()
+        self._items  = collections.deque() # text (str) or (content, keyword arguments) of a message
+        self._lock   = threading.Lock()
+        self._task   = None
+        self._idle   = None
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+
+    def post(self, text: str):
+        """Queue a text to be sent in a code block"""
+        TEXTS_POSTED.inc()
+        self.enqueue(text)
+
+
+    def postMessage(self, content=None, **kwargs):
+        """Queue a message that is sent on its own (e.g.: one with a file)"""
+        self.enqueue((content, kwargs))
+
+
+    def enqueue(self, item):
+        with self._lock:
+            self._items.append(item)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop != None:
+            self._loop = loop
+            self.start()
+        elif self._loop != None and not self._loop.is_closed(): # from another thread
+            self._loop.call_soon_threadsafe(self.start)
+
+
+    def start(self):
+        """Run the sender on the event loop unless it is running"""
+        if self._task == None or self._task.done():
+            if self._idle == None:
+                self._idle = asyncio.Event()
+            self._idle.clear()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+
+    async def run(self):
+        try:
+            while True:
+                delay = self._bucket.delay()
+                if 0.0 < delay: # texts posted meanwhile are packed together
+                    await asyncio.sleep(delay)
+                    continue
+
+                with self._lock:
+                    if not self._items:
+                        return
+                    content, kwargs = self.pack()
+
+                try:
+                    self._bucket.consume()
+                    await self._send(content, **kwargs)
+                    MESSAGES_SENT.inc()
+                except discord.HTTPException as exception:
+                    if exception.status == 429: # discord's rate limit (that discord.py didn't retry itself)
+                        self._bucket.block(self.getRetryAfter(exception))
+                        with self._lock:
+                            self._items.appendleft((content, kwargs))
+                    else:
+                        self.log("failed to send a message\n{}".format(exception), level=ERROR)
+                except Exception as exception:
+                    self.log("failed to send a message\n{}".format(exception), level=ERROR)
+        finally:
+            self._idle.set()
+
+
+    @staticmethod
+    def getRetryAfter(exception: discord.HTTPException, default=1.0):
+        """Seconds to wait according to the Retry-After header of a rate limited response"""
+        try:
+            return float(exception.response.headers["Retry-After"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return default
+
+
+    def pack(self):
+        """Take the next message off the queue: as many texts as fit in one code block, or a message as it is.
+        Must be called with the lock held."""
+        item = self._items.popleft()
+        if not isinstance(item, str):
+            return item
+
+        room   = self.limit - len("``````")
+        pieces = self.split(item, room)
+        text   = pieces[0]
+        for piece in reversed(pieces[1:]): # the remainder goes into the next message
+            self._items.appendleft(piece)
+
+        while len(pieces) == 1 and self._items and isinstance(self._items[0], str):
+            if room < len(text) + 1 + len(self._items[0]):
+                break
+            text += "\n" + self._items.popleft()
+
+        return "```" + text + "```", {}
+
+
+    @staticmethod
+    def split(text: str, length: int):
+        """Pieces of at most 'length' characters, broken at line ends where possible"""
+        pieces = []
+        while length < len(text):
+            end = text.rfind("\n", 0, length + 1)
+            if end <= 0:
+                pieces.append(text[:length])
+                text = text[length:]
+            else:
+                pieces.append(text[:end])
+                text = text[end + 1:]
+        pieces.append(text)
+        return pieces
+
+
+    async def flush(self):
+        """Wait until everything queued on the event loop was sent"""
+        if self._task != None and not self._task.done():
+            await self._idle.wait()
+
+
+    def __len__(self):
+        return len(self._items)
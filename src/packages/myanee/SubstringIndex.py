@@ -0,0 +1,101 @@
+# --- STL Imports ---
+import collections
+import threading
+
+
+class SubstringIndex:
+    """Trigram index over a set of strings that answers substring queries without scanning every key.
+    The trigrams of new keys are computed on the first query that needs them."""
+
+    def __init__(self, gramSize=3):
+        self._gramSize = gramSize
+        self._keys     = set()
+        self._pending  = set() # keys whose trigrams are not indexed yet
+        self._grams    = collections.defaultdict(set)
+        self._lock     = threading.Lock()
+
+
+    def add(self, key: str):
+        with self._lock:
+            if key not in self._keys:
+                self._keys.add(key)
+                self._pending.add(key)
+
+
+    def update(self, keys):
+        """Add many keys at once"""
+        with self._lock:
+            keys = set(keys).difference(self._keys)
+            self._keys.update(keys)
+            self._pending.update(keys)
+
+
+    def remove(self, key: str):
+        with self._lock:
+            if key in self._keys:
+                self._keys.discard(key)
+                if key in self._pending:
+                    self._pending.discard(key)
+                    return
+
+                for gram in self.getGrams(key):
+                    keys = self._grams.get(gram)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self._grams[gram]
+
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._pending.clear()
+            self._grams.clear()
+
+
+    def flush(self):
+        """Index the trigrams of all pending keys"""
+        with self._lock:
+            for key in self._pending:
+                for gram in self.getGrams(key):
+                    self._grams[gram].add(key)
+            self._pending.clear()
+
+
+    def query(self, substring: str):
+        """Return every key that contains 'substring'"""
+        if len(substring) < self._gramSize:
+            # Too short to be covered by the index => fall back to a scan over the keys only
+            with self._lock:
+                return [key for key in self._keys if substring in key]
+
+        if self._pending:
+            self.flush()
+
+        with self._lock:
+            candidates = []
+            for gram in self.getGrams(substring):
+                keys = self._grams.get(gram)
+                if not keys:
+                    return []
+                candidates.append(keys)
+
+            # Intersecting the two rarest grams narrows the candidates enough,
+            # the rest are filtered by the containment check anyway
+            candidates.sort(key=len)
+            hits = candidates[0].intersection(*candidates[1:2])
+
+        # Sharing trigrams does not imply containment => verify
+        return [key for key in hits if substring in key]
+
+
+    def getGrams(self, string: str):
+        return {string[index:index+self._gramSize] for index in range(len(string) - self._gramSize + 1)}
+
+
+    def __contains__(self, key: str):
+        return key in self._keys
+
+
+    def __len__(self):
+        return len(self._keys)
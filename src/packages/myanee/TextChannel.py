@@ -1,24 +1,64 @@
 # --- External Imports ---
 import discord
 
+# --- STL Imports ---
+import io
+
 # --- Internal Imports ---
 from .Channel import Channel
-from .stream import StreamWrapper
+from .OutboundQueue import OutboundQueue
+from .stream import Stream, StreamWrapper, DummyStream
 from .Loggee import Loggee
 
 
 class TextChannel(Channel, StreamWrapper, Loggee):
+    """Messages and log lines are sent through an outbound queue (see OutboundQueue), so bursts of them
+    are merged and neither blocks the caller"""
 
-    def __init__( self, channel: discord.TextChannel ):
+    def __init__( self, channel: discord.TextChannel, logStream: Stream=None ):
         Channel.__init__( self, channel )
         StreamWrapper.__init__( self, self.writeFunction )
         Loggee.__init__( self, self, name=self.name )
 
+        # Failures are reported to 'logStream' rather than this channel
+        self._outbound = OutboundQueue(
+            self._channel.send,
+            logStream if logStream != None else DummyStream(),
+            name=self.name
+        )
+
 
-    async def writeFunction( self, content: str ):
-        await self.send( content )
+    def writeFunction( self, content: str ):
+        content = content.rstrip( '\n' )
+        if content:
+            self._outbound.post( content )
 
 
     async def send( self, *args, **kwargs ):
-        strings = [ "```" + string + "```" for string in args ]
-        await self._channel.send( *strings, **kwargs )
\ No newline at end of file
+        """Queue texts to be sent in code blocks. Messages with keyword arguments (e.g.: a file) are sent as they are."""
+        if kwargs:
+            if "file" in kwargs:
+                kwargs["file"] = self.detach( kwargs["file"] )
+            if "files" in kwargs:
+                kwargs["files"] = [ self.detach(file) for file in kwargs["files"] ]
+            content = "".join( "```" + string + "```" for string in args ) if args else None
+            self._outbound.postMessage( content, **kwargs )
+        else:
+            for string in args:
+                self._outbound.post( string )
+
+
+    @staticmethod
+    def detach( file: discord.File ):
+        """In-memory copy of an attachment, so the caller may close its file before the message is sent"""
+        if isinstance( file.fp, io.BytesIO ):
+            return file
+        file.reset()
+        data = file.fp.read()
+        file.close()
+        return discord.File( io.BytesIO(data), filename=file.filename, spoiler=file.spoiler )
+
+
+    async def flush( self ):
+        """Wait until the queued messages were sent"""
+        await self._outbound.flush()
@@ -1,25 +1,42 @@
 # --- STL Imports ---
 import pathlib
 import datetime
+import functools
+import math
+import time
+import os
 
 
 class Track:
+    """Audio file with playback statistics.
+    Time stamps are kept as integer seconds since the epoch, and tracks
+    in the same directory share a single interned directory path.
+    Loudness is the integrated loudness in LUFS (NaN until it is measured, see LoudnessAnalyzer)."""
+
+    __slots__ = ( "_directory", "_fileName", "_url", "_updateHook", "_lastPlayed", "_playCount", "_volume", "_loudness" )
+
+    # Directory string => shared path object
+    _directories = {}
 
     def __init__( self,
                   filePath: pathlib.Path,
                   lastPlayed: str,
                   playCount=0,
                   url="",
-                  volume=100 ):
-        self._filePath   = filePath
-        self._lastPlayed = self.parseDateTime( lastPlayed )
+                  volume=100,
+                  loudness=None ):
+        directory, self._fileName = os.path.split( str(filePath) )
+        self._directory  = self.internDirectory( directory )
+        self._lastPlayed = self.toTimeStamp( lastPlayed )
         self._url        = url
-        self._volume     = volume
-        self._playCount  = playCount
+        self._volume     = self.parseVolume( volume )
+        self._playCount  = int( playCount )
+        self._loudness   = self.parseLoudness( loudness )
+        self._updateHook = None
 
 
     def isDownloaded( self ):
-        return self._filePath.is_file()
+        return os.path.isfile( self.filePathString )
 
 
     def hasURL( self ):
@@ -27,24 +44,97 @@ class Track:
 
 
     def updateLastPlayed( self ):
-        self._lastPlayed = datetime.datetime.now()
+        self._lastPlayed = int( time.time() )
         self._playCount += 1
 
+        if self._updateHook != None:
+            self._updateHook( self )
+
+
+    def setURL( self, url: str ):
+        self._url = url
+
+        if self._updateHook != None:
+            self._updateHook( self )
+
+
+    def setLoudness( self, loudness: float ):
+        self._loudness = self.parseLoudness( loudness )
+
+        if self._updateHook != None:
+            self._updateHook( self )
+
+
+    def setUpdateHook( self, hook: callable ):
+        """Register a function that gets called with this track whenever it changes"""
+        self._updateHook = hook
+
 
     @staticmethod
     def fromDict( data: dict ):
         return Track(
-            pathlib.Path( data["filePath"] ),
+            data["filePath"],
             data["lastPlayed"],
             playCount=data["playCount"],
             url=data["url"],
-            volume=data["volume"]
+            volume=data["volume"],
+            loudness=data.get("loudness", None)
         )
 
 
+    @staticmethod
+    def internDirectory( directory: str ):
+        path = Track._directories.get( directory, None )
+        if path == None:
+            path = Track._directories.setdefault( directory, pathlib.Path(directory) )
+        return path
+
+
+    @staticmethod
+    def toTimeStamp( date ):
+        """Convert a formatted date, datetime or time stamp to seconds since the epoch"""
+        if isinstance( date, str ):
+            return Track.parseTimeStamp( date )
+        elif isinstance( date, datetime.datetime ):
+            return int( date.timestamp() )
+        else:
+            return int( date )
+
+
+    @staticmethod
+    @functools.lru_cache( maxsize=0x4000 )
+    def parseTimeStamp( date: str ):
+        """Parse a date in the format of dateTimeFormat to seconds since the epoch.
+        Stored dates have minute resolution so plenty of tracks share the same one."""
+        if len( date ) == 16 and date[2] == '-' and date[5] == '-' and date[10] == '_' and date[13] == ':':
+            dateTime = datetime.datetime( int(date[6:10]), int(date[3:5]), int(date[0:2]), int(date[11:13]), int(date[14:16]) )
+        else:
+            dateTime = datetime.datetime.strptime( date, Track.dateTimeFormat() )
+        return int( dateTime.timestamp() )
+
+
+    @staticmethod
+    @functools.lru_cache( maxsize=0x4000 )
+    def formatTimeStamp( timeStamp: int ):
+        return time.strftime( Track.dateTimeFormat(), time.localtime(timeStamp) )
+
+
+    @staticmethod
+    @functools.lru_cache( maxsize=0x100 )
+    def parseVolume( volume ):
+        """Volumes are shared objects as most tracks have the same one"""
+        return float( volume )
+
+
+    @staticmethod
+    def parseLoudness( loudness ):
+        """None and empty strings (unmeasured) become NaN"""
+        return float( loudness ) if loudness not in ( None, "" ) else math.nan
+
+
     @staticmethod
     def parseDateTime( date: str ):
-        return datetime.datetime.strptime( date, Track.dateTimeFormat() )
+        return datetime.datetime.fromtimestamp( Track.parseTimeStamp(date) )
 
 
     @staticmethod
@@ -54,22 +144,24 @@ class Track:
 
     @property
     def formattedLastPlayed( self ):
-        return self.formatDateTime( self._lastPlayed )
+        return self.formatTimeStamp( self._lastPlayed )
 
 
     @property
     def directory( self ):
-        return self._filePath.parent
+        return self._directory
 
 
     @property
     def name( self ):
-        return str(self._filePath.stem)
+        index = self._fileName.rfind( '.' )
+        return self._fileName[:index] if 0 < index < len(self._fileName) - 1 else self._fileName
 
 
     @property
     def extension( self ):
-        return str(self._filePath.suffix)
+        index = self._fileName.rfind( '.' )
+        return self._fileName[index:] if 0 < index < len(self._fileName) - 1 else ""
 
 
     @staticmethod
@@ -85,14 +177,35 @@ class Track:
 
     @property
     def filePath( self ):
-        return self._filePath
+        return self._directory / self._fileName
+
+
+    @property
+    def filePathString( self ):
+        """Same as str(filePath) without constructing a path object"""
+        return os.path.join( str(self._directory), self._fileName )
+
+
+    @property
+    def fileName( self ):
+        return self._fileName
 
 
     @property
     def lastPlayed( self ):
+        return datetime.datetime.fromtimestamp( self._lastPlayed )
+
+
+    @property
+    def lastPlayedTimeStamp( self ):
         return self._lastPlayed
 
 
+    @property
+    def playCount( self ):
+        return self._playCount
+
+
     @property
     def url( self ):
         return self._url
@@ -103,15 +216,26 @@ class Track:
         return self._volume
 
 
+    @property
+    def loudness( self ):
+        return self._loudness
+
+
+    def hasLoudness( self ):
+        """Whether the loudness was measured (it may still be infinite if the measurement failed)"""
+        return not math.isnan( self._loudness )
+
+
     def dict( self ):
         return {
-            "filePath"   : str(self._filePath),
+            "filePath"   : self.filePathString,
             "lastPlayed" : self.formattedLastPlayed,
             "playCount"  : self._playCount,
             "url"        : self._url,
-            "volume"     : str( self._volume )
+            "volume"     : "{:g}".format( self._volume ),
+            "loudness"   : "{:g}".format( self._loudness ) if self.hasLoudness() else None
         }
 
 
     def __str__( self ):
-        return str(self.dict())
\ No newline at end of file
+        return str(self.dict())
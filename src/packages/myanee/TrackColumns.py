@@ -0,0 +1,135 @@
+# --- STL Imports ---
+import array
+
+# --- Internal Imports ---
+from .Track import Track
+
+
+class TrackColumns:
+    """Array-backed storage of the numeric fields of many tracks (one row per track).
+    Values are stored unboxed, and the columns can be read and written in bulk.
+    Rows of removed tracks are released and handed out again by allocate."""
+
+    # Names of the columns
+    fields = ( "lastPlayed", "playCount", "volume", "loudness" )
+
+    def __init__( self ):
+        self.lastPlayed = array.array( 'q' )
+        self.playCount  = array.array( 'i' )
+        self.volume     = array.array( 'd' )
+        self.loudness   = array.array( 'd' )
+        self._freeRows  = []
+
+
+    def allocate( self ):
+        """Return the index of an empty row, reusing a released one if possible"""
+        if self._freeRows:
+            row = self._freeRows.pop()
+            for field in self.fields:
+                getattr( self, field )[row] = 0
+            return row
+
+        self.lastPlayed.append( 0 )
+        self.playCount.append( 0 )
+        self.volume.append( 0.0 )
+        self.loudness.append( 0.0 )
+        return len( self.lastPlayed ) - 1
+
+
+    def release( self, row: int ):
+        """Make a row that is no longer used available to allocate"""
+        self._freeRows.append( row )
+
+
+    def reserve( self, count: int ):
+        """Append 'count' empty rows and return the index of the first one"""
+        begin = len( self.lastPlayed )
+        self.lastPlayed.frombytes( bytes(count * self.lastPlayed.itemsize) )
+        self.playCount.frombytes( bytes(count * self.playCount.itemsize) )
+        self.volume.frombytes( bytes(count * self.volume.itemsize) )
+        self.loudness.frombytes( bytes(count * self.loudness.itemsize) )
+        return begin
+
+
+    @property
+    def numberOfFreeRows( self ):
+        return len( self._freeRows )
+
+
+    def __len__( self ):
+        return len( self.lastPlayed )
+
+
+
+
+def columnProperty( column: str ):
+    """Redirect a field of a track to its row in a column"""
+    def getter( track ):
+        return getattr( track._columns, column )[track._row]
+
+    def setter( track, value ):
+        getattr( track._columns, column )[track._row] = value
+
+    return property( getter, setter )
+
+
+
+
+class ColumnTrack( Track ):
+    """Track whose numeric fields live in a shared TrackColumns instead of separate python objects"""
+
+    __slots__ = ( "_columns", "_row" )
+
+    def __init__( self,
+                  columns: TrackColumns,
+                  filePath,
+                  lastPlayed,
+                  playCount=0,
+                  url="",
+                  volume=100,
+                  loudness=None,
+                  row=None ):
+        self._columns = columns
+        self._row     = columns.allocate() if row == None else row
+        Track.__init__( self, filePath, lastPlayed, playCount=playCount, url=url, volume=volume, loudness=loudness )
+
+
+    @staticmethod
+    def fromDict( columns: TrackColumns, data: dict ):
+        return ColumnTrack(
+            columns,
+            data["filePath"],
+            data["lastPlayed"],
+            playCount=data["playCount"],
+            url=data["url"],
+            volume=data["volume"],
+            loudness=data.get("loudness", None)
+        )
+
+
+    _lastPlayed = columnProperty( "lastPlayed" )
+    _playCount  = columnProperty( "playCount" )
+    _volume     = columnProperty( "volume" )
+    _loudness   = columnProperty( "loudness" )
+
+
+    def detach( self ):
+        """Move the fields to a column store of their own and release the row (once removed from its track list),
+        so the track stays usable (e.g.: while playing) without touching a row that may be reused"""
+        columns = TrackColumns()
+        row     = columns.allocate()
+        for field in TrackColumns.fields:
+            getattr( columns, field )[row] = getattr( self._columns, field )[self._row]
+        self._columns.release( self._row )
+        self._columns = columns
+        self._row     = row
+
+
+    @property
+    def columns( self ):
+        return self._columns
+
+
+    @property
+    def row( self ):
+        return self._row
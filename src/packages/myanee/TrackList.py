@@ -1,22 +1,71 @@
 # --- STL Imports ---
 import pathlib
-import json
+import threading
+import time
+import os
 
 # --- Internal Imports ---
 from .Track import Track
+from .TrackColumns import TrackColumns, ColumnTrack
+from .SubstringIndex import SubstringIndex
 from .Loggee import Loggee
 from .stream import Stream
+from .storage import TrackStorage, JSONTrackStorage
+from .snapshot import TrackSnapshot, LazyTracks
+from .utilities import URLUtilities
+from . import metrics
+
+
+TRACKLIST_SIZE  = metrics.registry.gauge("myanee_tracklist_size", "Tracks in a track list", ("list",))
+TRACKLIST_WRITE = metrics.registry.histogram("myanee_tracklist_write_seconds", "Time taken to write the changes of a track list to its storage", ("list",))
 
 
 class TrackList(Loggee):
 
-    def __init__(self, directory: pathlib.Path, logStream: Stream):
+    # Track list storage files and unfinished downloads living next to the tracks
+    _nonAudioSuffixes = {".json", ".sqlite", ".sqlite-wal", ".sqlite-shm", ".sqlite-journal", ".snapshot", ".tmp", ".part", ".ytdl"}
+
+    # Seconds to wait after a write before refreshing the snapshot
+    snapshotDelay = 300.0
+
+    def __init__(self,
+                 directory: pathlib.Path,
+                 logStream: Stream,
+                 storage: TrackStorage=None,
+                 columnar=False,
+                 useSnapshot=False):
         Loggee.__init__(self, logStream, name="TrackList")
         self._directory = directory
-        self._filePath  = directory / "track_list.json"
-        self._tracks    = {}
+        self._storage   = storage if storage != None else JSONTrackStorage(directory / "track_list.json")
+        self._tracks    = LazyTracks()
+
+        # Binary image of the track list for fast startups (see TrackSnapshot)
+        self._useSnapshot   = useSnapshot
+        self._snapshotPath  = directory / "track_list.snapshot"
+        self._snapshotTimer = None
+        self._snapshotLock  = threading.Lock()
+        self._isClosed      = False
+
+        # Numeric fields of the tracks created by this list are kept in arrays if requested
+        self._columns   = TrackColumns() if columnar else None
+
+        # Names of tracks that need to be written to / deleted from the storage
+        self._changed   = set()
+        self._removed   = set()
+        self._lock      = threading.Lock()
+
+        # Secondary indexes, kept in sync by addTrack and removeTrack.
+        # A key maps to the first track that has it, the others wait in the duplicates (key => names) until it's removed.
+        self._filePathIndex = {}
+        self._urlIndex      = {} # keyed by URLUtilities.cacheKey, so every form of a link finds its track
+        self._duplicates    = {} # keys of both indexes don't overlap (paths vs. cache keys)
+        self._nameIndex     = SubstringIndex()
+
+        # Objects notified about added, removed and updated tracks (see TrackSampler)
+        self._listeners     = []
 
         self.load()
+        TRACKLIST_SIZE.setFunction(self.__len__, list=directory.name)
 
 
     def getTracksByFilter(self, filterFunction: callable):
@@ -29,68 +78,302 @@ class TrackList(Loggee):
 
 
     def getTracksByPartialName(self, query: str):
-        return self.getTracksByFilter(lambda key, value: query in key)
+        return [self._tracks[name] for name in self._nameIndex.query(query)]
 
 
     def getTrackByFilePath(self, path: pathlib.Path):
-        hits = self.getTracksByFilter(lambda name, track: track.filePath == path)
-        if hits:
-            return hits[0]
+        name = self._filePathIndex.get(str(path), None)
+        if name is not None:
+            return self._tracks[name]
         else:
             return None
 
 
     def getTrackByURL(self, url: str):
-        def isURLMatch(name: str, track: Track):
-            return track.url == url
-        hits = self.getTracksByFilter(isURLMatch)
-
-        if hits:
-            return hits[0]
+        name = self._urlIndex.get(URLUtilities.cacheKey(url), None)
+        if name is not None:
+            return self._tracks[name]
         else:
             return None
 
 
     def writeToFile(self):
-        with open(self._filePath, 'w') as file:
-            json.dump(
-                { key : value.dict() for key, value in self._tracks.items() },
-                file,
-                indent="    "
-            )
+        """Persist the tracks that changed since the last write"""
+        if self.flush() and self._useSnapshot:
+            self.scheduleSnapshot(self.snapshotDelay)
+
+
+    def flush(self):
+        """Write changes to the storage and return whether there were any"""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            removed, self._removed = self._removed, set()
+            begin = time.perf_counter()
+            self._storage.write(self._tracks, changed, removed)
+            if changed or removed:
+                TRACKLIST_WRITE.observe(time.perf_counter() - begin, list=self._directory.name)
+        return bool(changed or removed)
+
 
     def load(self):
-        """Populate the track list"""
-        if self._filePath.is_file():
-            with open(self._filePath, 'r') as file:
-                contents = json.load(file)
+        """Populate the track list from the snapshot if it is up to date, or from the storage otherwise"""
+        snapshot = self.readSnapshot() if self._useSnapshot else None
+
+        if snapshot != None:
+            self.loadSnapshot(snapshot)
+        else:
+            for trackName, trackData in self._storage.load().items():
+                self.addTrack(self.makeTrackFromDict(trackData), existOK=True)
 
-                for trackName, trackData in contents.items():
-                    self._tracks[trackName] = Track.fromDict(trackData)
+            # Freshly loaded tracks are identical to their stored versions
+            with self._lock:
+                self._changed.clear()
 
         self.update()
 
+        if self._useSnapshot and snapshot == None:
+            self.scheduleSnapshot(0.0)
+
+
+    def readSnapshot(self):
+        snapshot = TrackSnapshot.read(self._snapshotPath)
+        if snapshot != None and snapshot.revision != self._storage.revision:
+            self.log("snapshot of {} is outdated".format(self._directory))
+            snapshot = None
+        return snapshot
+
+
+    def loadSnapshot(self, snapshot: TrackSnapshot):
+        """Build the indexes from a snapshot but defer creating the tracks until they are accessed"""
+        if self._columns != None:
+            self._columns = snapshot.columns # rows of the snapshot become rows of the column store
+
+        self._tracks = LazyTracks(snapshot, self.makeTrackFromRow)
+
+        # Keep the first of any duplicates, like addTrack does
+        directories = [os.path.join(directory, "") for directory in snapshot.directories]
+        filePaths = [directories[directoryIndex] + fileName for directoryIndex, fileName in zip(snapshot.directoryIndices, snapshot.fileNames)]
+        self._filePathIndex = {filePath : name for filePath, name in zip(reversed(filePaths), reversed(snapshot.names))}
+        cacheKey = URLUtilities.cacheKey
+        urls = [(cacheKey(url), name) for url, name in zip(snapshot.urls, snapshot.names) if url]
+        self._urlIndex = {key : name for key, name in reversed(urls)}
+        self._nameIndex.update(snapshot.names)
+
+        # Remember the rest of the duplicates (if there are any)
+        self._duplicates = {}
+        for index, pairs in ((self._filePathIndex, list(zip(filePaths, snapshot.names))), (self._urlIndex, urls)):
+            if len(index) < len(pairs):
+                for key, name in pairs:
+                    if index[key] != name:
+                        self._duplicates.setdefault(key, []).append(name)
+
+
+    def writeSnapshot(self):
+        """Flush pending changes and store a snapshot of the current state"""
+        with self._snapshotLock:
+            self.flush()
+            TrackSnapshot.fromRows(self._storage.revision, self._tracks.rows()).write(self._snapshotPath)
+
+
+    def scheduleSnapshot(self, delay: float):
+        """Write a snapshot on a background thread after 'delay' seconds unless one is scheduled already"""
+        with self._lock:
+            if self._snapshotTimer == None and not self._isClosed:
+                self._snapshotTimer = threading.Timer(delay, self.onSnapshotTimer)
+                self._snapshotTimer.daemon = True
+                self._snapshotTimer.start()
+
+
+    def onSnapshotTimer(self):
+        with self._lock:
+            self._snapshotTimer = None
+            if self._isClosed:
+                return
+
+        try:
+            self.writeSnapshot()
+        except Exception as exception:
+            self.log("failed to write snapshot of {}\n{}".format(self._directory, exception))
+
+
+    def close(self):
+        """Flush pending changes and release the storage"""
+        with self._lock:
+            self._isClosed = True
+            if self._snapshotTimer != None:
+                self._snapshotTimer.cancel()
+                self._snapshotTimer = None
+
+        if self._useSnapshot:
+            self.writeSnapshot()
+        else:
+            self.flush()
+        self._storage.close()
+        TRACKLIST_SIZE.remove(list=self._directory.name)
+
+
+    def onTrackUpdate(self, track: Track):
+        """Gets called by tracks in this list when they change"""
+        if track.hasURL():
+            self.addToIndex(self._urlIndex, URLUtilities.cacheKey(track.url), track.name)
+
+        with self._lock:
+            self._changed.add(track.name)
+
+        for listener in self._listeners:
+            listener.onTrackUpdated(track)
+
+
+    def addToIndex(self, index: dict, key: str, name: str):
+        """Map a key to a track unless another track has it already (then it is a duplicate)"""
+        indexed = index.setdefault(key, name)
+        if indexed != name:
+            names = self._duplicates.setdefault(key, [])
+            if not name in names:
+                names.append(name)
+
+
+    def removeFromIndex(self, index: dict, key: str, name: str):
+        """Unmap a key from a track, handing it over to the next track with that key if there is one"""
+        names = self._duplicates.get(key, None)
+        if index.get(key, None) == name:
+            if names:
+                index[key] = names.pop(0)
+            else:
+                del index[key]
+        elif names and name in names:
+            names.remove(name)
+
+        if names == []:
+            del self._duplicates[key]
+
+
+    def addListener(self, listener):
+        """Register an object with onTrackAdded, onTrackRemoved and onTrackUpdated methods"""
+        self._listeners.append(listener)
+
+
+    def removeListener(self, listener):
+        self._listeners.remove(listener)
+
 
     def update(self):
         """Make sure only existing tracks are in the list, but all of them are there"""
+        # List the directory once instead of checking each track separately.
+        # Only names that are not known yet need to be checked for being files.
+        fileNames = set(os.listdir(self._directory))
+
+        # Diff the listing against the file path index (without creating tracks from the snapshot)
+        prefix = os.path.join(str(self._directory), "")
+        length = len(prefix)
+        known  = {filePath[length:] : name for filePath, name in self._filePathIndex.items() if filePath.startswith(prefix)}
+        others = [(filePath, name) for filePath, name in self._filePathIndex.items() if not filePath.startswith(prefix)]
+        for fileName in [fileName for fileName in known if os.sep in fileName]:
+            others.append((prefix + fileName, known.pop(fileName)))
+
         # Check whether all tracks in the list point to existing files
-        self._tracks = { trackName : track for trackName, track in self._tracks.items() if track.isDownloaded() }
+        missing = [known[fileName] for fileName in known.keys() - fileNames]
+        missing += [name for filePath, name in others if not os.path.isfile(filePath)]
+        for name in missing:
+            self.removeTrack(self._tracks[name])
 
         # Register new tracks
-        for filePath in self._directory.glob("*.*"):
-            if self.isAudioFile(filePath):
-                self.addTrack(
-                    Track(
-                        filePath,
-                        Track.formatDateTime(Track.defaultDateTime())
-                   ),
-                    existOK=True
-                )
+        for fileName in fileNames - known.keys():
+            filePath = self._directory / fileName
+            if self.isAudioFileName(fileName) and not os.path.splitext(fileName)[0] in self._tracks and filePath.is_file():
+                self.addTrack(self.makeTrack(filePath), existOK=True)
+
+
+    def onFileCreated(self, filePath: pathlib.Path):
+        """Register a new file in the directory"""
+        if self.isAudioFileName(filePath.name):
+            track = self.getTrackByFilePath(filePath)
+            if track == None:
+                self.addTrack(self.makeTrack(filePath), existOK=True)
+            else: # the file of a listed track was written (e.g.: its download finished, see Guild.downloadTrack)
+                for listener in self._listeners:
+                    listener.onTrackUpdated(track)
+
+
+    def onFileDeleted(self, filePath: pathlib.Path):
+        """Forget a file that was removed from the directory"""
+        track = self.getTrackByFilePath(filePath)
+        if track != None:
+            self.removeTrack(track)
+
+
+    def onFileMoved(self, sourcePath: pathlib.Path, targetPath: pathlib.Path):
+        """Keep the properties of a renamed track"""
+        track = self.getTrackByFilePath(sourcePath)
+        if track == None:
+            self.onFileCreated(targetPath)
+        else:
+            self.removeTrack(track)
+            if self.isAudioFileName(targetPath.name):
+                data = track.dict()
+                data["filePath"] = str(targetPath)
+                self.addTrack(self.makeTrackFromDict(data), existOK=True)
+
+
+    def makeTrack(self, filePath: pathlib.Path):
+        """Create a track that was never played"""
+        lastPlayed = Track.formatDateTime(Track.defaultDateTime())
+        if self._columns != None:
+            return ColumnTrack(self._columns, filePath, lastPlayed)
+        else:
+            return Track(filePath, lastPlayed)
+
+
+    def makeTrackFromDict(self, data: dict):
+        if self._columns != None:
+            return ColumnTrack.fromDict(self._columns, data)
+        else:
+            return Track.fromDict(data)
+
+
+    def makeTrackFromRow(self, snapshot: TrackSnapshot, row: int):
+        """Create the track of a snapshot row on first access"""
+        columns = snapshot.columns
+        if self._columns is columns:
+            track = ColumnTrack(
+                columns,
+                snapshot.filePathString(row),
+                columns.lastPlayed[row],
+                playCount=columns.playCount[row],
+                url=snapshot.urls[row],
+                volume=columns.volume[row],
+                loudness=columns.loudness[row],
+                row=row
+            )
+        else:
+            track = Track(
+                snapshot.filePathString(row),
+                columns.lastPlayed[row],
+                playCount=columns.playCount[row],
+                url=snapshot.urls[row],
+                volume=columns.volume[row],
+                loudness=columns.loudness[row]
+            )
+
+        track.setUpdateHook(self.onTrackUpdate)
+        return track
 
 
     def addTrack(self, track: Track, existOK=False):
         if not track.name in self._tracks:
             self._tracks[track.name] = track
+            self.addToIndex(self._filePathIndex, track.filePathString, track.name)
+            if track.hasURL():
+                self.addToIndex(self._urlIndex, URLUtilities.cacheKey(track.url), track.name)
+            self._nameIndex.add(track.name)
+            track.setUpdateHook(self.onTrackUpdate)
+
+            with self._lock:
+                self._changed.add(track.name)
+                self._removed.discard(track.name)
+
+            for listener in self._listeners:
+                listener.onTrackAdded(track)
         else:
             if not existOK:
                 self.error("Attempt to add existing track to list {}".format(track))
@@ -98,12 +381,73 @@ class TrackList(Loggee):
         return track.name
 
 
+    def removeTrack(self, track: Track):
+        """Remove a track from the list and all of its indexes"""
+        if self._tracks.get(track.name, None) is track:
+            del self._tracks[track.name]
+            self.removeFromIndex(self._filePathIndex, track.filePathString, track.name)
+            if track.hasURL():
+                self.removeFromIndex(self._urlIndex, URLUtilities.cacheKey(track.url), track.name)
+            self._nameIndex.remove(track.name)
+            track.setUpdateHook(None)
+            if self._columns != None and getattr(track, "columns", None) is self._columns: # recycle its row
+                track.detach()
+
+            with self._lock:
+                self._changed.discard(track.name)
+                self._removed.add(track.name)
+
+            for listener in self._listeners:
+                listener.onTrackRemoved(track)
+
+
+    @property
+    def tracks(self):
+        return list(self._tracks.values())
+
+
+    def rows(self):
+        """Fields of every track as tuples, without creating the ones still in the snapshot (see LazyTracks.rows)"""
+        return self._tracks.rows()
+
+
+    @property
+    def snapshotPath(self):
+        return self._snapshotPath
+
+
+    def __len__(self):
+        return len(self._tracks)
+
+
     @staticmethod
     def getEmptyTrackList():
         return r"""{}"""
 
 
+    @property
+    def storage(self):
+        return self._storage
+
+
+    @property
+    def directory(self):
+        return self._directory
+
+
+    @property
+    def columns(self):
+        """Array-backed fields of the tracks created by this list (None unless columnar)"""
+        return self._columns
+
+
     @staticmethod
     def isAudioFile(filePath: pathlib.Path):
         """Temporary implementation"""
-        return filePath.is_file() and str(filePath.suffix).lower() != ".json"
\ No newline at end of file
+        return filePath.is_file() and TrackList.isAudioFileName(filePath.name)
+
+
+    @staticmethod
+    def isAudioFileName(fileName: str):
+        suffix = os.path.splitext(fileName)[1].lower()
+        return bool(suffix) and not suffix in TrackList._nonAudioSuffixes
\ No newline at end of file
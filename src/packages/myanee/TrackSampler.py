@@ -0,0 +1,320 @@
+# --- STL Imports ---
+import collections
+import datetime
+import threading
+import random
+import heapq
+import time
+
+# --- Internal Imports ---
+from .Track import Track
+
+
+# The fields of a track that sampling depends on, read off the rows of a track list (see TrackList.rows)
+TrackRow = collections.namedtuple("TrackRow", ("name", "lastPlayedTimeStamp", "playCount"))
+
+
+class FenwickTree:
+    """Prefix sums over a fixed number of weights with logarithmic updates and weighted search"""
+
+    def __init__(self, weights: list):
+        self._size = len(weights)
+        self._tree = [0.0] + list(weights)
+        for index in range(1, self._size + 1):
+            parent = index + (index & -index)
+            if parent <= self._size:
+                self._tree[parent] += self._tree[index]
+
+
+    def add(self, index: int, delta: float):
+        index += 1
+        while index <= self._size:
+            self._tree[index] += delta
+            index += index & -index
+
+
+    def prefixSum(self, count: int):
+        """Sum of the first 'count' weights"""
+        total = 0.0
+        while 0 < count:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+
+    def find(self, value: float):
+        """Index of the weight that contains 'value' if the weights were laid out on a line"""
+        position = 0
+        step = 1 << (self._size.bit_length() - 1) if self._size else 0
+        while step:
+            candidate = position + step
+            if candidate <= self._size and self._tree[candidate] <= value:
+                position = candidate
+                value -= self._tree[candidate]
+            step >>= 1
+        return position
+
+
+    @property
+    def total(self):
+        return self.prefixSum(self._size)
+
+
+    def __len__(self):
+        return self._size
+
+
+
+
+class TrackSampler:
+    """Draw random tracks from a TrackList that were not played within 'rule' and are not excluded (queued).
+    Each track occupies a slot in a Fenwick tree holding its weight if it is eligible and 0 otherwise,
+    while tracks that were played recently wait in a heap ordered by their last play until they become
+    eligible again. Drawing, excluding and updating a track all take logarithmic time.
+    Slots are built from the rows of the list, so tracks that were not loaded yet (see LazyTracks) are only
+    created once they are drawn. 'weightFunction' gets a Track or a TrackRow."""
+
+    def __init__(self,
+                 trackList,
+                 rule: datetime.timedelta,
+                 weightFunction=None,
+                 clock=time.time):
+        self._trackList      = trackList
+        self._rule           = rule.total_seconds()
+        self._weightFunction = weightFunction if weightFunction != None else TrackSampler.uniformWeight
+        self._clock          = clock
+        self._lock           = threading.RLock()
+
+        self._slots          = []  # track name or None per slot
+        self._weights        = []  # weight of the track in each slot, regardless of its eligibility
+        self._timeStamps     = []  # last play of the track in each slot
+        self._eligible       = []  # whether the track in each slot was last played before the cutoff
+        self._slotOf         = {}  # track name => slot
+        self._excluded       = {}  # track name => number of exclusions
+        self._pending        = []  # heap of (lastPlayed, slot) for ineligible tracks
+        self._tree           = FenwickTree([])
+        self._vacant         = 0
+
+        self.rebuild([TrackRow(row[0], row[4], row[5]) for row in trackList.rows()])
+        trackList.addListener(self)
+
+
+    def sample(self):
+        """Return a random eligible track or None"""
+        tracks = self.sampleBatch(1)
+        return tracks[0] if tracks else None
+
+
+    def sampleBatch(self, count: int):
+        """Return up to 'count' distinct random eligible tracks"""
+        with self._lock:
+            self.promote()
+
+            slots = []
+            try:
+                while len(slots) < count:
+                    total = self._tree.total
+                    if total <= 0.0:
+                        break
+
+                    slot = self._tree.find(random.uniform(0.0, total))
+                    slot = min(slot, len(self._slots) - 1)
+                    weight = self.effectiveWeight(slot)
+                    if weight <= 0.0: # floating point drift => resynchronize and retry
+                        self.rebuildTree()
+                        continue
+
+                    # Sample without replacement by temporarily dropping the drawn track
+                    self._tree.add(slot, -weight)
+                    slots.append(slot)
+            finally:
+                for slot in slots:
+                    self._tree.add(slot, self.effectiveWeight(slot))
+
+            return [self._trackList.getTrackByFullName(self._slots[slot]) for slot in slots]
+
+
+    def exclude(self, track: Track):
+        """Prevent a track from being drawn until it is included again (e.g.: while it is queued)"""
+        with self._lock:
+            self.setExclusions(track, self._excluded.get(track.name, 0) + 1)
+
+
+    def include(self, track: Track):
+        """Revert one call to exclude"""
+        with self._lock:
+            self.setExclusions(track, self._excluded.get(track.name, 0) - 1)
+
+
+    def isExcluded(self, track: Track):
+        return track.name in self._excluded
+
+
+    def close(self):
+        """Stop following the track list"""
+        self._trackList.removeListener(self)
+
+
+    # TrackList listener interface
+
+    def onTrackAdded(self, track: Track):
+        with self._lock:
+            self.insert(track)
+
+
+    def onTrackRemoved(self, track: Track):
+        with self._lock:
+            slot = self._slotOf.pop(track.name, None)
+            if slot != None:
+                self._tree.add(slot, -self.effectiveWeight(slot))
+                self._slots[slot]    = None
+                self._weights[slot]  = 0.0
+                self._eligible[slot] = False
+                self._vacant += 1
+
+                if len(self._slots) < 2 * self._vacant:
+                    self.compact()
+
+
+    def onTrackUpdated(self, track: Track):
+        with self._lock:
+            slot = self._slotOf.get(track.name, None)
+            if slot != None:
+                self._tree.add(slot, -self.effectiveWeight(slot))
+                self._weights[slot]    = self._weightFunction(track)
+                self._timeStamps[slot] = self.timeStamp(track)
+                self._eligible[slot]   = self._timeStamps[slot] <= self.cutoff
+                if not self._eligible[slot]:
+                    heapq.heappush(self._pending, (self._timeStamps[slot], slot))
+                self._tree.add(slot, self.effectiveWeight(slot))
+
+
+    # Internals
+
+    def insert(self, track):
+        if track.name in self._slotOf:
+            return
+
+        slot = len(self._slots)
+        self._slots.append(track.name)
+        self._weights.append(self._weightFunction(track))
+        self._timeStamps.append(self.timeStamp(track))
+        self._eligible.append(self._timeStamps[slot] <= self.cutoff)
+        self._slotOf[track.name] = slot
+
+        if not self._eligible[slot]:
+            heapq.heappush(self._pending, (self._timeStamps[slot], slot))
+
+        if len(self._tree) < len(self._slots):
+            # Grow the tree geometrically
+            self.rebuildTree(capacity=2 * len(self._slots))
+        else:
+            self._tree.add(slot, self.effectiveWeight(slot))
+
+
+    def promote(self):
+        """Mark tracks whose last play dropped behind the cutoff as eligible"""
+        cutoff = self.cutoff
+        while self._pending and self._pending[0][0] <= cutoff:
+            timeStamp, slot = heapq.heappop(self._pending)
+
+            # Skip entries of removed or replayed tracks
+            if slot < len(self._slots) and self._slots[slot] != None and not self._eligible[slot] and self._timeStamps[slot] <= cutoff:
+                self._eligible[slot] = True
+                self._tree.add(slot, self.effectiveWeight(slot))
+
+
+    def setExclusions(self, track: Track, count: int):
+        """Set the number of exclusions of a track and update its weight in the tree accordingly"""
+        slot = self._slotOf.get(track.name, None)
+        before = self.effectiveWeight(slot) if slot != None else 0.0
+
+        if 0 < count:
+            self._excluded[track.name] = count
+        else:
+            self._excluded.pop(track.name, None)
+
+        if slot != None:
+            self._tree.add(slot, self.effectiveWeight(slot) - before)
+
+
+    def effectiveWeight(self, slot: int):
+        if slot < len(self._slots) and self._eligible[slot] and not self._slots[slot] in self._excluded:
+            return self._weights[slot]
+        return 0.0
+
+
+    def rebuild(self, tracks):
+        """Reassign slots to a new set of tracks (or TrackRows)"""
+        self._slots      = []
+        self._weights    = []
+        self._timeStamps = []
+        self._slotOf     = {}
+
+        for track in tracks:
+            if not track.name in self._slotOf:
+                self._slotOf[track.name] = len(self._slots)
+                self._slots.append(track.name)
+                self._weights.append(self._weightFunction(track))
+                self._timeStamps.append(self.timeStamp(track))
+
+        self.reindex()
+
+
+    def compact(self):
+        """Drop the vacant slots of removed tracks"""
+        occupied = [slot for slot, name in enumerate(self._slots) if name != None]
+        self._slots      = [self._slots[slot] for slot in occupied]
+        self._weights    = [self._weights[slot] for slot in occupied]
+        self._timeStamps = [self._timeStamps[slot] for slot in occupied]
+        self._slotOf     = {name : slot for slot, name in enumerate(self._slots)}
+        self.reindex()
+
+
+    def reindex(self):
+        """Recompute the eligibility, the pending heap and the tree of the current slots"""
+        cutoff = self.cutoff
+        self._eligible = [timeStamp <= cutoff for timeStamp in self._timeStamps]
+        self._pending  = [(timeStamp, slot) for slot, timeStamp in enumerate(self._timeStamps) if not self._eligible[slot]]
+        heapq.heapify(self._pending)
+        self._vacant   = 0
+        self._tree     = FenwickTree([])
+        self.rebuildTree()
+
+
+    def rebuildTree(self, capacity=0):
+        weights = [self.effectiveWeight(slot) for slot in range(len(self._slots))]
+        weights += [0.0] * max(0, max(capacity, len(self._tree)) - len(weights))
+        self._tree = FenwickTree(weights)
+
+
+    @property
+    def cutoff(self):
+        return self._clock() - self._rule
+
+
+    @staticmethod
+    def timeStamp(track):
+        return track.lastPlayedTimeStamp
+
+
+    @staticmethod
+    def uniformWeight(track):
+        return 1.0
+
+
+    @staticmethod
+    def leastPlayedWeight(track):
+        """Prefer tracks that were played less often"""
+        return 1.0 / (1.0 + track.playCount)
+
+
+    @property
+    def numberOfEligibleTracks(self):
+        with self._lock:
+            self.promote()
+            return sum(1 for slot in range(len(self._slots)) if 0.0 < self.effectiveWeight(slot))
+
+
+    def __len__(self):
+        return len(self._slotOf)
@@ -0,0 +1,74 @@
+# --- STL Imports ---
+import pathlib
+import sqlite3
+import threading
+import json
+import time
+
+# --- Internal Imports ---
+from .utilities import URLUtilities
+
+
+class URLInfoCache( object ):
+    """Persistent cache of trimmed youtube_dl info dicts, shared by all forms of a link (see URLUtilities.cacheKey).
+    Entries older than 'timeToLive' seconds are treated as missing."""
+
+    # Fields of the info dict that are worth keeping
+    fields = ( "id", "title", "ext", "duration", "format_id" )
+
+    def __init__( self, filePath: pathlib.Path, timeToLive=7*24*3600, clock=time.time ):
+        self._filePath   = pathlib.Path( filePath )
+        self._timeToLive = timeToLive
+        self._clock      = clock
+        self._lock       = threading.Lock()
+
+        self._connection = sqlite3.connect( str(self._filePath), check_same_thread=False )
+        self._connection.execute( "PRAGMA journal_mode=WAL" )
+        self._connection.execute( "PRAGMA synchronous=NORMAL" )
+
+        with self._connection:
+            self._connection.execute( "CREATE TABLE IF NOT EXISTS info (url TEXT PRIMARY KEY, data TEXT, created INTEGER)" )
+
+
+    def get( self, url: str ):
+        """Return the cached info of a url or None if it is missing or expired"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data, created FROM info WHERE url=?",
+                ( URLUtilities.cacheKey(url), )
+            ).fetchone()
+
+        if row == None or row[1] + self._timeToLive < self._clock():
+            return None
+        return json.loads( row[0] )
+
+
+    def set( self, url: str, info: dict ):
+        """Store the trimmed version of an info dict and return it"""
+        info = self.trim( info )
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO info (url, data, created) VALUES (?, ?, ?)",
+                ( URLUtilities.cacheKey(url), json.dumps(info), int(self._clock()) )
+            )
+        return info
+
+
+    def remove( self, url: str ):
+        with self._lock, self._connection:
+            self._connection.execute( "DELETE FROM info WHERE url=?", (URLUtilities.cacheKey(url),) )
+
+
+    def close( self ):
+        with self._lock:
+            self._connection.close()
+
+
+    @classmethod
+    def trim( cls, info: dict ):
+        return { key : info.get(key, None) for key in cls.fields }
+
+
+    @property
+    def filePath( self ):
+        return self._filePath
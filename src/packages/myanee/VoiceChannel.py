@@ -6,6 +6,7 @@ import pathlib
 from .Channel import Channel
 from .stream import Stream
 from .Loggee import Loggee
+from .OpusCache import OggOpusSource
 
 
 class VoiceChannel(Channel, Loggee):
@@ -40,23 +41,44 @@ class VoiceChannel(Channel, Loggee):
                 self.error( "failed to disconnect\n{}".format(exception) )
 
 
-    def play( self, filePath: pathlib.Path, hook: callable ):
+    def play( self, filePath: pathlib.Path, hook: callable, stream=None, source=None, opusPath=None, gain=1.0 ):
+        """Play a file, or feed ffmpeg from 'stream' if the file is incomplete (see GrowingFileReader).
+        'source' may be an audio source of the file that was prepared in advance."""
         if self._voiceClient != None and self._voiceClient:
             try:
-                self._voiceClient.play(
-                    discord.FFmpegPCMAudio( source=str(filePath) ),
-                    after=hook
-                )
+                if source == None:
+                    source = self.prepare( filePath, stream=stream, opusPath=opusPath, gain=gain )
+
+                self._voiceClient.play( source, after=hook )
             except Exception as exception:
                 self.error( "error during playback\n{}".format(exception) )
         else:
             self.error( "voice client is unavailable" )
 
 
+    @staticmethod
+    def prepare( filePath: pathlib.Path, stream=None, opusPath=None, gain=1.0 ):
+        """Create the audio source of a file, which starts transcoding it right away.
+        Files with an opus copy (see OpusCache) are played from that without transcoding; the copy
+        already has its gain applied. Otherwise ffmpeg scales the samples by 'gain' while decoding."""
+        if opusPath != None:
+            return OggOpusSource( opusPath )
+
+        options = "-vn" if gain == 1.0 else "-vn -af volume={:.4f}".format( gain )
+        if stream != None:
+            return discord.FFmpegPCMAudio( source=stream, pipe=True, options=options )
+        else:
+            return discord.FFmpegPCMAudio( source=str(filePath), options=options )
+
+
     def stop( self ):
         self._voiceClient.stop()
 
 
+    def isPlaying( self ):
+        return self._voiceClient != None and self._voiceClient.is_playing()
+
+
     @property
     def id( self ):
         return self._channel.id
@@ -64,4 +86,30 @@ class VoiceChannel(Channel, Loggee):
     
     @property
     def members( self ):
-        return list(self._channel.voice_states.keys())
\ No newline at end of file
+        return list(self._channel.voice_states.keys())
+
+
+
+
+class MeasuredSource(discord.AudioSource):
+    """Wraps an audio source and calls 'onFirstFrame' once its first frame is read (on the player's thread)"""
+
+    def __init__( self, source: discord.AudioSource, onFirstFrame: callable ):
+        self._source       = source
+        self._onFirstFrame = onFirstFrame
+
+
+    def read( self ):
+        data = self._source.read()
+        if self._onFirstFrame != None:
+            onFirstFrame, self._onFirstFrame = self._onFirstFrame, None
+            onFirstFrame()
+        return data
+
+
+    def is_opus( self ):
+        return self._source.is_opus()
+
+
+    def cleanup( self ):
+        self._source.cleanup()
@@ -0,0 +1,207 @@
+# --- External Imports ---
+import yt_dlp as youtube_dl
+from yt_dlp.utils import DownloadCancelled
+
+# --- STL Imports ---
+import asyncio
+
+# --- Internal Imports ---
+from .URLInfoCache import URLInfoCache
+from .utilities import processContext
+
+
+# Fields of youtube_dl's progress dicts that are sent back to the main process
+PROGRESS_FIELDS = ( "status", "filename", "tmpfilename", "downloaded_bytes", "total_bytes", "total_bytes_estimate", "elapsed", "eta", "speed" )
+
+
+def serve(connection):
+    """Main function of a worker process: run the requests arriving on the connection until it's closed
+    or 'stop' arrives (other workers may hold the main process' end of the connection too).
+    A request is a tuple of 'extract' or 'download', a url and youtube_dl options. Replies are tuples of
+    'progress', 'result', 'cancelled' or 'error' and a value."""
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            return
+
+        if request[0] == "stop":
+            return
+
+        if request[0] == "cancel": # arrived after its request finished
+            continue
+
+        try:
+            connection.send(("result", handle(connection, *request)))
+        except DownloadCancelled:
+            connection.send(("cancelled", None))
+        except Exception as exception:
+            connection.send(("error", str(exception)))
+
+
+def handle(connection, kind: str, url: str, settings: dict):
+    def hook(info: dict):
+        connection.send(("progress", {key : info[key] for key in PROGRESS_FIELDS if key in info}))
+        # The main process asks to stop by sending 'cancel' while the download runs
+        if connection.poll() and connection.recv()[0] == "cancel":
+            raise DownloadCancelled("Download of {} was cancelled".format(url))
+
+    settings = dict(settings, progress_hooks=[hook])
+    with youtube_dl.YoutubeDL(settings) as youtube:
+        if kind == "extract":
+            return URLInfoCache.trim(youtube.extract_info(url, download=False))
+        else:
+            youtube.extract_info(url, download=True)
+
+
+
+
+class YoutubeDLProcess:
+    """A worker process with youtube_dl loaded, running one request at a time.
+    Its replies are read on the event loop without blocking it."""
+
+    def __init__(self, context):
+        self._connection, childConnection = context.Pipe()
+        self._process = context.Process(target=serve, args=(childConnection,), name="youtube_dl", daemon=True)
+        self._process.start()
+        childConnection.close()
+        self._isBusy = False
+
+
+    async def call(self, request: tuple, onProgress: callable=None, isCancelled: callable=None):
+        """Send a request and wait for its result. Progress replies are passed to 'onProgress', after which
+        the request is cancelled if 'isCancelled' returns True or 'onProgress' raised an exception."""
+        loop     = asyncio.get_running_loop()
+        replies  = asyncio.Queue()
+        error    = None
+        isCancelling = False
+
+        fileDescriptor = self._connection.fileno()
+        loop.add_reader(fileDescriptor, self.receive, replies)
+        self._isBusy = True
+        try:
+            self._connection.send(request)
+            while True:
+                kind, value = await replies.get()
+                if kind == "progress":
+                    try:
+                        if onProgress != None:
+                            onProgress(value)
+                    except Exception as exception:
+                        error = exception
+                    if not isCancelling and (error != None or (isCancelled != None and isCancelled())):
+                        self._connection.send(("cancel",))
+                        isCancelling = True
+                elif kind == "result" and error == None:
+                    return value
+                elif kind == "error":
+                    raise Exception(value)
+                else:
+                    raise error if error != None else DownloadCancelled("{} was cancelled".format(request[1]))
+
+        except asyncio.CancelledError:
+            # The process would still be busy with the request
+            loop.remove_reader(fileDescriptor)
+            self.kill()
+            raise
+
+        finally:
+            loop.remove_reader(fileDescriptor)
+            self._isBusy = False
+
+
+    def receive(self, replies: asyncio.Queue):
+        """Move the available replies to the queue (called by the event loop)"""
+        try:
+            while self._connection.poll():
+                replies.put_nowait(self._connection.recv())
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(self._connection.fileno())
+            self.kill()
+            replies.put_nowait(("error", "the youtube_dl process exited"))
+
+
+    def kill(self):
+        if self._process.is_alive():
+            self._process.kill()
+        self._connection.close()
+
+
+    def stop(self, timeout=1.0):
+        """Let the process exit, or kill it if it's busy"""
+        if self._isBusy:
+            self.kill()
+        elif not self._connection.closed:
+            try:
+                self._connection.send(("stop",))
+            except OSError:
+                pass
+            self._connection.close()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.kill()
+
+
+    @property
+    def isAlive(self):
+        return not self._connection.closed and self._process.is_alive()
+
+
+
+
+class YoutubeDLPool:
+    """Long-lived worker processes that run youtube_dl, so that its extraction (which is pure python and
+    CPU heavy) doesn't compete with the event loop and the voice threads for the GIL.
+    The processes are started on first use, and replaced if they die or a request is abandoned."""
+
+    def __init__(self, numberOfProcesses=2):
+        self._numberOfProcesses = numberOfProcesses
+
+        self._context   = processContext() # not forked (see processContext)
+        self._processes = []
+        self._idle      = None
+
+
+    def start(self):
+        if self._idle == None:
+            self._idle      = asyncio.Queue()
+            self._processes = [YoutubeDLProcess(self._context) for index in range(self._numberOfProcesses)]
+            for process in self._processes:
+                self._idle.put_nowait(process)
+
+
+    def stop(self):
+        for process in self._processes:
+            process.stop()
+        self._processes = []
+        self._idle      = None
+
+
+    async def extract(self, url: str, settings: dict):
+        """Trimmed info dict of a url (see URLInfoCache.trim)"""
+        return await self.run(("extract", url, settings))
+
+
+    async def download(self, url: str, settings: dict, onProgress: callable=None, isCancelled: callable=None):
+        """Download a url as youtube_dl 'settings' (without progress hooks) say (see YoutubeDLProcess.call)"""
+        await self.run(("download", url, settings), onProgress=onProgress, isCancelled=isCancelled)
+
+
+    async def run(self, request: tuple, **kwargs):
+        self.start()
+        idle    = self._idle
+        process = await idle.get()
+        try:
+            return await process.call(request, **kwargs)
+        finally:
+            if idle is self._idle: # not stopped in the meantime
+                if not process.isAlive:
+                    self._processes.remove(process)
+                    process = YoutubeDLProcess(self._context)
+                    self._processes.append(process)
+                idle.put_nowait(process)
+
+
+    @property
+    def numberOfProcesses(self):
+        return self._numberOfProcesses
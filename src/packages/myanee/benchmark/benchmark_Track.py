@@ -0,0 +1,70 @@
+# --- STL Imports ---
+import pathlib
+import tempfile
+import tracemalloc
+import time
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.TrackList import TrackList
+from myanee.Track import Track
+from myanee.storage import JSONTrackStorage
+from myanee.stream import DummyStream
+
+
+def makeTrackDicts(directory: pathlib.Path, size: int):
+    """Track dicts as they are stored in track_list.json"""
+    return {
+        "synthetic_track_{}".format(index) : {
+            "filePath"   : str(directory / "synthetic_track_{}.webm".format(index)),
+            "lastPlayed" : "{:02d}-{:02d}-2021_{:02d}:{:02d}".format(1 + index % 28, 1 + index % 12, index % 24, index % 60),
+            "playCount"  : index % 7,
+            "url"        : "https://www.youtube.com/watch?v={:011d}".format(index),
+            "volume"     : "100"
+        }
+        for index in range(size)
+    }
+
+
+def measure(function: callable):
+    """Return the run time in seconds and the memory retained by the result of a function.
+    The function is run twice because tracing allocations distorts the timings."""
+    begin = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - begin
+
+    tracemalloc.start()
+    result = function()
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, memory
+
+
+def main(size=100000):
+    with tempfile.TemporaryDirectory() as directoryName:
+        directory = pathlib.Path(directoryName)
+        data = makeTrackDicts(directory, size)
+
+        # Construct the tracks only
+        elapsed, memory = measure(lambda: [Track.fromDict(item) for item in data.values()])
+        print("{} tracks | Track.fromDict   | {:8.3f} s | {:8.1f} bytes per track".format(size, elapsed, memory / size))
+
+        # Load a full track list from json
+        for name in data.keys():
+            open(directory / (name + ".webm"), 'w').close()
+        JSONTrackStorage(directory / "track_list.json").write({name : Track.fromDict(item) for name, item in data.items()}, {None}, set())
+
+        for label, options in (("", {}), ("columnar", {"columnar" : True}), ("snapshot", {"columnar" : True, "useSnapshot" : True})):
+            if options.get("useSnapshot", False):
+                TrackList(directory, DummyStream(), **options).close()
+            elapsed, memory = measure(lambda: TrackList(directory, DummyStream(), **options))
+            print("{} tracks | TrackList.load {:<9}| {:8.3f} s | {:8.1f} bytes per track".format(size, label, elapsed, memory / size))
+
+
+
+
+if __name__ == "__main__":
+    main()
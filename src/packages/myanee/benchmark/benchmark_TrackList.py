@@ -0,0 +1,60 @@
+# --- STL Imports ---
+import pathlib
+import tempfile
+import random
+import timeit
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.TrackList import TrackList
+from myanee.Track import Track
+from myanee.stream import DummyStream
+
+
+def makeTrackList(directory: pathlib.Path, size: int):
+    """Populate an empty track list with 'size' synthetic tracks (no files are created)"""
+    trackList = TrackList(directory, DummyStream())
+    lastPlayed = Track.formatDateTime(Track.defaultDateTime())
+    for index in range(size):
+        trackList.addTrack(Track(
+            directory / "synthetic_track_{}_{:x}.webm".format(index, hash(index) & 0xffffff),
+            lastPlayed,
+            url="https://www.youtube.com/watch?v={:011d}".format(index)
+        ))
+    return trackList
+
+
+def timeLookups(trackList: TrackList, directory: pathlib.Path, size: int, repeat: int):
+    """Return the mean time in microseconds of each lookup method"""
+    indices = [random.randrange(size) for _ in range(repeat)]
+    paths   = [directory / "synthetic_track_{}_{:x}.webm".format(index, hash(index) & 0xffffff) for index in indices]
+    urls    = ["https://www.youtube.com/watch?v={:011d}".format(index) for index in indices]
+    queries = ["track_{}_".format(index) for index in indices]
+
+    def mean(function, arguments):
+        iterator = iter(arguments)
+        return 1e6 * timeit.timeit(lambda: function(next(iterator)), number=len(arguments)) / len(arguments)
+
+    return {
+        "getTrackByFilePath"     : mean(trackList.getTrackByFilePath, paths),
+        "getTrackByURL"          : mean(trackList.getTrackByURL, urls),
+        "getTracksByPartialName" : mean(trackList.getTracksByPartialName, queries),
+        "linear scan (reference)": mean(lambda path: trackList.getTracksByFilter(lambda name, track: track.filePath == path), paths[:10])
+    }
+
+
+def main(sizes=(100, 1000, 10000, 100000), repeat=1000):
+    with tempfile.TemporaryDirectory() as directoryName:
+        directory = pathlib.Path(directoryName)
+        for size in sizes:
+            trackList = makeTrackList(directory, size)
+            for method, microseconds in timeLookups(trackList, directory, size, repeat).items():
+                print("{:>8} tracks | {:<24} | {:>12.2f} us".format(size, method, microseconds))
+
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# --- STL Imports ---
+import argparse
+import pathlib
+import tempfile
+import asyncio
+import random
+import json
+import time
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.fakediscord import FakeClient, FakeMessage, SilentSource
+from myanee.Guild import Guild
+from myanee.TrackList import TrackList
+from myanee.VoiceChannel import VoiceChannel
+from myanee.DownloadManager import DownloadManager
+from myanee.URLInfoCache import URLInfoCache
+from myanee.storage import SQLiteTrackStorage
+from myanee.stream import DummyStream
+
+
+PREFIX = "mya-nee"
+
+# Relative frequencies of the commands in a generated script
+DEFAULT_MIX = "play=4,status=3,list=1,show=1,radio=1"
+
+
+def parseMix(mix: str):
+    """'play=4,status=3' => {"play" : 4.0, "status" : 3.0}"""
+    weights = {}
+    for item in mix.split(","):
+        command, weight = item.split("=")
+        weights[command.strip()] = float(weight)
+    return weights
+
+
+def makeScript(weights: dict, length: int, numberOfTracks: int, generator: random.Random):
+    """Command lines (without the prefix) drawn according to 'weights'"""
+    arguments = {
+        "play"   : lambda: "play " + ("#" if generator.random() < 0.25 else "track_{}".format(generator.randrange(numberOfTracks))),
+        "radio"  : lambda: "radio",
+        "status" : lambda: "status",
+        "list"   : lambda: generator.choice(("list queue", "list commands")),
+        "show"   : lambda: "show " + generator.choice(("HEAL", "cpp", "no_such_image")),
+        "stop"   : lambda: "stop"
+    }
+    commands = generator.choices(list(weights.keys()), weights=list(weights.values()), k=length)
+    return [arguments[command]() if command in arguments else command for command in commands]
+
+
+def percentile(values: list, fraction: float):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+class LoadHarness:
+    """Runs guilds against fake discord objects (see fakediscord) and measures how long each command
+    takes from the arrival of its message until its replies were sent (within discord's rate limits, see OutboundQueue).
+    Tracks are empty files played as silence, so ffmpeg is not involved."""
+
+    def __init__(self,
+                 directory: pathlib.Path,
+                 numberOfGuilds: int,
+                 numberOfTracks: int,
+                 apiLatency=0.0,
+                 trackSeconds=2.0,
+                 audioMixer=False):
+        self.directory      = directory
+        self.numberOfGuilds = numberOfGuilds
+        self.numberOfTracks = numberOfTracks
+        self.apiLatency     = apiLatency
+        self.trackFrames    = int(trackSeconds / 0.02)
+        self.audioMixer     = audioMixer
+
+        self.latencies = {} # command => seconds of each run
+        self.errors    = {} # command => number of exceptions
+
+        self._client    = None
+        self._guilds    = {} # id => Guild
+        self._members   = {} # id => member that sends the commands
+        self._lists     = []
+        self._downloads = None
+        self._prepare   = None
+
+
+    def makeLibrary(self):
+        downloadDirectory = self.directory / "downloads"
+        audioDirectory    = self.directory / "audio"
+        for directory, prefix, size in ((downloadDirectory, "synthetic_track_", self.numberOfTracks), (audioDirectory, "synthetic_clip_", 10)):
+            directory.mkdir()
+            for index in range(size):
+                open(directory / "{}{}.webm".format(prefix, index), 'w').close()
+
+        # Set up like MyaNee.makeTrackList
+        self._lists = [
+            TrackList(directory, DummyStream(), storage=SQLiteTrackStorage(directory / "track_list.sqlite"), columnar=True)
+            for directory in (downloadDirectory, audioDirectory)
+        ]
+
+
+    async def setUp(self):
+        self.makeLibrary()
+
+        # Nothing is played, the player threads only pace through silence
+        self._prepare = VoiceChannel.prepare
+        VoiceChannel.prepare = staticmethod(lambda *args, **kwargs: SilentSource(self.trackFrames))
+
+        self._downloads = DownloadManager(DummyStream(), infoCache=URLInfoCache(self.directory / "url_info.sqlite"))
+        self._client    = FakeClient(self.numberOfGuilds, apiLatency=self.apiLatency)
+        for fakeGuild in self._client.guilds:
+            guild = Guild(
+                fakeGuild,
+                self._lists[0],
+                self._lists[1],
+                {"reboot" : self._client.close, "shutdown" : self._client.close},
+                DummyStream(),
+                downloadManager = self._downloads,
+                audioMixer = self.audioMixer
+            )
+            self._guilds[fakeGuild.id]  = guild
+            self._members[fakeGuild.id] = fakeGuild.addMember("listener", voiceChannel=fakeGuild.voice_channels[0])
+
+
+    async def tearDown(self):
+        for id, guild in self._guilds.items(): # leave radio mode and stop the players
+            try:
+                await self.dispatch(self.message(id, "stop"))
+            except Exception:
+                pass
+            guild.release()
+        self._downloads.stop()
+        for trackList in self._lists:
+            trackList.close()
+        VoiceChannel.prepare = self._prepare
+
+
+    def message(self, guildID: int, command: str):
+        fakeGuild = self._client.get_guild(guildID)
+        return FakeMessage("{} {}".format(PREFIX, command), self._members[guildID], fakeGuild.text_channels[0])
+
+
+    async def dispatch(self, message: FakeMessage):
+        """Route a message like MyaNee.onMessage"""
+        if message.author != self._client.user and message.content.startswith(PREFIX):
+            await self._guilds[message.guild.id].onMessage(message, message.content[len(PREFIX):].strip())
+
+
+    async def runGuild(self, guildID: int, script: list, thinkTime: float):
+        """Send the commands of a script one after the other, as a user waiting for each reply would"""
+        for line in script:
+            command = line.split(" ")[0]
+            message = self.message(guildID, line)
+            begin   = time.perf_counter()
+            try:
+                await self.dispatch(message)
+                await self._guilds[guildID].textChannels[0].flush() # until the replies were sent
+            except Exception:
+                self.errors[command] = self.errors.get(command, 0) + 1
+            self.latencies.setdefault(command, []).append(time.perf_counter() - begin)
+            if thinkTime:
+                await asyncio.sleep(thinkTime)
+
+
+    async def run(self, scripts: list, thinkTime=0.0):
+        """Run one script per guild at the same time and return the wall time taken"""
+        begin = time.perf_counter()
+        await asyncio.gather(*[
+            self.runGuild(guildID, script, thinkTime)
+            for guildID, script in zip(self._guilds.keys(), scripts)
+        ])
+        return time.perf_counter() - begin
+
+
+    def report(self, wallTime: float):
+        rows = {}
+        for command, latencies in sorted(self.latencies.items()) + [("all", sum(self.latencies.values(), []))]:
+            latencies = sorted(latencies)
+            rows[command] = {
+                "count"  : len(latencies),
+                "errors" : sum(self.errors.values()) if command == "all" else self.errors.get(command, 0),
+                "p50"    : percentile(latencies, 0.5),
+                "p99"    : percentile(latencies, 0.99),
+                "max"    : latencies[-1] if latencies else 0.0
+            }
+        return {
+            "guilds"     : self.numberOfGuilds,
+            "tracks"     : self.numberOfTracks,
+            "apiLatency" : self.apiLatency,
+            "audioMixer" : self.audioMixer,
+            "seconds"    : wallTime,
+            "throughput" : rows["all"]["count"] / wallTime if wallTime > 0 else 0.0,
+            "commands"   : rows
+        }
+
+
+
+
+def printReport(report: dict):
+    print("{} guilds | {} tracks | api latency {} s | {:.1f} commands/s over {:.2f} s".format(
+        report["guilds"],
+        report["tracks"],
+        report["apiLatency"],
+        report["throughput"],
+        report["seconds"]
+    ))
+    for command, row in report["commands"].items():
+        print("{:<8} | {:>6} runs | {:>5} errors | p50 {:>9.3f} ms | p99 {:>9.3f} ms | max {:>9.3f} ms".format(
+            command,
+            row["count"],
+            row["errors"],
+            1e3 * row["p50"],
+            1e3 * row["p99"],
+            1e3 * row["max"]
+        ))
+
+
+async def benchmark(arguments):
+    generator = random.Random(arguments.seed)
+    if arguments.script != None:
+        with open(arguments.script, 'r') as file:
+            lines = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+        scripts = [lines] * arguments.guilds
+    else:
+        weights = parseMix(arguments.mix)
+        scripts = [makeScript(weights, arguments.commands, arguments.tracks, generator) for index in range(arguments.guilds)]
+
+    with tempfile.TemporaryDirectory() as directoryName:
+        harness = LoadHarness(
+            pathlib.Path(directoryName),
+            arguments.guilds,
+            arguments.tracks,
+            apiLatency   = arguments.apiLatency,
+            trackSeconds = arguments.trackSeconds,
+            audioMixer   = arguments.mixer
+        )
+        await harness.setUp()
+        try:
+            wallTime = await harness.run(scripts, thinkTime=arguments.thinkTime)
+        finally:
+            await harness.tearDown()
+        return harness.report(wallTime)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Replay command scripts across simulated guilds and report command latencies")
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--tracks", type=int, default=10000, help="size of the synthetic download library")
+    parser.add_argument("--commands", type=int, default=20, help="commands per guild (generated scripts)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="relative command frequencies, e.g. '{}'".format(DEFAULT_MIX))
+    parser.add_argument("--script", type=pathlib.Path, help="file of command lines (without prefix) that every guild replays instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--api-latency", dest="apiLatency", type=float, default=0.0, help="seconds per simulated discord api call")
+    parser.add_argument("--think-time", dest="thinkTime", type=float, default=0.0, help="seconds between the commands of a guild")
+    parser.add_argument("--track-seconds", dest="trackSeconds", type=float, default=2.0)
+    parser.add_argument("--mixer", action="store_true", help="play through the audio engine (see AudioEngine)")
+    parser.add_argument("--output", type=pathlib.Path, help="write the report to this json file")
+    arguments = parser.parse_args(arguments)
+
+    report = asyncio.run(benchmark(arguments))
+    printReport(report)
+    if arguments.output != None:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent="    ")
+
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# --- External Imports ---
+import discord
+
+# --- STL Imports ---
+import subprocess
+import resource
+import pathlib
+import tempfile
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.OpusCache import OpusCache, OggOpusSource
+from myanee.TrackList import TrackList
+from myanee.stream import DummyStream
+
+
+def cpuTime():
+    """CPU seconds (user + system) spent by this process and its finished child processes"""
+    own      = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def measure(function: callable):
+    begin = cpuTime()
+    function()
+    return cpuTime() - begin
+
+
+def playPCM(filePath: pathlib.Path):
+    """What playback used to cost: ffmpeg decodes to PCM, discord.py encodes every frame to opus"""
+    source  = discord.FFmpegPCMAudio(str(filePath))
+    encoder = discord.opus.Encoder()
+    while True:
+        frame = source.read()
+        if not frame:
+            break
+        encoder.encode(frame, encoder.SAMPLES_PER_FRAME)
+    source.cleanup()
+
+
+def playOpus(filePath: pathlib.Path):
+    """Passthrough of a cached opus file"""
+    source = OggOpusSource(filePath)
+    while source.read():
+        pass
+    source.cleanup()
+
+
+def main(seconds=60, codec="aac"):
+    if not OpusCache.isSupported():
+        print("ffmpeg is not available")
+        return
+    if not discord.opus.is_loaded() and not discord.opus._load_default():
+        print("libopus is not available")
+        return
+
+    with tempfile.TemporaryDirectory() as directoryName:
+        directory = pathlib.Path(directoryName)
+        filePath  = directory / "benchmark.m4a"
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", "anoisesrc=duration={}:amplitude=0.3".format(seconds), "-ac", "2", "-c:a", codec, str(filePath)],
+            check=True
+        )
+
+        trackList = TrackList(directory, DummyStream())
+        cache     = OpusCache(trackList, DummyStream())
+        track     = trackList.getTrackByFullName("benchmark")
+
+        async def convert():
+            cache.start()
+            await cache.convert(track)
+            cache.stop()
+
+        minutes = seconds / 60.0
+        print("{:>24} | {:8.3f} CPU s per minute of audio".format("ffmpeg + python encoder", measure(lambda: playPCM(filePath)) / minutes))
+        print("{:>24} | {:8.3f} CPU s per minute of audio (once per track)".format("opus conversion", measure(lambda: asyncio.run(convert())) / minutes))
+        print("{:>24} | {:8.3f} CPU s per minute of audio".format("opus passthrough", measure(lambda: playOpus(cache.get(track))) / minutes))
+
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# --- STL Imports ---
+import argparse
+import platform
+import datetime
+import pathlib
+import tempfile
+import tracemalloc
+import random
+import json
+import time
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.benchmark.benchmark_Track import makeTrackDicts
+from myanee.TrackList import TrackList
+from myanee.TrackSampler import TrackSampler
+from myanee.Track import Track
+from myanee.storage import JSONTrackStorage, SQLiteTrackStorage
+from myanee.stream import DummyStream
+
+
+# Track list setups to compare: keyword arguments of TrackList given the directory of the library
+CONFIGURATIONS = {
+    "json"     : lambda directory: {},
+    "sqlite"   : lambda directory: {"storage" : SQLiteTrackStorage(directory / "track_list.sqlite"), "columnar" : True},
+    "snapshot" : lambda directory: {"storage" : SQLiteTrackStorage(directory / "track_list.sqlite"), "columnar" : True, "useSnapshot" : True}
+}
+
+# Version of the result files (see compare)
+FORMAT = 1
+
+
+def makeLibrary(directory: pathlib.Path, size: int):
+    """Create 'size' empty track files and write their track list to every kind of storage"""
+    data = makeTrackDicts(directory, size)
+    for item in data.values():
+        open(item["filePath"], 'w').close()
+
+    tracks = {name : Track.fromDict(item) for name, item in data.items()}
+    JSONTrackStorage(directory / "track_list.json").write(tracks, {None}, set())
+    storage = SQLiteTrackStorage(directory / "track_list.sqlite")
+    storage.write(tracks, set(tracks.keys()), set())
+    storage.close()
+    return list(data.keys())
+
+
+def measure(function: callable, setup: callable=None, cleanup: callable=None, traceMemory=True):
+    """Run time in seconds and peak of allocated memory in bytes of a function.
+    Memory is measured in a second run because tracing allocations distorts the timings.
+    'setup' and 'cleanup' run around each run without being measured, cleanup gets the result."""
+    if setup != None:
+        setup()
+    begin = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - begin
+    if cleanup != None:
+        cleanup(result)
+    del result
+
+    peak = None
+    if traceMemory:
+        if setup != None:
+            setup()
+        tracemalloc.start()
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if cleanup != None:
+            cleanup(result)
+        del result
+
+    return elapsed, peak
+
+
+def repeated(function: callable, arguments: list):
+    """Call a function with each argument in turn"""
+    def run():
+        for argument in arguments:
+            function(argument)
+    return run
+
+
+class LibraryBenchmark:
+    """Measures the operations of a track list over a synthetic library in one configuration"""
+
+    # Share of the library that is changed by the update and write benchmarks
+    changeFraction = 0.01
+
+    def __init__(self, directory: pathlib.Path, names: list, configuration: str, repeat: int, traceMemory: bool):
+        self.directory     = directory
+        self.names         = names
+        self.configuration = configuration
+        self.repeat        = repeat
+        self.traceMemory   = traceMemory
+        self.results       = []
+
+        # The first tracks are deleted and replaced by new files while measuring update
+        self.numberOfChanges = max(1, int(len(names) * self.changeFraction))
+        self.deletedPaths    = [directory / (name + ".webm") for name in names[:self.numberOfChanges]]
+        self.createdPaths    = [directory / "synthetic_track_new_{}.webm".format(index) for index in range(self.numberOfChanges)]
+
+
+    def makeTrackList(self):
+        return TrackList(self.directory, DummyStream(), **CONFIGURATIONS[self.configuration](self.directory))
+
+
+    def record(self, operation: str, function: callable, calls=1, **kwargs):
+        seconds, peak = measure(function, traceMemory=self.traceMemory, **kwargs)
+        self.results.append({
+            "configuration" : self.configuration,
+            "size"          : len(self.names),
+            "operation"     : operation,
+            "seconds"       : seconds / calls,
+            "calls"         : calls,
+            "peakBytes"     : peak
+        })
+        print("{:>8} tracks | {:<8} | {:<30} | {:>12.3f} ms{}".format(
+            len(self.names),
+            self.configuration,
+            operation,
+            1e3 * seconds / calls,
+            " | {:>10.1f} MiB peak".format(peak / 2**20) if peak != None else ""
+        ))
+
+
+    def run(self):
+        if self.configuration == "snapshot": # the first list writes it when closed
+            self.makeTrackList().close()
+
+        self.record("load", self.makeTrackList, cleanup=TrackList.close)
+
+        trackList = self.makeTrackList()
+        try:
+            self.runUpdates(trackList)
+            self.runLookups(trackList)
+            self.runSelection(trackList)
+        finally:
+            trackList.close()
+        return self.results
+
+
+    def runUpdates(self, trackList: TrackList):
+        self.record("update (unchanged)", trackList.update)
+
+        def changeFiles():
+            for filePath in self.deletedPaths:
+                filePath.unlink()
+            for filePath in self.createdPaths:
+                open(filePath, 'w').close()
+
+        def restoreFiles(result):
+            for filePath in self.createdPaths:
+                filePath.unlink()
+            for filePath in self.deletedPaths:
+                open(filePath, 'w').close()
+            trackList.update()
+
+        self.record("update (1% files changed)", trackList.update, setup=changeFiles, cleanup=restoreFiles)
+
+        # Tracks that were played recently are also excluded by the selection benchmarks
+        played = random.sample(self.names[self.numberOfChanges:], self.numberOfChanges)
+        def play():
+            for name in played:
+                trackList.getTrackByFullName(name).updateLastPlayed()
+
+        self.record("writeToFile (1% tracks played)", trackList.writeToFile, setup=play)
+
+
+    def runLookups(self, trackList: TrackList):
+        names = [random.choice(self.names[self.numberOfChanges:]) for index in range(self.repeat)]
+        paths = [self.directory / (name + ".webm") for name in names]
+        urls  = [trackList.getTrackByFullName(name).url for name in names]
+        queries = [name[len("synthetic_"):] for name in names] # also matches the names that continue the number
+
+        self.record("getTrackByFullName", repeated(trackList.getTrackByFullName, names), calls=len(names))
+        self.record("getTrackByFilePath", repeated(trackList.getTrackByFilePath, paths), calls=len(paths))
+        self.record("getTrackByURL", repeated(trackList.getTrackByURL, urls), calls=len(urls))
+        self.record("getTracksByPartialName", repeated(trackList.getTracksByPartialName, queries), calls=len(queries))
+
+        # A full scan, so fewer calls
+        paths = paths[:3]
+        self.record(
+            "getTracksByFilter",
+            repeated(lambda path: trackList.getTracksByFilter(lambda name, track: track.filePath == path), paths),
+            calls=len(paths)
+        )
+
+
+    def runSelection(self, trackList: TrackList):
+        """Draw tracks the way Guild.getRandomTrack and Guild.prefetch do"""
+        rule = datetime.timedelta(days=2)
+        self.record("TrackSampler (build)", lambda: TrackSampler(trackList, rule), cleanup=trackList.removeListener)
+
+        sampler = TrackSampler(trackList, rule)
+        try:
+            self.record("TrackSampler.sample", repeated(lambda argument: sampler.sample(), range(self.repeat)), calls=self.repeat)
+            self.record("TrackSampler.sampleBatch(2)", repeated(lambda argument: sampler.sampleBatch(2), range(self.repeat)), calls=self.repeat)
+        finally:
+            trackList.removeListener(sampler)
+
+
+
+
+def compare(results: dict, baseline: dict, tolerance: float, noiseFloor=1e-5):
+    """Print the ratio of each time to its baseline and return the operations that got slower than 'tolerance' allows.
+    Times below 'noiseFloor' seconds are not considered."""
+    if baseline.get("format", None) != FORMAT:
+        raise ValueError("baseline has format {}, expected {}".format(baseline.get("format", None), FORMAT))
+
+    key = lambda result: (result["configuration"], result["size"], result["operation"])
+    reference   = {key(result) : result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        old = reference.get(key(result), None)
+        if old == None:
+            continue
+
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        isRegression = (1.0 + tolerance) < ratio and noiseFloor < result["seconds"]
+        if isRegression:
+            regressions.append(key(result))
+        print("{:>8} tracks | {:<8} | {:<30} | {:>7.2f}x{}".format(
+            result["size"],
+            result["configuration"],
+            result["operation"],
+            ratio,
+            " REGRESSION" if isRegression else ""
+        ))
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Measure how track list operations and track selection scale with the size of the library")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--configurations", nargs="+", choices=list(CONFIGURATIONS.keys()), default=list(CONFIGURATIONS.keys()))
+    parser.add_argument("--repeat", type=int, default=200, help="calls per lookup and selection benchmark")
+    parser.add_argument("--no-memory", dest="traceMemory", action="store_false", help="skip the (slow) memory measurements")
+    parser.add_argument("--output", type=pathlib.Path, help="write the results to this json file")
+    parser.add_argument("--compare", type=pathlib.Path, help="json file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown (relative to --compare) that counts as a regression")
+    arguments = parser.parse_args(arguments)
+
+    results = {
+        "format"   : FORMAT,
+        "date"     : datetime.datetime.now().isoformat(timespec="seconds"),
+        "python"   : platform.python_version(),
+        "platform" : platform.platform(),
+        "results"  : []
+    }
+
+    for size in arguments.sizes:
+        with tempfile.TemporaryDirectory() as directoryName:
+            directory = pathlib.Path(directoryName)
+            names = makeLibrary(directory, size)
+            for configuration in arguments.configurations:
+                results["results"] += LibraryBenchmark(directory, names, configuration, arguments.repeat, arguments.traceMemory).run()
+
+    if arguments.output != None:
+        with open(arguments.output, 'w') as file:
+            json.dump(results, file, indent="    ")
+
+    if arguments.compare != None:
+        with open(arguments.compare, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, arguments.tolerance)
+        if regressions:
+            print("{} regression(s)".format(len(regressions)))
+            return 1
+    return 0
+
+
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+# --- External Imports ---
+import discord
+
+# --- STL Imports ---
+import itertools
+import threading
+import logging
+import asyncio
+import time
+
+
+# Ids of all fake objects, unique within the process
+_ids = itertools.count( 1 )
+
+_log = logging.getLogger( __name__ )
+
+
+class FakeUser( object ):
+
+    def __init__( self, name: str, bot=False ):
+        self.id   = next( _ids )
+        self.name = name
+        self.bot  = bot
+
+
+    def __str__( self ):
+        return self.name
+
+
+
+
+class FakeVoiceState( object ):
+
+    def __init__( self, channel=None ):
+        self.channel = channel
+
+
+
+
+class FakeMember( FakeUser ):
+    """User of a guild, in 'voiceChannel' if given"""
+
+    def __init__( self, name: str, guild, voiceChannel=None ):
+        FakeUser.__init__( self, name )
+        self.guild = guild
+        self.voice = FakeVoiceState( voiceChannel )
+        if voiceChannel != None:
+            voiceChannel.voice_states[self.id] = self.voice
+
+
+
+
+class FakeMessage( object ):
+
+    def __init__( self, content: str, author: FakeUser, channel, reference=None, file=None ):
+        self.id        = next( _ids )
+        self.content   = content
+        self.author    = author
+        self.channel   = channel
+        self.guild     = channel.guild
+        self.reference = reference
+        self.file      = file
+        self.reactions = []
+
+
+    async def add_reaction( self, emoji: str ):
+        await self.guild.request()
+        self.reactions.append( emoji )
+
+
+
+
+class FakeTextChannel( object ):
+    """Keeps what is sent to it in 'messages'"""
+
+    def __init__( self, name: str, guild ):
+        self.id       = next( _ids )
+        self.name     = name
+        self.guild    = guild
+        self.messages = []
+
+
+    async def send( self, content=None, reference=None, file=None, **kwargs ):
+        await self.guild.request()
+        message = FakeMessage( content, self.guild.client.user, self, reference=reference, file=file )
+        self.messages.append( message )
+        return message
+
+
+
+
+class FakeVoiceChannel( object ):
+
+    def __init__( self, name: str, guild ):
+        self.id           = next( _ids )
+        self.name         = name
+        self.guild        = guild
+        self.voice_states = {} # member id => voice state
+
+
+    async def connect( self ):
+        await self.guild.request()
+        return FakeVoiceClient( self )
+
+
+
+
+class FakeVoiceClient( object ):
+    """Plays audio into a null sink: like discord's player, a thread reads a frame from the source every
+    'frameInterval' seconds and calls 'after' once the source runs out or playback is stopped.
+    Nothing is playing anymore by the time 'after' is called, and its exceptions are logged."""
+
+    def __init__( self, channel: FakeVoiceChannel, frameInterval=0.02 ):
+        self.channel        = channel
+        self._frameInterval = frameInterval
+        self._thread        = None
+        self._stopped       = threading.Event()
+        self._isConnected   = True
+        self.framesPlayed   = 0
+
+
+    def play( self, source: discord.AudioSource, after=None ):
+        if self.is_playing():
+            raise discord.ClientException( "Already playing audio." )
+
+        self._stopped = threading.Event()
+        self._thread  = threading.Thread( target=self.run, args=(source, after, self._stopped), daemon=True )
+        self._thread.start()
+
+
+    def run( self, source: discord.AudioSource, after: callable, stopped: threading.Event ):
+        error = None
+        try:
+            begin = time.perf_counter()
+            frame = 0
+            while not stopped.is_set():
+                if not source.read():
+                    break
+                frame += 1
+                self.framesPlayed += 1
+                stopped.wait( max(0.0, begin + frame * self._frameInterval - time.perf_counter()) )
+        except Exception as exception:
+            error = exception
+        finally:
+            stopped.set()
+            if after != None:
+                try:
+                    after( error )
+                except Exception as exception:
+                    exception.__context__ = error
+                    _log.exception( "Calling the after function failed.", exc_info=exception )
+            elif error != None:
+                _log.exception( "Exception in voice thread", exc_info=error )
+            source.cleanup()
+
+
+    def stop( self ):
+        self._stopped.set()
+
+
+    def is_playing( self ):
+        return self._thread != None and self._thread.is_alive() and not self._stopped.is_set()
+
+
+    def is_connected( self ):
+        return self._isConnected
+
+
+    async def disconnect( self, force=False ):
+        self.stop()
+        self._isConnected = False
+
+
+
+
+class FakeGuild( object ):
+    """A guild with a 'general' text channel and a voice channel by default.
+    Every call to the discord api takes 'apiLatency' seconds."""
+
+    def __init__( self,
+                  name: str,
+                  client,
+                  textChannelNames=( "general", ),
+                  voiceChannelNames=( "voice", ),
+                  apiLatency=0.0 ):
+        self.id             = next( _ids )
+        self.name           = name
+        self.client         = client
+        self.apiLatency     = apiLatency
+        self.text_channels  = [ FakeTextChannel(channelName, self) for channelName in textChannelNames ]
+        self.voice_channels = [ FakeVoiceChannel(channelName, self) for channelName in voiceChannelNames ]
+        self.members        = []
+        self.emojis         = []
+
+
+    def addMember( self, name: str, voiceChannel=None ):
+        member = FakeMember( name, self, voiceChannel=voiceChannel )
+        self.members.append( member )
+        return member
+
+
+    async def request( self ):
+        """Stands in for a round trip to discord"""
+        await asyncio.sleep( self.apiLatency )
+
+
+
+
+class FakeClient( object ):
+
+    def __init__( self, numberOfGuilds=1, apiLatency=0.0 ):
+        self.user      = FakeUser( "mya-nee", bot=True )
+        self.guilds    = [ FakeGuild("guild {}".format(index), self, apiLatency=apiLatency) for index in range(numberOfGuilds) ]
+        self.isClosed  = False
+
+
+    async def close( self ):
+        self.isClosed = True
+
+
+    def get_guild( self, id: int ):
+        return next( (guild for guild in self.guilds if guild.id == id), None )
+
+
+
+
+class SilentSource( discord.AudioSource ):
+    """PCM source of 'numberOfFrames' frames of silence"""
+
+    frameSize = discord.opus.Encoder.FRAME_SIZE
+
+    def __init__( self, numberOfFrames: int ):
+        self._numberOfFrames = numberOfFrames
+
+
+    def read( self ):
+        if self._numberOfFrames <= 0:
+            return b""
+        self._numberOfFrames -= 1
+        return bytes( self.frameSize )
@@ -0,0 +1,234 @@
+# --- STL Imports ---
+import threading
+import pathlib
+import shutil
+import queue
+import gzip
+import json
+import time
+import sys
+import os
+
+# --- Internal Imports ---
+from .stream import Stream, formatRecord, LEVEL_NAMES, DEBUG, INFO, WARNING, ERROR
+
+
+class ConsoleSink( object ):
+    """Writes records at or above 'level' as text lines to a stream (stderr by default)"""
+
+    def __init__( self, stream=None, level=INFO ):
+        self._stream = stream if stream != None else sys.stderr
+        self.level   = level
+
+
+    def write( self, record: dict ):
+        self._stream.write( formatRecord(record) )
+
+
+    def flush( self ):
+        self._stream.flush()
+
+
+    def close( self ):
+        self.flush()
+
+
+
+
+class RotatingFileSink( object ):
+    """Appends records at or above 'level' to a file as json lines. Once the file would grow past 'maxBytes',
+    it is compressed to <name>.1.gz (shifting older archives up to <name>.<backupCount>.gz) and started over."""
+
+    def __init__( self, filePath: pathlib.Path, maxBytes=16 * 2**20, backupCount=5, level=DEBUG ):
+        self._filePath    = pathlib.Path( filePath )
+        self._maxBytes    = maxBytes
+        self._backupCount = backupCount
+        self.level        = level
+        self._file        = None
+        self.open()
+
+
+    def open( self ):
+        self._filePath.parent.mkdir( parents=True, exist_ok=True )
+        self._file = open( self._filePath, "ab" )
+        self._size = self._file.tell()
+
+
+    def write( self, record: dict ):
+        line = ( json.dumps(dict(record, level=LEVEL_NAMES.get(record["level"], record["level"])), default=str) + '\n' ).encode( "utf-8" )
+        if self._maxBytes and 0 < self._size and self._maxBytes < self._size + len( line ):
+            self.rotate()
+        self._file.write( line )
+        self._size += len( line )
+
+
+    def rotate( self ):
+        self._file.close()
+        for index in range( self._backupCount - 1, 0, -1 ):
+            archivePath = self.archivePath( index )
+            if archivePath.exists():
+                os.replace( archivePath, self.archivePath(index + 1) )
+
+        if 0 < self._backupCount:
+            with open( self._filePath, "rb" ) as source, gzip.open( self.archivePath(1), "wb" ) as target:
+                shutil.copyfileobj( source, target )
+        os.remove( self._filePath )
+        self.open()
+
+
+    def archivePath( self, index: int ):
+        return self._filePath.with_name( "{}.{}.gz".format(self._filePath.name, index) )
+
+
+    def flush( self ):
+        self._file.flush()
+
+
+    def close( self ):
+        self._file.close()
+
+
+
+
+class RateLimiter( object ):
+    """Lets through 'burst' records with the same key per 'interval' seconds and counts the rest,
+    which are reported with the first record of the key in a later interval"""
+
+    # Keys to remember at most (stale ones are forgotten beyond that)
+    capacity = 4096
+
+    def __init__( self, burst=10, interval=60.0, clock=time.monotonic ):
+        self._burst    = burst
+        self._interval = interval
+        self._clock    = clock
+        self._windows  = {} # key => [start of the interval, records let through, records suppressed]
+        self._lock     = threading.Lock()
+
+
+    def check( self, key ):
+        """Whether a record may pass, and how many records of its key were suppressed before it"""
+        now = self._clock()
+        with self._lock:
+            window = self._windows.get( key, None )
+            if window == None or self._interval <= now - window[0]:
+                suppressed = window[2] if window != None else 0
+                if window == None and self.capacity <= len( self._windows ):
+                    self.forget( now )
+                self._windows[key] = [now, 1, 0]
+                return True, suppressed
+
+            if window[1] < self._burst:
+                window[1] += 1
+                return True, 0
+
+            window[2] += 1
+            return False, 0
+
+
+    def forget( self, now: float ):
+        """Drop the keys of past intervals (all of them if there are none)"""
+        stale = [ key for key, window in self._windows.items() if self._interval <= now - window[0] ]
+        for key in stale if stale else list( self._windows.keys() ):
+            del self._windows[key]
+
+
+
+
+class LogWriter( Stream ):
+    """Log stream that hands records to a thread writing them to its sinks (see ConsoleSink, RotatingFileSink),
+    so logging never waits for I/O. The queue holds at most 'capacity' records; records that arrive while it
+    is full are dropped and counted. Repeated messages are rate limited (see RateLimiter)."""
+
+    def __init__( self, sinks: list, capacity=10000, rateLimiter=None ):
+        self._sinks        = list( sinks )
+        self._level        = min( (sink.level for sink in self._sinks), default=ERROR )
+        self._queue        = queue.Queue( maxsize=capacity )
+        self._rateLimiter  = rateLimiter if rateLimiter != None else RateLimiter()
+        self._dropped      = 0 # since the last report
+        self._totalDropped = 0
+        self._lock         = threading.Lock()
+        self._thread       = threading.Thread( target=self.run, name="log writer", daemon=True )
+        self._thread.start()
+
+
+    def emit( self, record: dict ):
+        if record["level"] < self._level:
+            return
+
+        isAllowed, suppressed = self._rateLimiter.check( (record.get("name", ""), record["message"]) )
+        if not isAllowed:
+            return
+        if suppressed:
+            record = dict( record, suppressed=suppressed )
+
+        try:
+            self._queue.put_nowait( record )
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+                self._totalDropped += 1
+
+
+    def write( self, content: str ):
+        """Plain text, e.g.: from streams wrapping this one"""
+        content = content.rstrip( '\n' )
+        if content:
+            self.emit( { "time" : time.time(), "level" : INFO, "name" : "", "message" : content } )
+
+
+    def run( self ):
+        """Main function of the writer thread: write records in batches and flush the sinks after each"""
+        isStopped = False
+        while not isStopped:
+            batch = [ self._queue.get() ]
+            try:
+                while len( batch ) < 1000:
+                    batch.append( self._queue.get_nowait() )
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                dropped, self._dropped = self._dropped, 0
+            if dropped:
+                batch.append( { "time" : time.time(), "level" : WARNING, "name" : "LogWriter", "message" : "dropped {} records".format(dropped) } )
+
+            for record in batch:
+                if record == None: # see close
+                    isStopped = True
+                    continue
+                for sink in self._sinks:
+                    if sink.level <= record["level"]:
+                        try:
+                            sink.write( record )
+                        except Exception as exception:
+                            sys.stderr.write( "failed to write a log record\n{}\n".format(exception) )
+
+            for sink in self._sinks:
+                try:
+                    sink.flush()
+                except Exception:
+                    pass
+
+            for index in range( len(batch) - (1 if dropped else 0) ):
+                self._queue.task_done()
+
+
+    def flush( self ):
+        """Wait until the queued records are written"""
+        if self._thread.is_alive():
+            self._queue.join()
+
+
+    def close( self ):
+        """Write the queued records and release the sinks"""
+        if self._thread.is_alive():
+            self._queue.put( None )
+            self._thread.join()
+        for sink in self._sinks:
+            sink.close()
+
+
+    @property
+    def dropped( self ):
+        """Number of records dropped because the queue was full"""
+        return self._totalDropped
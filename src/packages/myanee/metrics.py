@@ -0,0 +1,252 @@
+# --- STL Imports ---
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import bisect
+import math
+
+
+class Metric( object ):
+    """Values of a metric per combination of label values, rendered in the prometheus text format"""
+
+    type = "untyped"
+
+    def __init__( self, name: str, help: str, labelNames=() ):
+        self._name       = name
+        self._help       = help
+        self._labelNames = tuple( labelNames )
+        self._values     = {} # label values => value
+        self._lock       = threading.Lock()
+
+
+    def key( self, labels: dict ):
+        if set( labels.keys() ) != set( self._labelNames ):
+            raise KeyError( "metric {} has labels {}, not {}".format(self._name, self._labelNames, tuple(labels.keys())) )
+        return tuple( str(labels[name]) for name in self._labelNames )
+
+
+    def remove( self, **labels ):
+        with self._lock:
+            self._values.pop( self.key(labels), None )
+
+
+    def value( self, **labels ):
+        with self._lock:
+            return self._values.get( self.key(labels), None )
+
+
+    def samples( self ):
+        """(name suffix, label values, extra labels, value) of each sample"""
+        with self._lock:
+            return [ ("", key, (), value) for key, value in self._values.items() ]
+
+
+    def render( self ):
+        lines = [
+            "# HELP {} {}".format( self._name, self._help ),
+            "# TYPE {} {}".format( self._name, self.type )
+        ]
+        for suffix, key, extraLabels, value in self.samples():
+            labels = list( zip(self._labelNames, key) ) + list( extraLabels )
+            labelString = ",".join( '{}="{}"'.format(name, escape(value)) for name, value in labels )
+            lines.append( "{}{}{} {}".format(
+                self._name,
+                suffix,
+                "{" + labelString + "}" if labelString else "",
+                formatValue( value )
+            ) )
+        return "\n".join( lines )
+
+
+    @property
+    def name( self ):
+        return self._name
+
+
+
+
+class Counter( Metric ):
+
+    type = "counter"
+
+    def inc( self, amount=1, **labels ):
+        key = self.key( labels )
+        with self._lock:
+            self._values[key] = self._values.get( key, 0 ) + amount
+
+
+
+
+class Gauge( Metric ):
+    """Either set directly or computed by a function whenever the metrics are rendered"""
+
+    type = "gauge"
+
+    def set( self, value, **labels ):
+        key = self.key( labels )
+        with self._lock:
+            self._values[key] = value
+
+
+    def setFunction( self, function: callable, **labels ):
+        self.set( function, **labels )
+
+
+    def samples( self ):
+        samples = []
+        for suffix, key, extraLabels, value in Metric.samples( self ):
+            if callable( value ):
+                try:
+                    value = value()
+                except Exception:
+                    continue
+            samples.append( (suffix, key, extraLabels, value) )
+        return samples
+
+
+
+
+class Histogram( Metric ):
+
+    type = "histogram"
+
+    defaultBuckets = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0 )
+
+    def __init__( self, name: str, help: str, labelNames=(), buckets=defaultBuckets ):
+        Metric.__init__( self, name, help, labelNames=labelNames )
+        self._buckets = tuple( sorted(buckets) )
+
+
+    def observe( self, value: float, **labels ):
+        key = self.key( labels )
+        with self._lock:
+            counts = self._values.get( key, None )
+            if counts == None: # bucket counts, then the sum
+                counts = self._values[key] = [0] * (len(self._buckets) + 1) + [0.0]
+            counts[bisect.bisect_left( self._buckets, value )] += 1
+            counts[-1] += value
+
+
+    def samples( self ):
+        samples = []
+        for suffix, key, extraLabels, counts in Metric.samples( self ):
+            total = 0
+            for bound, count in zip( self._buckets + (math.inf,), counts ):
+                total += count
+                samples.append( ("_bucket", key, (("le", formatValue(bound)),), total) )
+            samples.append( ("_sum", key, (), counts[-1]) )
+            samples.append( ("_count", key, (), total) )
+        return samples
+
+
+    def count( self, **labels ):
+        with self._lock:
+            counts = self._values.get( self.key(labels), None )
+            return sum( counts[:-1] ) if counts != None else 0
+
+
+
+
+class Registry( object ):
+    """Metrics by name. Getting a metric that exists returns it, so modules can declare what they use."""
+
+    def __init__( self ):
+        self._metrics = {}
+        self._lock    = threading.Lock()
+
+
+    def counter( self, name: str, help: str, labelNames=() ):
+        return self.get( Counter, name, help, labelNames=labelNames )
+
+
+    def gauge( self, name: str, help: str, labelNames=() ):
+        return self.get( Gauge, name, help, labelNames=labelNames )
+
+
+    def histogram( self, name: str, help: str, labelNames=(), buckets=Histogram.defaultBuckets ):
+        return self.get( Histogram, name, help, labelNames=labelNames, buckets=buckets )
+
+
+    def get( self, metricType: type, name: str, help: str, **kwargs ):
+        with self._lock:
+            metric = self._metrics.get( name, None )
+            if metric == None:
+                metric = self._metrics[name] = metricType( name, help, **kwargs )
+            elif not isinstance( metric, metricType ):
+                raise TypeError( "metric {} is a {}".format(name, metric.type) )
+            return metric
+
+
+    def render( self ):
+        with self._lock:
+            metrics = list( self._metrics.values() )
+        return "\n".join( metric.render() for metric in metrics ) + "\n"
+
+
+
+
+class MetricsServer( object ):
+    """Serves the metrics of a registry over http (GET /metrics) on a thread of its own,
+    so they are available even while the event loop is blocked or restarting"""
+
+    def __init__( self, registry: Registry, port: int, host="127.0.0.1" ):
+        self._registry = registry
+        self._address  = ( host, port )
+        self._server   = None
+        self._thread   = None
+
+
+    def start( self ):
+        registry = self._registry
+
+        class Handler( BaseHTTPRequestHandler ):
+            def do_GET( handler ):
+                if handler.path.split( "?" )[0] not in ( "/", "/metrics" ):
+                    handler.send_error( 404 )
+                    return
+                body = registry.render().encode( "utf-8" )
+                handler.send_response( 200 )
+                handler.send_header( "Content-Type", "text/plain; version=0.0.4; charset=utf-8" )
+                handler.send_header( "Content-Length", str(len(body)) )
+                handler.end_headers()
+                handler.wfile.write( body )
+
+            def log_message( handler, *args ):
+                pass
+
+        self._server = ThreadingHTTPServer( self._address, Handler )
+        self._thread = threading.Thread( target=self._server.serve_forever, name="metrics", daemon=True )
+        self._thread.start()
+
+
+    def stop( self ):
+        if self._server != None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+    @property
+    def port( self ):
+        return self._server.server_address[1] if self._server != None else self._address[1]
+
+
+
+
+def escape( value: str ):
+    return str( value ).replace( "\\", "\\\\" ).replace( "\n", "\\n" ).replace( '"', '\\"' )
+
+
+def formatValue( value ):
+    if isinstance( value, str ):
+        return value
+    elif value == math.inf:
+        return "+Inf"
+    elif value == -math.inf:
+        return "-Inf"
+    return str( value )
+
+
+
+
+# Metrics of the whole process
+registry = Registry()
@@ -0,0 +1,260 @@
+# --- STL Imports ---
+import pathlib
+import threading
+import struct
+import array
+import sys
+import os
+
+# --- Internal Imports ---
+from .TrackColumns import TrackColumns
+
+
+class TrackSnapshot( object ):
+    """Binary image of a track list that loads without parsing or creating a python object per field.
+    Strings are stored as null-separated blobs and numeric fields as raw arrays (see TrackColumns).
+    'revision' is the revision of the TrackStorage the snapshot was taken from."""
+
+    _magic   = b"MYANEE\x00\x02"
+    _header  = struct.Struct( "<8scqI" ) # magic, byte order, storage revision, number of tracks
+    _section = struct.Struct( "<Q" )     # size of the following section in bytes
+
+    def __init__( self,
+                  revision: int,
+                  names: list,
+                  fileNames: list,
+                  urls: list,
+                  directories: list,
+                  directoryIndices: array.array,
+                  columns: TrackColumns ):
+        self.revision         = revision
+        self.names            = names
+        self.fileNames        = fileNames
+        self.urls             = urls
+        self.directories      = directories       # unique directories
+        self.directoryIndices = directoryIndices  # index of each track's directory in 'directories'
+        self.columns          = columns
+
+
+    @staticmethod
+    def fromRows( revision: int, rows: list ):
+        """Rows are (name, directory, fileName, url, lastPlayed, playCount, volume, loudness) tuples"""
+        directories      = {}
+        directoryIndices = array.array( 'I' )
+        columns          = TrackColumns()
+
+        for name, directory, fileName, url, lastPlayed, playCount, volume, loudness in rows:
+            directoryIndices.append( directories.setdefault(directory, len(directories)) )
+            columns.lastPlayed.append( lastPlayed )
+            columns.playCount.append( playCount )
+            columns.volume.append( volume )
+            columns.loudness.append( loudness )
+
+        return TrackSnapshot(
+            revision,
+            [ row[0] for row in rows ],
+            [ row[2] for row in rows ],
+            [ row[3] for row in rows ],
+            list( directories.keys() ),
+            directoryIndices,
+            columns
+        )
+
+
+    def write( self, filePath: pathlib.Path ):
+        """Write to a temporary file first, so readers never see a partial snapshot"""
+        temporaryPath = pathlib.Path( str(filePath) + ".tmp" )
+        with open( temporaryPath, "wb" ) as file:
+            file.write( self._header.pack(self._magic, self.byteOrder(), self.revision, len(self.names)) )
+            for section in self.sections():
+                file.write( self._section.pack(len(section)) )
+                file.write( section )
+        os.replace( temporaryPath, filePath )
+
+
+    @staticmethod
+    def read( filePath: pathlib.Path ):
+        """Return the snapshot stored at 'filePath' or None if it is missing or unreadable"""
+        try:
+            with open( filePath, "rb" ) as file:
+                contents = file.read()
+        except OSError:
+            return None
+
+        try:
+            magic, byteOrder, revision, count = TrackSnapshot._header.unpack_from( contents, 0 )
+            if magic != TrackSnapshot._magic or byteOrder != TrackSnapshot.byteOrder():
+                return None
+
+            offset   = TrackSnapshot._header.size
+            sections = []
+            while offset < len(contents):
+                size, = TrackSnapshot._section.unpack_from( contents, offset )
+                offset += TrackSnapshot._section.size
+                sections.append( contents[offset:offset+size] )
+                offset += size
+
+            names       = TrackSnapshot.splitStrings( sections[0], count )
+            fileNames   = TrackSnapshot.splitStrings( sections[1], count )
+            urls        = TrackSnapshot.splitStrings( sections[2], count )
+            directories = TrackSnapshot.splitStrings( sections[3], None )
+
+            directoryIndices = array.array( 'I' )
+            directoryIndices.frombytes( sections[4] )
+
+            columns = TrackColumns()
+            columns.lastPlayed.frombytes( sections[5] )
+            columns.playCount.frombytes( sections[6] )
+            columns.volume.frombytes( sections[7] )
+            columns.loudness.frombytes( sections[8] )
+
+            arrays = ( directoryIndices, columns.lastPlayed, columns.playCount, columns.volume, columns.loudness )
+            if not all( len(item) == count for item in (names, fileNames, urls) + arrays ):
+                return None
+
+        except (struct.error, UnicodeDecodeError, ValueError, IndexError):
+            return None
+
+        return TrackSnapshot( revision, names, fileNames, urls, directories, directoryIndices, columns )
+
+
+    def sections( self ):
+        return [
+            "\0".join( self.names ).encode( "utf-8" ),
+            "\0".join( self.fileNames ).encode( "utf-8" ),
+            "\0".join( self.urls ).encode( "utf-8" ),
+            "\0".join( self.directories ).encode( "utf-8" ),
+            self.directoryIndices.tobytes(),
+            self.columns.lastPlayed.tobytes(),
+            self.columns.playCount.tobytes(),
+            self.columns.volume.tobytes(),
+            self.columns.loudness.tobytes()
+        ]
+
+
+    def filePathString( self, row: int ):
+        return os.path.join( self.directories[self.directoryIndices[row]], self.fileNames[row] )
+
+
+    @staticmethod
+    def splitStrings( section: bytes, count ):
+        """An empty section holds either no strings or a single empty one, depending on the expected 'count'"""
+        if not section:
+            return [""] if count == 1 else []
+        return section.decode( "utf-8" ).split( "\0" )
+
+
+    @staticmethod
+    def byteOrder():
+        return b"<" if sys.byteorder == "little" else b">"
+
+
+    def __len__( self ):
+        return len( self.names )
+
+
+
+
+class LazyTracks( object ):
+    """Mapping of track names to tracks that holds rows of a snapshot until their tracks are first accessed.
+    'factory' creates the track of a row: factory(snapshot, row) -> Track"""
+
+    def __init__( self, snapshot=None, factory=None ):
+        self._tracks   = {}
+        self._snapshot = snapshot
+        self._factory  = factory
+        self._rows     = dict( zip(snapshot.names, range(len(snapshot))) ) if snapshot != None else {}
+        self._lock     = threading.Lock()
+
+
+    def __getitem__( self, name: str ):
+        track = self._tracks.get( name, None )
+        if track == None:
+            with self._lock:
+                track = self._tracks.get( name, None )
+                if track == None:
+                    row = self._rows.pop( name ) # raises KeyError for unknown names
+                    track = self._factory( self._snapshot, row )
+                    self._tracks[name] = track
+        return track
+
+
+    def get( self, name: str, default=None ):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
+    def __setitem__( self, name: str, track ):
+        with self._lock:
+            self._rows.pop( name, None )
+            self._tracks[name] = track
+
+
+    def __delitem__( self, name: str ):
+        with self._lock:
+            if self._rows.pop( name, None ) is None:
+                del self._tracks[name]
+
+
+    def __contains__( self, name: str ):
+        return name in self._tracks or name in self._rows
+
+
+    def __len__( self ):
+        return len( self._tracks ) + len( self._rows )
+
+
+    def keys( self ):
+        return list( self._tracks.keys() ) + list( self._rows.keys() )
+
+
+    def values( self ):
+        self.materialize()
+        return self._tracks.values()
+
+
+    def items( self ):
+        self.materialize()
+        return self._tracks.items()
+
+
+    def materialize( self ):
+        """Create the tracks of all remaining rows"""
+        for name in list( self._rows.keys() ):
+            self.get( name )
+
+
+    def rows( self ):
+        """(name, directory, fileName, url, lastPlayed, playCount, volume, loudness) of every track without creating them"""
+        with self._lock:
+            tracks = list( self._tracks.items() )
+            rows   = list( self._rows.items() )
+
+        snapshot = self._snapshot
+        result = [
+            ( name, str(track.directory), track.fileName, track.url, track.lastPlayedTimeStamp, track.playCount, track.volume, track.loudness )
+            for name, track in tracks
+        ]
+        if rows:
+            columns = snapshot.columns
+            result += [
+                (
+                    name,
+                    snapshot.directories[snapshot.directoryIndices[row]],
+                    snapshot.fileNames[row],
+                    snapshot.urls[row],
+                    columns.lastPlayed[row],
+                    columns.playCount[row],
+                    columns.volume[row],
+                    columns.loudness[row]
+                )
+                for name, row in rows
+            ]
+        return result
+
+
+    @property
+    def numberOfPendingRows( self ):
+        return len( self._rows )
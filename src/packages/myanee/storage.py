@@ -0,0 +1,174 @@
+# --- STL Imports ---
+import pathlib
+import sqlite3
+import threading
+import json
+
+
+class TrackStorage( object ):
+    """Persistence backend of a TrackList, storing track dicts by track name"""
+
+    def load( self ):
+        """Return a dict of track dicts by track name"""
+        return {}
+
+
+    def write( self, tracks: dict, changed: set, removed: set ):
+        """Persist the tracks whose names are in 'changed' and forget the ones in 'removed'"""
+        pass
+
+
+    def close( self ):
+        pass
+
+
+    @property
+    def revision( self ):
+        """Number that changes whenever the stored tracks change"""
+        return 0
+
+
+
+
+class JSONTrackStorage( TrackStorage ):
+    """Stores the whole track list in a single json file that is rewritten on every change"""
+
+    def __init__( self, filePath: pathlib.Path ):
+        self._filePath = pathlib.Path( filePath )
+
+
+    def load( self ):
+        if self._filePath.is_file():
+            with open( self._filePath, 'r' ) as file:
+                return json.load( file )
+        return {}
+
+
+    def write( self, tracks: dict, changed: set, removed: set ):
+        if changed or removed or not self._filePath.is_file():
+            with open( self._filePath, 'w' ) as file:
+                json.dump(
+                    { key : value.dict() for key, value in list(tracks.items()) },
+                    file,
+                    indent="    "
+                )
+
+
+    @property
+    def revision( self ):
+        try:
+            return self._filePath.stat().st_mtime_ns
+        except OSError:
+            return 0
+
+
+    @property
+    def filePath( self ):
+        return self._filePath
+
+
+
+
+class SQLiteTrackStorage( TrackStorage ):
+    """Stores tracks as rows of an sqlite database in WAL mode, writing only the rows that changed.
+    The contents of 'jsonFilePath' are imported the first time the database is opened."""
+
+    _columns = ( "filePath", "lastPlayed", "playCount", "url", "volume", "loudness" )
+
+    def __init__( self, filePath: pathlib.Path, jsonFilePath=None ):
+        self._filePath   = pathlib.Path( filePath )
+        self._lock       = threading.Lock()
+
+        # Tracks are written from the audio thread as well
+        self._connection = sqlite3.connect( str(self._filePath), check_same_thread=False )
+        self._connection.execute( "PRAGMA journal_mode=WAL" )
+        self._connection.execute( "PRAGMA synchronous=NORMAL" )
+
+        with self._connection:
+            self._connection.execute( "CREATE TABLE IF NOT EXISTS tracks (name TEXT PRIMARY KEY, {})".format(
+                ", ".join( self._columns )
+            ) )
+            self._connection.execute( "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)" )
+
+            # Add columns that databases of older versions lack
+            existing = { row[1] for row in self._connection.execute("PRAGMA table_info(tracks)") }
+            for column in self._columns:
+                if not column in existing:
+                    self._connection.execute( "ALTER TABLE tracks ADD COLUMN {}".format(column) )
+
+        if jsonFilePath != None:
+            self.migrate( pathlib.Path(jsonFilePath) )
+
+
+    def migrate( self, jsonFilePath: pathlib.Path ):
+        """Import a json track list unless a migration already took place"""
+        with self._lock, self._connection:
+            if self._connection.execute( "SELECT value FROM meta WHERE key='migrated'" ).fetchone() == None:
+                tracks = JSONTrackStorage( jsonFilePath ).load()
+                self._connection.executemany(
+                    self._upsertStatement,
+                    ( self.toRow(name, data) for name, data in tracks.items() )
+                )
+                self._connection.execute(
+                    "INSERT INTO meta (key, value) VALUES ('migrated', ?)",
+                    ( str(jsonFilePath), )
+                )
+                self.incrementRevision()
+
+
+    def load( self ):
+        with self._lock:
+            rows = self._connection.execute( "SELECT name, {} FROM tracks".format(", ".join(self._columns)) ).fetchall()
+        return { row[0] : dict(zip(self._columns, row[1:])) for row in rows }
+
+
+    def write( self, tracks: dict, changed: set, removed: set ):
+        if changed or removed:
+            with self._lock, self._connection:
+                self._connection.executemany(
+                    self._upsertStatement,
+                    ( self.toRow(name, tracks[name].dict()) for name in changed if name in tracks )
+                )
+                self._connection.executemany(
+                    "DELETE FROM tracks WHERE name=?",
+                    ( (name,) for name in removed )
+                )
+                self.incrementRevision()
+
+
+    def close( self ):
+        with self._lock:
+            self._connection.close()
+
+
+    def incrementRevision( self ):
+        """Must be called inside a transaction"""
+        self._connection.execute(
+            "INSERT INTO meta (key, value) VALUES ('revision', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value=CAST(value AS INTEGER)+1"
+        )
+
+
+    @property
+    def revision( self ):
+        with self._lock:
+            row = self._connection.execute( "SELECT value FROM meta WHERE key='revision'" ).fetchone()
+        return int( row[0] ) if row != None else 0
+
+
+    @classmethod
+    def toRow( cls, name: str, data: dict ):
+        return ( name, ) + tuple( data.get(column, None) for column in cls._columns )
+
+
+    @property
+    def _upsertStatement( self ):
+        return "INSERT OR REPLACE INTO tracks (name, {}) VALUES (?, {})".format(
+            ", ".join( self._columns ),
+            ", ".join( "?" for _ in self._columns )
+        )
+
+
+    @property
+    def filePath( self ):
+        return self._filePath
@@ -1,3 +1,23 @@
+# Severities of log records (see Loggee.log)
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+
+LEVEL_NAMES = { DEBUG : "DEBUG", INFO : "INFO", WARNING : "WARNING", ERROR : "ERROR" }
+
+
+def formatRecord( record: dict ):
+    """Text line of a log record: '[name] message', with the level if it is not INFO"""
+    content = record["message"]
+    if record["level"] != INFO:
+        content = "{}: {}".format( LEVEL_NAMES.get(record["level"], record["level"]), content )
+    if record.get( "name", "" ):
+        content = "[{}] {}".format( record["name"], content )
+    if record.get( "suppressed", 0 ):
+        content += " ({} repeats suppressed)".format( record["suppressed"] )
+    return content + '\n'
+
+
+
+
 class Stream( object ):
 
     def write( self, content: str ):
@@ -8,6 +28,11 @@ class Stream( object ):
         pass
 
 
+    def emit( self, record: dict ):
+        """Log a record (see Loggee.log), written as text unless the stream keeps records"""
+        self.write( formatRecord(record) )
+
+
     def __getattr__( self, attribute ):
         return None
 
@@ -15,7 +40,9 @@ class Stream( object ):
 
 
 class DummyStream( Stream ):
-    pass
+
+    def emit( self, record: dict ):
+        pass
 
 
 
@@ -73,4 +100,12 @@ class StreamMultiplex( Stream ):
 
     def writelines( self, contents ):
         for stream in self._streams:
-            stream.writelines( contents )
\ No newline at end of file
+            stream.writelines( contents )
+
+
+    def emit( self, record: dict ):
+        for stream in self._streams:
+            if isinstance( stream, Stream ):
+                stream.emit( record )
+            else: # e.g.: sys.stderr
+                stream.write( formatRecord(record) )
\ No newline at end of file
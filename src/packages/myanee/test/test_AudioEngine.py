@@ -0,0 +1,182 @@
+# --- External Imports ---
+import discord
+import numpy
+
+# --- STL Imports ---
+import threading
+import unittest
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.AudioEngine import AudioEngine
+
+
+class ConstantSource( discord.AudioSource ):
+    """PCM source of 'numberOfFrames' frames of a constant sample value"""
+
+    def __init__( self, value: int, numberOfFrames: int ):
+        self.frame = numpy.full( AudioEngine.frameSize // 2, value, dtype=numpy.int16 ).tobytes()
+        self.numberOfFrames = numberOfFrames
+        self.isCleanedUp = False
+
+
+    def read( self ):
+        if self.numberOfFrames <= 0:
+            return b""
+        self.numberOfFrames -= 1
+        return self.frame
+
+
+    def cleanup( self ):
+        self.isCleanedUp = True
+
+
+
+
+class BlockingSource( ConstantSource ):
+    """Constant source whose reads wait until 'unblock' is set (like a pipe that ffmpeg doesn't write to)"""
+
+    def __init__( self, value: int, numberOfFrames: int ):
+        ConstantSource.__init__( self, value, numberOfFrames )
+        self.isReading = threading.Event()
+        self.unblock = threading.Event()
+        self.wasReadAfterCleanup = False
+
+
+    def read( self ):
+        self.isReading.set()
+        self.unblock.wait()
+        self.wasReadAfterCleanup = self.isCleanedUp
+        return ConstantSource.read( self )
+
+
+
+
+def playAll( engine: AudioEngine ):
+    """First sample of each frame until the engine runs out"""
+    samples = []
+    while True:
+        data = engine.read()
+        if not data:
+            return samples
+        samples.append( int(numpy.frombuffer(data, dtype=numpy.int16)[0]) )
+
+
+
+
+class TestAudioEngine( unittest.TestCase ):
+
+    def setUp( self ):
+        self.events = []
+        self.callbacks = {
+            "onStarted" : lambda tag: self.events.append( ("started", tag) ),
+            "onFinished" : lambda tag: self.events.append( ("finished", tag) )
+        }
+
+
+    def test_gapless( self ):
+        engine = AudioEngine( **self.callbacks )
+        first, second = ConstantSource( 100, 10 ), ConstantSource( 200, 10 )
+        engine.play( first, tag="first" )
+        engine.setNext( second, tag="second" )
+
+        self.assertEqual( playAll(engine), [100] * 10 + [200] * 10 )
+        self.assertEqual( self.events, [("finished", "first"), ("started", "second"), ("finished", "second")] )
+        self.assertTrue( first.isCleanedUp and second.isCleanedUp )
+        self.assertTrue( engine.isIdle )
+
+
+    def test_crossfade( self ):
+        engine = AudioEngine( crossfade=0.1, **self.callbacks ) # 5 frames
+        engine.play( ConstantSource(1000, 20), tag="first" )
+        engine.setNext( ConstantSource(-1000, 20), tag="second" )
+
+        samples = playAll( engine )
+        self.assertEqual( len(samples), 35 )
+        self.assertEqual( samples[:15], [1000] * 15 )
+        self.assertEqual( samples[-15:], [-1000] * 15 )
+
+        # The tracks are faded into each other
+        fade = samples[15:20]
+        self.assertEqual( fade, sorted(fade, reverse=True) )
+        self.assertTrue( all(-1000 < sample < 1000 for sample in fade[1:]) )
+
+
+    def test_overlay( self ):
+        # Overlays are mixed on top of the track (and clipped)
+        engine = AudioEngine( **self.callbacks )
+        engine.play( ConstantSource(30000, 4), tag="track" )
+        engine.overlay( ConstantSource(-100, 2) )
+        engine.overlay( ConstantSource(10000, 1) )
+        self.assertEqual( playAll(engine), [32767, 29900, 30000, 30000] )
+
+        # Overlays play on their own too, without calling back
+        self.events = []
+        engine.overlay( ConstantSource(5, 2) )
+        self.assertEqual( playAll(engine), [5, 5] )
+        self.assertEqual( self.events, [] )
+
+
+    def test_skip( self ):
+        engine = AudioEngine( **self.callbacks )
+        first, second = ConstantSource( 1000, 100 ), ConstantSource( 50, 3 )
+        engine.play( first, tag="first" )
+        engine.setNext( second, tag="second" )
+        engine.read()
+
+        # The skipped track fades out over the start of the next one
+        engine.skip()
+        self.assertEqual( self.events, [("finished", "first"), ("started", "second")] )
+        samples = playAll( engine )
+        self.assertTrue( 50 < samples[0] <= 1050 )
+        self.assertEqual( samples[AudioEngine.skipFadeFrames:], [] )
+        self.assertTrue( first.isCleanedUp )
+
+        # Stopping releases everything without calling back
+        self.events = []
+        third = ConstantSource( 1, 100 )
+        engine.play( third, tag="third" )
+        engine.stop()
+        self.assertTrue( third.isCleanedUp )
+        self.assertEqual( engine.read(), b"" )
+        self.assertEqual( self.events, [] )
+
+
+    def test_blockingRead( self ):
+        # A read that blocks doesn't block controlling the engine
+        engine = AudioEngine( **self.callbacks )
+        source = BlockingSource( 100, 10 )
+        engine.play( source, tag="blocking" )
+        reader = threading.Thread( target=engine.read, daemon=True )
+        reader.start()
+        self.assertTrue( source.isReading.wait(5) )
+
+        control = threading.Thread( target=lambda: (
+            engine.setNext( ConstantSource(200, 1), tag="next" ),
+            engine.overlay( ConstantSource(5, 1) ),
+            engine.play( ConstantSource(300, 1), tag="other" ),
+            engine.skip(),
+            engine.stop()
+        ), daemon=True )
+        control.start()
+        control.join( 5 )
+        self.assertFalse( control.is_alive() )
+        self.assertTrue( reader.is_alive() )
+
+        # The source is only cleaned up once its read returned
+        self.assertFalse( source.isCleanedUp )
+        source.unblock.set()
+        reader.join( 5 )
+        self.assertFalse( reader.is_alive() )
+        self.assertTrue( source.isCleanedUp )
+        self.assertFalse( source.wasReadAfterCleanup )
+        self.assertEqual( engine.read(), b"" )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import time
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.CacheManager import CacheManager
+from myanee.TrackList import TrackList
+from myanee.stream import DummyStream
+from myanee.utilities import URLUtilities
+
+
+class TestCacheManager( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        for fileName, size in ( ("explosion.webm", 1000), ("issoni_asobo.webm", 1000), ("mya-nee.webm", 1000), ("huge.webm", 4000) ):
+            with open( self.directory / fileName, "wb" ) as file:
+                file.write( bytes(size) )
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    @property
+    def directory( self ):
+        return pathlib.Path( self._directory.name )
+
+
+    def test_CacheManager( self ):
+        trackList = TrackList( self.directory, DummyStream() )
+
+        # Recently and often played tracks are worth keeping
+        for index in range( 3 ):
+            trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.getTrackByFullName( "huge" ).updateLastPlayed()
+        trackList.getTrackByFullName( "mya-nee" ).setURL( "https://youtu.be/cSa1DJUbVSs" )
+
+        playing = trackList.getTrackByFullName( "issoni_asobo" )
+        manager = CacheManager(
+            trackList,
+            DummyStream(),
+            budget = 6500,
+            isProtected = lambda track: track is playing,
+            gracePeriod = 0.0,
+            clock = lambda: time.time() + 1.0
+        )
+
+        victims = asyncio.run( manager.enforce() )
+        self.assertEqual( [track.name for track in victims], ["mya-nee"] )
+        self.assertFalse( (self.directory / "mya-nee.webm").exists() )
+        self.assertRaises( KeyError, trackList.getTrackByFullName, "mya-nee" )
+
+        # The budget is met => nothing else is evicted
+        self.assertEqual( asyncio.run(manager.enforce()), [] )
+
+        # Evicted tracks with a url can be restored by any form of their url,
+        # until they were downloaded again (a failed download keeps the tombstone)
+        manager = CacheManager( trackList, DummyStream(), budget=6500 )
+        data = manager.restore( "https://www.youtube.com/watch?v=cSa1DJUbVSs" )
+        self.assertEqual( pathlib.Path(data["filePath"]).name, "mya-nee.webm" )
+        self.assertEqual( data["url"], "https://youtu.be/cSa1DJUbVSs" )
+        self.assertEqual( manager.restore("https://youtu.be/cSa1DJUbVSs"), data )
+        manager.forget( "https://youtu.be/cSa1DJUbVSs" )
+        self.assertEqual( manager.restore("https://youtu.be/cSa1DJUbVSs"), None )
+
+
+    def test_tombstoneWrites( self ):
+        trackList = TrackList( self.directory, DummyStream() )
+        manager = CacheManager( trackList, DummyStream(), budget=0 )
+        written = []
+        writeTombstones = manager.writeTombstones
+        manager.writeTombstones = lambda tombstones: ( written.append(len(tombstones)), writeTombstones(tombstones) )
+
+        # Changes that are saved before the pending write ran are written together
+        async def run():
+            tasks = []
+            for name in ( "explosion", "issoni_asobo", "mya-nee" ):
+                track = trackList.getTrackByFullName( name )
+                track.setURL( "https://youtu.be/{}".format(name) )
+                manager.evict( track )
+                tasks.append( manager.saveTombstones() )
+            self.assertTrue( tasks[0] is tasks[1] is tasks[2] )
+            await tasks[0]
+
+            # ... and ones saved while it runs are written by it afterwards
+            manager.forget( "https://youtu.be/mya-nee" )
+            task = manager.saveTombstones()
+            await asyncio.sleep( 0 )
+            manager._tombstones.pop( URLUtilities.cacheKey("https://youtu.be/explosion") )
+            self.assertIs( manager.saveTombstones(), task )
+            await task
+        asyncio.run( run() )
+
+        self.assertEqual( written, [3, 2, 1] )
+        self.assertFalse( (self.directory / "evicted_tracks.json.tmp").exists() )
+        self.assertEqual( CacheManager(trackList, DummyStream(), budget=0).numberOfTombstones, 1 )
+
+
+    def test_relatedFiles( self ):
+        # Copies in subdirectories count against the budget and towards the size of their tracks
+        ( self.directory / "opus_cache" ).mkdir()
+        with open( self.directory / "opus_cache" / "huge.opus", "wb" ) as file:
+            file.write( bytes(2000) )
+        trackList = TrackList( self.directory, DummyStream() )
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+
+        manager = CacheManager(
+            trackList,
+            DummyStream(),
+            budget = 8500,
+            relatedFiles = lambda track: [self.directory / "opus_cache" / (track.name + ".opus")],
+            gracePeriod = 0.0,
+            clock = lambda: time.time() + 1.0
+        )
+        self.assertEqual( manager.scan()[1], 9000 )
+
+        # ... and are deleted along with them
+        victims = asyncio.run( manager.enforce() )
+        self.assertEqual( [track.name for track in victims], ["huge"] )
+        self.assertFalse( (self.directory / "huge.webm").exists() )
+        self.assertFalse( (self.directory / "opus_cache" / "huge.opus").exists() )
+        self.assertEqual( asyncio.run(manager.enforce()), [] )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import sys
+import os
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.DirectoryWatcher import DirectoryWatcher
+from myanee.TrackList import TrackList
+from myanee.stream import DummyStream
+
+
+class TestDirectoryWatcher( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        open( self.directory / "explosion.mp3", 'w' ).close()
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    @property
+    def directory( self ):
+        return pathlib.Path( self._directory.name )
+
+
+    async def watchTrackList( self, usePolling: bool ):
+        trackList = TrackList( self.directory, DummyStream() )
+        watcher = DirectoryWatcher(
+            self.directory,
+            DummyStream(),
+            onCreated  = trackList.onFileCreated,
+            onDeleted  = trackList.onFileDeleted,
+            onMoved    = trackList.onFileMoved,
+            onOverflow = trackList.update,
+            pollInterval = 0.01,
+            usePolling = usePolling
+        )
+        await watcher.start()
+        self.assertEqual( watcher.isPolling, usePolling )
+        await asyncio.sleep( 0.05 )
+
+        try:
+            # Unfinished downloads are ignored, finished ones are registered
+            with open( self.directory / "issoni_asobo.webm.part", 'w' ) as file:
+                file.write( "data" )
+            await asyncio.sleep( 0.2 )
+            self.assertEqual( len(trackList), 1 )
+
+            os.rename( self.directory / "issoni_asobo.webm.part", self.directory / "issoni_asobo.webm" )
+            await asyncio.sleep( 0.2 )
+            self.assertNotEqual( trackList.getTrackByFilePath(self.directory / "issoni_asobo.webm"), None )
+
+            # Renamed tracks keep their properties
+            trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+            os.rename( self.directory / "explosion.mp3", self.directory / "big_explosion.mp3" )
+            await asyncio.sleep( 0.2 )
+            self.assertEqual( trackList.getTracksByPartialName("explosion")[0].name, "big_explosion" )
+            self.assertEqual( trackList.getTrackByFullName("big_explosion").dict()["playCount"], 1 )
+
+            # Deleted files are dropped
+            (self.directory / "issoni_asobo.webm").unlink()
+            await asyncio.sleep( 0.2 )
+            self.assertEqual( trackList.getTracksByPartialName("issoni"), [] )
+            self.assertEqual( len(trackList), 1 )
+        finally:
+            watcher.stop()
+
+
+    def test_polling( self ):
+        asyncio.run( self.watchTrackList(usePolling=True) )
+
+
+    @unittest.skipUnless( sys.platform.startswith("linux"), "inotify is only available on linux" )
+    def test_inotify( self ):
+        asyncio.run( self.watchTrackList(usePolling=False) )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,25 +1,151 @@
+# --- External Imports ---
+from yt_dlp.utils import DownloadCancelled
+
 # --- STL Imports ---
 import unittest
 import pathlib
+import threading
+import tempfile
+import asyncio
 import sys
 
 sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
 
 # --- Internal Imports ---
 from myanee.DownloadManager import DownloadManager
+from myanee.URLInfoCache import URLInfoCache
 from myanee.utilities import DOWNLOAD_DIR
+from myanee.stream import DummyStream
+
+
+class BlockingDownloadManager( DownloadManager ):
+    """Downloads wait until released instead of touching the network"""
+
+    def __init__( self, *args, **kwargs ):
+        DownloadManager.__init__( self, *args, **kwargs )
+        self.release   = threading.Event()
+        self.downloads = []
+        self.running   = []
+        self.overlaps  = [] # urls that were downloaded twice at the same time
+        self._counter  = threading.Lock()
+
+
+    async def download( self, url: str, filePath: pathlib.Path, settings={} ):
+        with self._counter:
+            self.downloads.append( url )
+            if url in self.running:
+                self.overlaps.append( url )
+            self.running.append( url )
+        try:
+            while not self.release.is_set():
+                if self.isCancelled( url ):
+                    raise DownloadCancelled( url )
+                await asyncio.sleep( 0.01 )
+        finally:
+            with self._counter:
+                self.running.remove( url )
 
 
-class TestDownloadManager(unittest.TestCase):
+
+
+class TestDownloadManager( unittest.TestCase ):
 
     def test_DownloadManager( self ):
-        manager = DownloadManager( logStream=sys.stderr )
-        for url, filePath in zip(self.testLinks, self.testFilePaths):
-            self.assertFalse( filePath.is_file() )
-            path = manager.enqueue( url )
+        async def run():
+            manager = DownloadManager( logStream=sys.stderr, infoCache=self.infoCache )
+            try:
+                for url, filePath in zip(self.testLinks, self.testFilePaths):
+                    self.assertFalse( filePath.is_file() )
+                    path = await manager.enqueue( url )
+
+                    self.assertEqual( path, filePath )
+                    self.assertTrue( path.is_file() )
+            finally:
+                manager.stop()
+
+        asyncio.run( run() )
+
+
+    def test_workerPool( self ):
+        async def run():
+            manager = BlockingDownloadManager( DummyStream(), numberOfWorkers=2, infoCache=self.infoCache )
+            try:
+                urls = ["https://www.youtube.com/watch?v={}".format(index) for index in range(4)]
+                futures = [await manager.request(url, filePath=DOWNLOAD_DIR / "{}.webm".format(index)) for index, url in enumerate(urls)]
+
+                # Requesting the same url again shares the download
+                self.assertIs( await manager.request(urls[0]), futures[0] )
+
+                await asyncio.sleep( 0.1 )
+                self.assertEqual( manager.numberOfActiveDownloads, 2 )
+                self.assertEqual( manager.numberOfQueuedDownloads, 2 )
+
+                # Cancel a queued and a running download
+                self.assertTrue( manager.cancel(urls[3]) )
+                self.assertTrue( manager.cancel(urls[0]) )
+                self.assertFalse( manager.cancel("https://www.youtube.com/watch?v=unknown") )
+
+                await asyncio.sleep( 0.1 )
+                manager.release.set()
+                self.assertEqual( await futures[1], DOWNLOAD_DIR / "1.webm" )
+                self.assertEqual( await futures[2], DOWNLOAD_DIR / "2.webm" )
+                self.assertTrue( futures[0].cancelled() )
+                self.assertTrue( futures[3].cancelled() )
+
+                await asyncio.sleep( 0.05 )
+                self.assertEqual( sorted(manager.downloads), sorted(urls[:3]) )
+                self.assertEqual( manager.numberOfQueuedDownloads + manager.numberOfActiveDownloads, 0 )
+            finally:
+                manager.stop()
+
+        asyncio.run( run() )
+
+
+    def test_requestAfterCancel( self ):
+        async def run():
+            manager = BlockingDownloadManager( DummyStream(), numberOfWorkers=2, infoCache=self.infoCache )
+            try:
+                url = "https://www.youtube.com/watch?v=0"
+                filePath = DOWNLOAD_DIR / "0.webm"
+                cancelled = await manager.request( url, filePath=filePath )
+                await asyncio.sleep( 0.05 )
+                self.assertEqual( manager.numberOfActiveDownloads, 1 )
+
+                # Requesting a url again right after cancelling its running download starts it over
+                # once the cancelled one was aborted, instead of both writing the same file
+                self.assertTrue( manager.cancel(url) )
+                future = await manager.request( url, filePath=filePath )
+                self.assertIsNot( future, cancelled )
+                await asyncio.sleep( 0.1 )
+                self.assertTrue( cancelled.cancelled() )
+                self.assertFalse( future.done() )
+                self.assertEqual( (manager.downloads, manager.running), ([url, url], [url]) )
+
+                manager.release.set()
+                self.assertEqual( await future, filePath )
+                self.assertEqual( manager.overlaps, [] )
+            finally:
+                manager.stop()
+
+        asyncio.run( run() )
+
+
+    def test_rateLimit( self ):
+        # The limit is split between the workers
+        manager = DownloadManager( DummyStream(), numberOfWorkers=4, infoCache=self.infoCache, rateLimit=1000000 )
+        try:
+            settings = manager.downloadSettings( self.testLinks[0], DOWNLOAD_DIR / "0.webm" )
+            self.assertEqual( settings["ratelimit"], 250000 )
+            self.assertEqual( settings["outtmpl"], str(DOWNLOAD_DIR / "0.webm") )
+        finally:
+            manager.stop()
 
-            self.assertEqual( path, filePath )
-            self.assertTrue( path.is_file() )
+
+    @property
+    def infoCache( self ):
+        if self._infoCache == None:
+            self._infoCache = URLInfoCache( pathlib.Path(self._directory.name) / "url_info.sqlite" )
+        return self._infoCache
 
 
     def clear( self ):
@@ -30,23 +156,28 @@ class TestDownloadManager(unittest.TestCase):
 
     @property
     def testFilePaths( self ):
-        return [DOWNLOAD_DIR / "mya-nee_!!!.webm"]
+        return [DOWNLOAD_DIR / "mya-nee_!!!_[cSa1DJUbVSs].webm"]
 
 
     @property
     def testLinks( self ):
         return ["https://www.youtube.com/watch?v=cSa1DJUbVSs"]
 
-    
+
     def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self._infoCache = None
         self.clear()
 
 
     def tearDown( self ):
         self.clear()
+        if self._infoCache != None:
+            self._infoCache.close()
+        self._directory.cleanup()
 
 
 
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,69 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import threading
+import time
+import os
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.GrowingFileReader import GrowingFileReader
+
+
+class TestGrowingFileReader( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def test_GrowingFileReader( self ):
+        partialPath = self.directory / "issoni_asobo.webm.part"
+        filePath    = self.directory / "issoni_asobo.webm"
+        finished    = threading.Event()
+        chunks      = [bytes([index]) * 1000 for index in range(20)]
+
+        def write():
+            """Append chunks like a download does, then rename the partial file"""
+            time.sleep( 0.05 )
+            with open( partialPath, "wb" ) as file:
+                for chunk in chunks:
+                    file.write( chunk )
+                    file.flush()
+                    time.sleep( 0.005 )
+            os.rename( partialPath, filePath )
+            finished.set()
+
+        reader = GrowingFileReader( [partialPath, filePath], isFinished=finished.is_set, pollInterval=0.001 )
+        writer = threading.Thread( target=write )
+        writer.start()
+
+        data = b""
+        while True:
+            chunk = reader.read( 4096 )
+            if not chunk:
+                break
+            data += chunk
+
+        writer.join()
+        reader.close()
+        self.assertEqual( data, b"".join(chunks) )
+
+
+    def test_timeout( self ):
+        reader = GrowingFileReader( [self.directory / "missing.webm"], isFinished=lambda: False, pollInterval=0.001, timeout=0.05 )
+        self.assertEqual( reader.read(4096), b"" )
+        reader.close()
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.fakediscord import FakeClient, FakeMessage, SilentSource
+from myanee.Guild import Guild
+from myanee.TrackList import TrackList
+from myanee.VoiceChannel import VoiceChannel
+from myanee.DownloadManager import DownloadManager
+from myanee.URLInfoCache import URLInfoCache
+from myanee.ImageCatalog import ImageCatalog
+from myanee.CacheManager import CacheManager
+from myanee.stream import DummyStream
+
+
+class TestGuild( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+        for name in ( "downloads", "audio", "images" ):
+            ( self.directory / name ).mkdir()
+        for fileName in ( "explosion.webm", "kuroko_onee-sama.webm" ):
+            open( self.directory / "downloads" / fileName, 'w' ).close()
+        with open( self.directory / "images" / "HEAL.gif", "wb" ) as file:
+            file.write( b"GIF89a" )
+
+        # Tracks play as a few frames of silence
+        self._prepare = VoiceChannel.prepare
+        VoiceChannel.prepare = staticmethod( lambda *args, **kwargs: SilentSource(3) )
+
+
+    def tearDown( self ):
+        VoiceChannel.prepare = self._prepare
+        self._directory.cleanup()
+
+
+    def test_commands( self ):
+        async def run():
+            client = FakeClient()
+            fakeGuild = client.guilds[0]
+            member = fakeGuild.addMember( "listener", voiceChannel=fakeGuild.voice_channels[0] )
+            general = fakeGuild.text_channels[0]
+
+            downloadList = TrackList( self.directory / "downloads", DummyStream() )
+            audioList = TrackList( self.directory / "audio", DummyStream() )
+            downloads = DownloadManager( DummyStream(), infoCache=URLInfoCache(self.directory / "url_info.sqlite") )
+            images = ImageCatalog( self.directory / "images", DummyStream() )
+            guild = Guild( fakeGuild, downloadList, audioList, {}, DummyStream(), downloadManager=downloads, imageCatalog=images )
+            try:
+                # Commands get a reaction, unknown ones a reply
+                message = FakeMessage( "mya-nee status", member, general )
+                await guild.onMessage( message, "status" )
+                await guild.textChannels[0].flush()
+                self.assertEqual( message.reactions, ["💖"] )
+                self.assertIn( "NO CURRENT AUDIO", general.messages[-1].content )
+
+                await guild.onMessage( FakeMessage("mya-nee hm", member, general), "hm" )
+                await guild.textChannels[0].flush()
+                self.assertIn( "Wakarimasen", general.messages[-1].content )
+
+                # Images are attached from the catalog
+                await guild.onMessage( FakeMessage("mya-nee show EA", member, general), "show EA" )
+                await guild.textChannels[0].flush()
+                self.assertEqual( (general.messages[-1].file.filename, general.messages[-1].file.fp.read()), ("HEAL.gif", b"GIF89a") )
+
+                # Playing connects to the sender's voice channel and finishes the track
+                track = downloadList.getTrackByFullName( "explosion" )
+                await guild.onMessage( FakeMessage("mya-nee play explosion", member, general), "play explosion" )
+                for index in range( 100 ):
+                    if track.playCount:
+                        break
+                    await asyncio.sleep( 0.01 )
+                self.assertEqual( track.playCount, 1 )
+            finally:
+                guild.release()
+                downloads.stop()
+                downloadList.close()
+                audioList.close()
+
+        asyncio.run( run() )
+
+
+    def test_playCommand( self ):
+        async def run():
+            client = FakeClient()
+            fakeGuild = client.guilds[0]
+            member = fakeGuild.addMember( "listener", voiceChannel=fakeGuild.voice_channels[0] )
+            general = fakeGuild.text_channels[0]
+
+            downloadList = TrackList( self.directory / "downloads", DummyStream() )
+            audioList = TrackList( self.directory / "audio", DummyStream() )
+            downloads = DownloadManager( DummyStream(), infoCache=URLInfoCache(self.directory / "url_info.sqlite") )
+            guild = Guild( fakeGuild, downloadList, audioList, {}, DummyStream(), downloadManager=downloads )
+            VoiceChannel.prepare = staticmethod( lambda *args, **kwargs: SilentSource(500) ) # still playing when checked
+
+            # Urls resolve after different delays, at most a few at a time
+            delays = { "https://example.com/{}".format(index) : 0.2 - 0.02 * index for index in range(6) }
+            active = []
+            maximum = []
+            async def downloadTrack( url: str ):
+                active.append( url )
+                maximum.append( len(active) )
+                try:
+                    await asyncio.sleep( delays[url] )
+                finally:
+                    active.remove( url )
+                if url.endswith( "5" ):
+                    raise Exception( "Video unavailable" )
+                return downloadList.getTrackByFullName( "explosion" if url.endswith("0") else "kuroko_onee-sama" )
+            guild.downloadTrack = downloadTrack
+
+            try:
+                await guild.onMessage( FakeMessage("mya-nee connect", member, general), "connect" )
+                begin = asyncio.get_running_loop().time()
+                await guild.playCommand( FakeMessage("mya-nee play", member, general), *list(delays.keys())[:5] )
+                self.assertLess( asyncio.get_running_loop().time() - begin, sum(delays.values()) )
+                self.assertEqual( max(maximum), 4 )
+
+                # The first track plays and the rest is queued in the order of the arguments
+                self.assertEqual( guild._currentTrack.name, "explosion" )
+                self.assertEqual( [track.name for track in guild._audioQueue], ["kuroko_onee-sama"] * 4 )
+
+                # A failed argument stops the command, nothing is left running
+                with self.assertRaises( Exception ):
+                    await guild.playCommand( FakeMessage("mya-nee play", member, general), *reversed(list(delays.keys())) )
+                self.assertEqual( len(guild._audioQueue), 4 )
+                self.assertEqual( active, [] )
+            finally:
+                guild.release()
+                downloads.stop()
+                downloadList.close()
+                audioList.close()
+
+        asyncio.run( run() )
+
+
+    def test_isUsingTrack( self ):
+        downloadList = TrackList( self.directory / "downloads", DummyStream() )
+        audioList = TrackList( self.directory / "audio", DummyStream() )
+        guild = Guild( FakeClient().guilds[0], downloadList, audioList, {}, DummyStream(), downloadManager=DownloadManager(DummyStream(), infoCache=URLInfoCache(self.directory / "url_info.sqlite")) )
+        track = downloadList.getTrackByFullName( "explosion" )
+        try:
+            # Prefetched tracks are protected from eviction (see CacheManager) like queued ones
+            self.assertFalse( guild.isUsingTrack(track) )
+            for attribute in ( "_currentTrack", "_nextRadioTrack", "_preparedTrack" ):
+                setattr( guild, attribute, track )
+                self.assertTrue( guild.isUsingTrack(track) )
+                setattr( guild, attribute, None )
+            guild._audioQueue.append( track )
+            self.assertTrue( guild.isUsingTrack(track) )
+        finally:
+            guild._audioQueue = []
+            guild.release()
+            guild._downloadManager.stop()
+            downloadList.close()
+            audioList.close()
+
+
+    def test_restoredDownload( self ):
+        class Downloads:
+            """Fails or writes the file right away"""
+            def __init__( self ):
+                self.fail = True
+
+            async def request( self, url: str, filePath=None ):
+                download = asyncio.get_running_loop().create_future()
+                if self.fail:
+                    download.set_exception( Exception("Video unavailable") )
+                else:
+                    open( filePath, 'w' ).close()
+                    download.set_result( filePath )
+                return download
+
+        async def run():
+            fakeGuild = FakeClient().guilds[0]
+            downloadList = TrackList( self.directory / "downloads", DummyStream() )
+            audioList = TrackList( self.directory / "audio", DummyStream() )
+            cacheManager = CacheManager( downloadList, DummyStream(), budget=0 )
+            downloads = Downloads()
+            guild = Guild( fakeGuild, downloadList, audioList, {}, DummyStream(), cacheManager=cacheManager, downloadManager=downloads )
+            guild._playbackBufferSize = None
+
+            # An evicted track keeps its statistics until it was downloaded again
+            url = "https://www.youtube.com/watch?v=cSa1DJUbVSs"
+            track = downloadList.getTrackByFullName( "explosion" )
+            track.setURL( url )
+            track.updateLastPlayed()
+            cacheManager.evict( track )
+            ( self.directory / "downloads" / "explosion.webm" ).unlink()
+            try:
+                with self.assertRaises( Exception ):
+                    await guild.downloadTrack( url )
+                self.assertEqual( cacheManager.numberOfTombstones, 1 )
+
+                downloads.fail = False
+                track = await guild.downloadTrack( url )
+                await asyncio.sleep( 0 )
+                self.assertEqual( (track.name, track.playCount), ("explosion", 1) )
+                self.assertEqual( cacheManager.numberOfTombstones, 0 )
+            finally:
+                guild.release()
+                downloadList.close()
+                audioList.close()
+
+        asyncio.run( run() )
+
+
+    def test_prefetch( self ):
+        class Source( SilentSource ):
+            """Remembers whether it was played and cleaned up"""
+            def __init__( self ):
+                SilentSource.__init__( self, 500 )
+                self.framesRead = 0
+                self.isCleanedUp = False
+
+            def read( self ):
+                self.framesRead += 1
+                return SilentSource.read( self )
+
+            def cleanup( self ):
+                self.isCleanedUp = True
+
+        sources = []
+        def prepare( *args, **kwargs ):
+            sources.append( Source() )
+            return sources[-1]
+
+        async def waitFor( condition: callable ):
+            for index in range( 100 ):
+                if condition():
+                    break
+                await asyncio.sleep( 0.01 )
+
+        async def run():
+            client = FakeClient()
+            fakeGuild = client.guilds[0]
+            member = fakeGuild.addMember( "listener", voiceChannel=fakeGuild.voice_channels[0] )
+            general = fakeGuild.text_channels[0]
+
+            downloadList = TrackList( self.directory / "downloads", DummyStream() )
+            audioList = TrackList( self.directory / "audio", DummyStream() )
+            downloads = DownloadManager( DummyStream(), infoCache=URLInfoCache(self.directory / "url_info.sqlite") )
+            guild = Guild( fakeGuild, downloadList, audioList, {}, DummyStream(), downloadManager=downloads )
+            VoiceChannel.prepare = staticmethod( prepare )
+            explosion = downloadList.getTrackByFullName( "explosion" )
+            kuroko = downloadList.getTrackByFullName( "kuroko_onee-sama" )
+
+            try:
+                # The source of the queued track is prepared while the first one plays
+                await guild.onMessage( FakeMessage("mya-nee play explosion", member, general), "play explosion" )
+                await guild.onMessage( FakeMessage("mya-nee play kuroko_onee-sama", member, general), "play kuroko_onee-sama" )
+                self.assertEqual( len(sources), 2 )
+                self.assertIs( guild._preparedTrack, kuroko )
+                self.assertEqual( sources[1].framesRead, 0 )
+
+                # Skipping plays the prepared source instead of preparing another one
+                await guild.onMessage( FakeMessage("mya-nee skip", member, general), "skip" )
+                await waitFor( lambda: sources[1].framesRead )
+                self.assertIs( guild._currentTrack, kuroko )
+                self.assertTrue( sources[0].isCleanedUp )
+                self.assertGreater( sources[1].framesRead, 0 )
+                self.assertEqual( len(sources), 2 )
+                self.assertEqual( (guild._preparedTrack, guild._preparedSource), (None, None) )
+
+                # Stopping cleans up the source prepared for the next track
+                await guild.onMessage( FakeMessage("mya-nee play explosion", member, general), "play explosion" )
+                self.assertEqual( len(sources), 3 )
+                self.assertIs( guild._preparedTrack, explosion )
+                await guild.onMessage( FakeMessage("mya-nee stop", member, general), "stop" )
+                await waitFor( lambda: sources[1].isCleanedUp )
+                self.assertEqual( (guild._preparedTrack, guild._preparedSource), (None, None) )
+                self.assertTrue( sources[2].isCleanedUp )
+                self.assertEqual( sources[2].framesRead, 0 )
+                self.assertTrue( sources[1].isCleanedUp )
+            finally:
+                guild.release()
+                downloads.stop()
+                downloadList.close()
+                audioList.close()
+
+        asyncio.run( run() )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.ImageCatalog import ImageCatalog
+from myanee.stream import DummyStream
+
+
+class TestImageCatalog( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+        for fileName, size in ( ("HEAL.gif", 100), ("cpp_sticker.png", 200), ("cpp_bad.gif", 300), ("mya-nee_approval.png", 400) ):
+            with open( self.directory / fileName, "wb" ) as file:
+                file.write( b"x" * size )
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def test_find( self ):
+        catalog = ImageCatalog( self.directory, DummyStream() )
+        self.assertEqual( len(catalog), 4 )
+
+        # Same hits as a glob over the directory
+        for pattern in ( "cpp", "HEAL", "png", "c", "cpp_*.gif", "no_such_image", "heal" ):
+            self.assertEqual(
+                sorted( catalog.find(pattern) ),
+                sorted( path.name for path in self.directory.glob("*{}*".format(pattern)) )
+            )
+
+        # Changes reported by a directory watcher
+        ( self.directory / "cpp_bad.gif" ).rename( self.directory / "bad.gif" )
+        catalog.onFileMoved( self.directory / "cpp_bad.gif", self.directory / "bad.gif" )
+        ( self.directory / "HEAL.gif" ).unlink()
+        catalog.onFileDeleted( self.directory / "HEAL.gif" )
+        open( self.directory / "cpp_new.gif", "wb" ).close()
+        catalog.onFileCreated( self.directory / "cpp_new.gif" )
+        self.assertEqual( sorted(catalog.find("cpp")), ["cpp_new.gif", "cpp_sticker.png"] )
+        self.assertEqual( catalog.find("HEAL"), [] )
+        self.assertEqual( catalog.find("bad"), ["bad.gif"] )
+
+
+    def test_cache( self ):
+        catalog = ImageCatalog( self.directory, DummyStream(), cacheSize=1200 )
+
+        # Recently read files stay in memory up to the cache size
+        self.assertEqual( catalog.read("HEAL.gif"), b"x" * 100 )
+        catalog.read( "cpp_sticker.png" )
+        catalog.read( "cpp_bad.gif" )
+        self.assertEqual( catalog.cachedBytes, 600 )
+        ( self.directory / "HEAL.gif" ).unlink()
+        self.assertEqual( catalog.read("HEAL.gif"), b"x" * 100 )
+
+        # Files too large for the cache are not kept, the least recently used ones are evicted
+        catalog.read( "mya-nee_approval.png" )
+        self.assertEqual( catalog.cachedBytes, 600 )
+        catalog.read( "cpp_sticker.png" )
+        for index in range( 4 ):
+            with open( self.directory / "other_{}.gif".format(index), "wb" ) as file:
+                file.write( b"x" * 250 )
+            catalog.onFileCreated( self.directory / "other_{}.gif".format(index) )
+            catalog.read( "other_{}.gif".format(index) )
+        self.assertEqual( catalog.cachedBytes, 200 + 4 * 250 )
+        with self.assertRaises( FileNotFoundError ):
+            catalog.read( "HEAL.gif" )
+
+        # Rewritten files are read again
+        with open( self.directory / "cpp_sticker.png", "wb" ) as file:
+            file.write( b"y" )
+        catalog.onFileCreated( self.directory / "cpp_sticker.png" )
+        self.assertEqual( asyncio.run(catalog.load("cpp_sticker.png")), b"y" )
+
+        catalog.update()
+        self.assertEqual( catalog.cachedBytes, 0 )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
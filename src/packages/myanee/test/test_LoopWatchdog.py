@@ -0,0 +1,53 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import asyncio
+import time
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.LoopWatchdog import LoopWatchdog
+from myanee.stream import DummyStream
+
+
+class Guild:
+    """Stands in for myanee.Guild, whose commands the watchdog looks for"""
+
+    async def playCommand( self ):
+        time.sleep( 0.4 ) # blocks the loop
+
+
+
+
+class TestLoopWatchdog( unittest.TestCase ):
+
+    def test_LoopWatchdog( self ):
+        watchdog = LoopWatchdog( DummyStream(), interval=0.02, threshold=0.1 )
+
+        async def run():
+            watchdog.start()
+            await asyncio.sleep( 0.2 )
+            await Guild().playCommand()
+            await asyncio.sleep( 0.2 )
+            watchdog.stop()
+        asyncio.run( run() )
+
+        # The stall is attributed to the command
+        self.assertEqual( list(watchdog.slowCommands.keys()), ["play"] )
+        count, duration = watchdog.slowCommands["play"]
+        self.assertEqual( count, 1 )
+        self.assertTrue( 0.3 < duration < 0.6 )
+
+        # Every beat is in the histogram, the stall in one of the top buckets
+        histogram = watchdog.histogram
+        self.assertTrue( 10 < sum(count for bound, count in histogram) )
+        self.assertTrue( sum(count for bound, count in histogram if 0.25 <= bound) >= 1 )
+        self.assertIn( watchdog.percentile(1.0), (0.5, 1.0) )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# --- STL Imports ---
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import math
+import os
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.LoudnessAnalyzer import LoudnessAnalyzer, measureLoudness
+from myanee.TrackList import TrackList
+from myanee.Track import Track
+from myanee.stream import DummyStream
+
+
+def fakeMeasure( filePath: str, executable: str ):
+    return None if "broken" in filePath else -8.0
+
+
+
+
+class TestLoudnessAnalyzer( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+        for fileName in ( "explosion.webm", "broken.webm" ):
+            open( self.directory / fileName, "wb" ).close()
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def test_gain( self ):
+        track = Track( self.directory / "explosion.webm", 0, volume=50 )
+        self.assertEqual( LoudnessAnalyzer.gain(track), 0.5 )
+
+        # 10 dB too loud, at half volume
+        track.setLoudness( LoudnessAnalyzer.targetLoudness + 10.0 )
+        self.assertAlmostEqual( LoudnessAnalyzer.gain(track), 0.5 * 10.0 ** -0.5 )
+
+        # Silence is not amplified without bounds, failed measurements are ignored
+        track = Track( self.directory / "explosion.webm", 0 )
+        track.setLoudness( -70.0 )
+        self.assertEqual( LoudnessAnalyzer.gain(track), LoudnessAnalyzer.maximumGain )
+        track.setLoudness( -math.inf )
+        self.assertEqual( LoudnessAnalyzer.gain(track), 1.0 )
+
+
+    def test_analyze( self ):
+        trackList = TrackList( self.directory, DummyStream() )
+        trackList.getTrackByFullName( "explosion" ).setLoudness( -20.0 )
+
+        async def run():
+            with ThreadPoolExecutor( max_workers=1 ) as executor:
+                analyzer = LoudnessAnalyzer( trackList, DummyStream(), executor=executor, measure=fakeMeasure )
+                analyzer.start()
+
+                # Added tracks are measured too, measured ones are not measured again
+                open( self.directory / "mya-nee.webm", "wb" ).close()
+                trackList.onFileCreated( self.directory / "mya-nee.webm" )
+                while analyzer.numberOfPendingTracks or any( not track.hasLoudness() for track in trackList.tracks ):
+                    await asyncio.sleep( 0.01 )
+
+                # Downloads are listed before they are complete, and measured once they are
+                download = Track( self.directory / "download.webm", 0 )
+                trackList.addTrack( download )
+                await asyncio.sleep( 0.05 )
+                self.assertFalse( download.hasLoudness() )
+                open( self.directory / "download.webm.part", "wb" ).close()
+                ( self.directory / "download.webm.part" ).rename( self.directory / "download.webm" )
+                trackList.onFileMoved( self.directory / "download.webm.part", self.directory / "download.webm" )
+                while not download.hasLoudness():
+                    await asyncio.sleep( 0.01 )
+                analyzer.stop()
+        asyncio.run( run() )
+
+        self.assertEqual( trackList.getTrackByFullName("explosion").loudness, -20.0 )
+        self.assertEqual( trackList.getTrackByFullName("mya-nee").loudness, -8.0 )
+        self.assertEqual( trackList.getTrackByFullName("broken").loudness, -math.inf )
+        self.assertEqual( trackList.getTrackByFullName("download").loudness, -8.0 )
+
+        # Results are persisted
+        self.assertEqual( TrackList(self.directory, DummyStream()).getTrackByFullName("mya-nee").loudness, -8.0 )
+
+
+    @unittest.skipUnless( LoudnessAnalyzer.isSupported(), "requires ffmpeg" )
+    def test_measureLoudness( self ):
+        os.system( "ffmpeg -v error -y -f lavfi -i sine=duration=3 -c:a libvorbis {}".format(self.directory / "sine.webm") )
+        self.assertTrue( -30.0 < measureLoudness(str(self.directory / "sine.webm")) < 0.0 )
+        self.assertEqual( measureLoudness(str(self.directory / "broken.webm")), None )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import struct
+import time
+import os
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.OpusCache import OpusCache, OggOpusSource
+from myanee.TrackList import TrackList
+from myanee.stream import DummyStream
+
+
+def writeOgg( filePath: pathlib.Path, packets: list ):
+    """Write each packet to a separate ogg page (checksums are not verified by the parser)"""
+    with open( filePath, "wb" ) as file:
+        for index, packet in enumerate( packets ):
+            segments = [255] * (len(packet) // 255) + [len(packet) % 255]
+            file.write( b"OggS" + struct.pack("<BBQIIIB", 0, 0, index, 1, index, 0, len(segments)) )
+            file.write( bytes(segments) + packet )
+
+
+
+
+class TestOpusCache( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+        open( self.directory / "explosion.webm", "wb" ).close()
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def test_OggOpusSource( self ):
+        packets = [b"\xfc" + bytes([index]) * (100 + 100 * index) for index in range(5)]
+        writeOgg( self.directory / "explosion.opus", [b"OpusHead" + bytes(11), b"OpusTags" + bytes(8)] + packets )
+
+        # Headers are skipped, audio packets are passed through as they are
+        source = OggOpusSource( self.directory / "explosion.opus" )
+        self.assertTrue( source.is_opus() )
+        self.assertEqual( [source.read() for index in range(6)], packets + [b""] )
+        source.cleanup()
+
+        self.assertTrue( OpusCache.isPlayable(self.directory / "explosion.opus") )
+        writeOgg( self.directory / "explosion.ogg", [b"\x01vorbis"] )
+        self.assertFalse( OpusCache.isPlayable(self.directory / "explosion.ogg") )
+
+
+    def test_packetDuration( self ):
+        # 20 ms in total: one 20 ms CELT, SILK or hybrid frame, two 10 ms frames or four 5 ms frames
+        for packet in ( b"\xfc", b"\x08", b"\x78", b"\xf1", b"\xeb\x04" ):
+            self.assertEqual( OpusCache.getPacketDuration(packet), OpusCache.packetDuration )
+        self.assertEqual( OpusCache.getPacketDuration(b"\xf0"), 480 )  # 10 ms
+        self.assertEqual( OpusCache.getPacketDuration(b"\x18"), 2880 ) # 60 ms
+        self.assertEqual( OpusCache.getPacketDuration(b""), 0 )
+
+        # Remuxed files with other packet durations are not played as they are
+        header = [b"OpusHead" + bytes(11), b"OpusTags" + bytes(8)]
+        writeOgg( self.directory / "explosion.opus", header + [b"\xfc" + bytes(100)] * 3 )
+        self.assertTrue( OpusCache.isPlayable(self.directory / "explosion.opus") )
+        writeOgg( self.directory / "explosion.opus", header + [b"\xfc" + bytes(100), b"\x18" + bytes(100)] )
+        self.assertFalse( OpusCache.isPlayable(self.directory / "explosion.opus") )
+
+
+    def test_cache( self ):
+        trackList = TrackList( self.directory, DummyStream() )
+        cache = OpusCache( trackList, DummyStream() )
+        track = trackList.getTrackByFullName( "explosion" )
+
+        # The cache directory is not a track
+        trackList.update()
+        self.assertEqual( len(trackList), 1 )
+        self.assertEqual( cache.get(track), None )
+
+        # Copies that are older than their source are outdated
+        writeOgg( cache.cachePath(track), [b"OpusHead"] )
+        self.assertEqual( cache.get(track), cache.cachePath(track) )
+        os.utime( cache.cachePath(track), (time.time() - 100, time.time() - 100) )
+        self.assertEqual( cache.get(track), None )
+
+        # Copies are deleted along with their tracks
+        async def run():
+            cache.start()
+            trackList.removeTrack( track )
+            cache.stop()
+        asyncio.run( run() )
+        self.assertFalse( cache.cachePath(track).exists() )
+
+
+    @unittest.skipUnless( OpusCache.isSupported(), "requires ffmpeg" )
+    def test_convert( self ):
+        os.system( "ffmpeg -v error -y -f lavfi -i sine=duration=1 -c:a libvorbis {}".format(self.directory / "sine.webm") )
+        trackList = TrackList( self.directory, DummyStream() )
+        cache = OpusCache( trackList, DummyStream() )
+        track = trackList.getTrackByFullName( "sine" )
+
+        async def run():
+            cache.start()
+            await cache.convert( track )
+            cache.stop()
+        asyncio.run( run() )
+
+        self.assertTrue( OpusCache.isPlayable(cache.get(track)) )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
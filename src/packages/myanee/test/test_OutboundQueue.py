@@ -0,0 +1,108 @@
+# --- External Imports ---
+import discord
+
+# --- STL Imports ---
+import threading
+import unittest
+import types
+import pathlib
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.OutboundQueue import OutboundQueue, RateLimitBucket
+from myanee.stream import DummyStream
+
+
+class TestOutboundQueue( unittest.TestCase ):
+
+    def setUp( self ):
+        self.sent = []
+        self.failures = []
+
+
+    async def send( self, content=None, **kwargs ):
+        if self.failures:
+            raise self.failures.pop( 0 )
+        self.sent.append( (content, kwargs) )
+
+
+    def test_coalescing( self ):
+        async def run():
+            outbound = OutboundQueue( self.send, DummyStream(), bucket=RateLimitBucket(capacity=1, period=0.05) )
+
+            # A burst ends up in one message, messages with files keep their place
+            for index in range( 3 ):
+                outbound.post( "line {}".format(index) )
+            outbound.postMessage( "image", file="file" )
+            outbound.post( "line 3" )
+            await outbound.flush()
+            self.assertEqual( self.sent, [
+                ("```line 0\nline 1\nline 2```", {}),
+                ("image", {"file" : "file"}),
+                ("```line 3```", {})
+            ] )
+
+            # Texts are packed and split within the length limit
+            self.sent = []
+            outbound.post( "a" * 1500 )
+            outbound.post( "b" * 1500 )
+            outbound.post( "\n".join(["c" * 900] * 3) )
+            await outbound.flush()
+            self.assertEqual( [content for content, kwargs in self.sent], [
+                "```" + "a" * 1500 + "```",
+                "```" + "b" * 1500 + "```",
+                "```" + "c" * 900 + "\n" + "c" * 900 + "```",
+                "```" + "c" * 900 + "```"
+            ] )
+            self.assertTrue( all(len(content) <= OutboundQueue.limit for content, kwargs in self.sent) )
+
+        asyncio.run( run() )
+
+
+    def test_rateLimit( self ):
+        async def run():
+            outbound = OutboundQueue( self.send, DummyStream(), bucket=RateLimitBucket(capacity=5, period=5.0) )
+
+            # Discord's answer holds the queue back, the message is retried afterwards
+            response = types.SimpleNamespace( status=429, reason="Too Many Requests", headers={"Retry-After" : "0.05"} )
+            self.failures = [ discord.HTTPException(response, "You are being rate limited.") ]
+            outbound.post( "first" )
+            await asyncio.sleep( 0.01 )
+            self.assertEqual( (self.sent, len(outbound)), ([], 1) )
+            await outbound.flush()
+            self.assertEqual( self.sent, [("```first```", {})] )
+
+            # Other errors are logged and the message is dropped
+            self.sent = []
+            self.failures = [ Exception("no permission") ]
+            outbound.post( "second" )
+            outbound.postMessage( "third" )
+            await outbound.flush()
+            self.assertEqual( self.sent, [("third", {})] )
+
+        asyncio.run( run() )
+
+
+    def test_threads( self ):
+        # Log lines from other threads are sent on the event loop
+        async def run():
+            outbound = OutboundQueue( self.send, DummyStream() )
+            thread = threading.Thread( target=outbound.post, args=("from a thread",) )
+            thread.start()
+            thread.join()
+            for index in range( 100 ):
+                if self.sent:
+                    break
+                await asyncio.sleep( 0.01 )
+            self.assertEqual( self.sent, [("```from a thread```", {})] )
+
+        asyncio.run( run() )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
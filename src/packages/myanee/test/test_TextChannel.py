@@ -0,0 +1,52 @@
+# --- External Imports ---
+import discord
+
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.fakediscord import FakeClient
+from myanee.TextChannel import TextChannel
+
+
+class TestTextChannel( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def test_attachments( self ):
+        async def run():
+            general = FakeClient().guilds[0].text_channels[0]
+            channel = TextChannel( general )
+
+            # Files may be closed right after queueing the message
+            with open( self.directory / "HEAL.gif", "wb" ) as file:
+                file.write( b"GIF89a" )
+            with open( self.directory / "HEAL.gif", "rb" ) as file:
+                await channel.send( "besto radio", file=discord.File(file) )
+            self.assertEqual( general.messages, [] )
+
+            await channel.flush()
+            message = general.messages[-1]
+            self.assertEqual( message.content, "```besto radio```" )
+            self.assertEqual( (pathlib.Path(message.file.filename).name, message.file.fp.read()), ("HEAL.gif", b"GIF89a") )
+
+        asyncio.run( run() )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,7 @@ sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # n
 
 # --- Internal Imports ---
 from myanee.Track import Track
+from myanee.TrackColumns import TrackColumns, ColumnTrack
 from myanee.utilities import SOURCE_DIR
 
 
@@ -34,6 +35,29 @@ class TestTrack(unittest.TestCase):
         self.assertEqual( track.volume, 100 )
 
 
+    def test_ColumnTrack( self ):
+        columns = TrackColumns()
+        formatted = Track.formatDateTime( Track.defaultDateTime() )
+        tracks = [ ColumnTrack(columns, self.trackPath, formatted, playCount=index, volume=50+index) for index in range(3) ]
+        self.assertEqual( len(columns), 3 )
+
+        track = tracks[1]
+        self.assertEqual( track.lastPlayed, Track.defaultDateTime() )
+        self.assertEqual( track.playCount, 1 )
+        self.assertEqual( track.volume, 51 )
+        self.assertEqual( track.name, "mya-nee_!!!" )
+
+        # Updates go to the columns
+        track.updateLastPlayed()
+        self.assertEqual( columns.playCount[1], 2 )
+        self.assertEqual( columns.lastPlayed[1], track.lastPlayedTimeStamp )
+        self.assertEqual( columns.playCount[0], 0 )
+
+        # Same serialized form as a regular track
+        self.assertEqual( ColumnTrack.fromDict(columns, track.dict()).dict(), Track.fromDict(track.dict()).dict() )
+        self.assertEqual( track.dict()["volume"], "51" )
+
+
     @property
     def trackPath( self ):
         return SOURCE_DIR / "mya-nee_!!!.webm"
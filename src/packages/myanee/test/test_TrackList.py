@@ -1,32 +1,151 @@
 # --- STL Imports ---
 import unittest
 import pathlib
+import tempfile
 import sys
-import datetime
 
 sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
 
 # --- Internal Imports ---
 from myanee.TrackList import TrackList
-from myanee.utilities import DOWNLOAD_DIR
+from myanee.Track import Track
+from myanee.stream import DummyStream
 
 
 class TestTrackList( unittest.TestCase ):
 
     def setUp( self ):
-        pass
+        self._directory = tempfile.TemporaryDirectory()
+        for fileName in self.fileNames:
+            open( self.directory / fileName, 'w' ).close()
 
 
     def tearDown( self ):
-        pass
+        self._directory.cleanup()
+
+
+    @property
+    def directory( self ):
+        return pathlib.Path( self._directory.name )
+
+
+    @property
+    def fileNames( self ):
+        return ["mya-nee_!!!.webm", "kuroko_onee-sama_0.mp3", "kuroko_onee-sama_1.mp3", "explosion.mp3"]
 
 
     def test_TrackList( self ):
-        # TODO
-        trackList = TrackList( DOWNLOAD_DIR, sys.stderr )
+        trackList = TrackList( self.directory, DummyStream() )
+        self.assertEqual( len(trackList), len(self.fileNames) )
+
+        # Lookup by file path
+        for fileName in self.fileNames:
+            track = trackList.getTrackByFilePath( self.directory / fileName )
+            self.assertNotEqual( track, None )
+            self.assertEqual( track.filePath, self.directory / fileName )
+        self.assertEqual( trackList.getTrackByFilePath(self.directory / "missing.mp3"), None )
+
+        # Lookup by partial name (long and short queries)
+        self.assertEqual(
+            sorted( track.name for track in trackList.getTracksByPartialName("onee-sama") ),
+            ["kuroko_onee-sama_0", "kuroko_onee-sama_1"]
+        )
+        self.assertEqual(
+            sorted( track.name for track in trackList.getTracksByPartialName("_1") ),
+            ["kuroko_onee-sama_1"]
+        )
+        self.assertEqual( trackList.getTracksByPartialName("nonexistent"), [] )
+
+        # Lookup by url
+        url = "https://www.youtube.com/watch?v=cSa1DJUbVSs"
+        open( self.directory / "downloaded.webm", 'w' ).close()
+        track = Track(
+            self.directory / "downloaded.webm",
+            Track.formatDateTime( Track.defaultDateTime() ),
+            url = url
+        )
+        trackList.addTrack( track )
+        self.assertIs( trackList.getTrackByURL(url), track )
+        self.assertIs( trackList.getTrackByURL("https://youtu.be/cSa1DJUbVSs?t=30"), track )
+        self.assertEqual( trackList.getTrackByURL("https://www.youtube.com/watch?v=none"), None )
+        self.assertRaises( Exception, trackList.addTrack, track )
+
+        # Removed files get dropped from every index
+        (self.directory / "downloaded.webm").unlink()
+        trackList.update()
+        self.assertEqual( trackList.getTrackByURL(url), None )
+        self.assertEqual( trackList.getTrackByFilePath(self.directory / "downloaded.webm"), None )
+        self.assertEqual( trackList.getTracksByPartialName("downloaded"), [] )
+
+
+    def test_persistence( self ):
+        trackList = TrackList( self.directory, DummyStream() )
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.writeToFile()
+
+        reloaded = TrackList( self.directory, DummyStream() )
+        self.assertEqual( len(reloaded), len(self.fileNames) )
+        self.assertEqual(
+            reloaded.getTrackByFullName( "explosion" ).formattedLastPlayed,
+            trackList.getTrackByFullName( "explosion" ).formattedLastPlayed
+        )
+        self.assertEqual( len(reloaded.getTracksByPartialName("explosion")), 1 )
+
+
+    def test_sharedURL( self ):
+        # Tracks with the same url stay findable by it when the first of them is removed,
+        # also after the indexes were rebuilt from a snapshot
+        for useSnapshot in ( False, True ):
+            trackList = TrackList( self.directory, DummyStream(), useSnapshot=useSnapshot )
+            for index, name in enumerate( ("kuroko_onee-sama_0", "kuroko_onee-sama_1", "explosion") ):
+                trackList.getTrackByFullName( name ).setURL( ("https://youtu.be/cSa1DJUbVSs", "https://www.youtube.com/watch?v=cSa1DJUbVSs")[index % 2] )
+            if useSnapshot:
+                trackList.close()
+                trackList = TrackList( self.directory, DummyStream(), useSnapshot=useSnapshot )
+
+            url = "https://youtu.be/cSa1DJUbVSs"
+            names = set()
+            while trackList.getTrackByURL( url ) != None:
+                track = trackList.getTrackByURL( url )
+                names.add( track.name )
+                trackList.removeTrack( track )
+            self.assertEqual( names, {"kuroko_onee-sama_0", "kuroko_onee-sama_1", "explosion"} )
+            trackList.close()
+
+
+
+    def test_rowRecycling( self ):
+        # Files that come and go in a long running process don't grow the columns
+        for useSnapshot in ( False, True ):
+            trackList = TrackList( self.directory, DummyStream(), columnar=True, useSnapshot=useSnapshot )
+            rows = len( trackList.columns )
+            for index in range( 20 ):
+                filePath = self.directory / "clip_{}.mp3".format( index )
+                open( filePath, 'w' ).close()
+                trackList.onFileCreated( filePath )
+                track = trackList.getTrackByFilePath( filePath )
+                track.updateLastPlayed()
+                filePath.unlink()
+                trackList.onFileDeleted( filePath )
+
+                # Removed tracks keep their fields
+                self.assertEqual( track.playCount, 1 )
+            self.assertLessEqual( len(trackList.columns), rows + 1 )
+
+            # Reused rows start out empty and don't affect the other tracks
+            track = trackList.getTrackByFullName( "explosion" )
+            playCount = track.playCount
+            filePath = self.directory / "clip.mp3"
+            open( filePath, 'w' ).close()
+            trackList.onFileCreated( filePath )
+            self.assertEqual( trackList.getTrackByFilePath(filePath).playCount, 0 )
+            self.assertEqual( track.playCount, playCount )
+            filePath.unlink()
+            trackList.onFileDeleted( filePath )
+            trackList.close()
 
 
 
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,117 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import datetime
+import collections
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.TrackSampler import TrackSampler, FenwickTree
+from myanee.TrackList import TrackList
+from myanee.Track import Track
+from myanee.stream import DummyStream
+
+
+class TestTrackSampler( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self._time = datetime.datetime.now().timestamp()
+        self.trackList = TrackList( self.directory, DummyStream() )
+        for index in range(10):
+            self.trackList.addTrack( Track(
+                self.directory / "track_{}.mp3".format(index),
+                Track.formatDateTime( Track.defaultDateTime() )
+            ) )
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    @property
+    def directory( self ):
+        return pathlib.Path( self._directory.name )
+
+
+    def clock( self ):
+        return self._time
+
+
+    def makeSampler( self, **kwargs ):
+        return TrackSampler( self.trackList, datetime.timedelta(days=2), clock=self.clock, **kwargs )
+
+
+    def test_FenwickTree( self ):
+        weights = [1.0, 0.0, 2.0, 3.0, 0.0, 4.0]
+        tree = FenwickTree( weights )
+        self.assertEqual( tree.total, 10.0 )
+        self.assertEqual( tree.prefixSum(3), 3.0 )
+        self.assertEqual( [tree.find(value) for value in (0.0, 0.5, 1.0, 2.9, 3.0, 5.9, 6.0, 9.9)], [0, 0, 2, 2, 3, 3, 5, 5] )
+
+        tree.add( 1, 5.0 )
+        self.assertEqual( tree.total, 15.0 )
+        self.assertEqual( tree.find(1.0), 1 )
+
+
+    def test_eligibility( self ):
+        sampler = self.makeSampler()
+        self.assertEqual( sampler.numberOfEligibleTracks, 10 )
+
+        # Played tracks are ineligible until the rule expires
+        track = self.trackList.getTrackByFullName( "track_3" )
+        track.updateLastPlayed()
+        self.assertEqual( sampler.numberOfEligibleTracks, 9 )
+        for _ in range(100):
+            self.assertIsNot( sampler.sample(), track )
+
+        self._time += datetime.timedelta( days=3 ).total_seconds()
+        self.assertEqual( sampler.numberOfEligibleTracks, 10 )
+
+        # Queued tracks are excluded until they leave the queue
+        sampler.exclude( track )
+        sampler.exclude( track )
+        sampler.include( track )
+        self.assertTrue( sampler.isExcluded(track) )
+        self.assertEqual( sampler.numberOfEligibleTracks, 9 )
+        sampler.include( track )
+        self.assertEqual( sampler.numberOfEligibleTracks, 10 )
+
+        # Added and removed tracks
+        self.trackList.addTrack( Track(self.directory / "new.mp3", Track.formatDateTime(Track.defaultDateTime())) )
+        self.assertEqual( sampler.numberOfEligibleTracks, 11 )
+        for index in range(8):
+            self.trackList.removeTrack( self.trackList.getTrackByFullName("track_{}".format(index)) )
+        self.assertEqual( sampler.numberOfEligibleTracks, 3 )
+        self.assertEqual( {track.name for track in sampler.sampleBatch(10)}, {"track_8", "track_9", "new"} )
+
+
+    def test_sampleBatch( self ):
+        sampler = self.makeSampler()
+        for _ in range(20):
+            batch = sampler.sampleBatch( 4 )
+            self.assertEqual( len(batch), 4 )
+            self.assertEqual( len({track.name for track in batch}), 4 )
+        self.assertEqual( len(sampler.sampleBatch(100)), 10 )
+
+        for track in self.trackList.tracks:
+            track.updateLastPlayed()
+        self.assertEqual( sampler.sample(), None )
+
+
+    def test_distribution( self ):
+        # Weighted sampling: track_0 has twice the weight of the rest
+        sampler = self.makeSampler( weightFunction=lambda track: 2.0 if track.name == "track_0" else 1.0 )
+        counts = collections.Counter( sampler.sample().name for _ in range(11000) )
+        self.assertEqual( len(counts), 10 )
+        self.assertAlmostEqual( counts["track_0"] / 11000, 2 / 11, delta=0.02 )
+        self.assertAlmostEqual( counts["track_5"] / 11000, 1 / 11, delta=0.02 )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.URLInfoCache import URLInfoCache
+from myanee.DownloadManager import DownloadManager
+from myanee.stream import DummyStream
+
+
+class TestURLInfoCache( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.time = 1000.0
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def makeCache( self ):
+        return URLInfoCache( pathlib.Path(self._directory.name) / "url_info.sqlite", timeToLive=60, clock=lambda: self.time )
+
+
+    def test_URLInfoCache( self ):
+        cache = self.makeCache()
+        info = cache.set( "https://youtu.be/cSa1DJUbVSs", {"id" : "cSa1DJUbVSs", "title" : "mya-nee !!!", "ext" : "webm", "formats" : [{}] * 20} )
+        self.assertEqual( set(info.keys()), set(URLInfoCache.fields) )
+        cache.close()
+
+        # Persistent and shared between the forms of a link
+        cache = self.makeCache()
+        self.assertEqual( cache.get("https://www.youtube.com/watch?v=cSa1DJUbVSs&t=1"), info )
+
+        # Expired entries are missing
+        self.time += 61
+        self.assertEqual( cache.get("https://youtu.be/cSa1DJUbVSs"), None )
+        cache.close()
+
+
+    def test_singleFlight( self ):
+        cache = self.makeCache()
+        queries = []
+
+        class Manager( DownloadManager ):
+            async def extractInfo( manager, url: str ):
+                queries.append( url )
+                return cache.set( url, {"id" : "cSa1DJUbVSs", "title" : "Mya-nee !!!", "ext" : "webm"} )
+
+        async def run():
+            manager = Manager( DummyStream(), infoCache=cache )
+            try:
+                paths = await asyncio.gather( *[manager.urlToFilePath("https://youtu.be/cSa1DJUbVSs") for index in range(5)] )
+                self.assertEqual( len(set(paths)), 1 )
+                self.assertEqual( paths[0].name, "mya-nee_!!!_[cSa1DJUbVSs].webm" )
+
+                # Cached => no further queries
+                await manager.urlToFilePath( "https://www.youtube.com/watch?v=cSa1DJUbVSs" )
+                self.assertEqual( len(queries), 1 )
+            finally:
+                manager.stop()
+
+        asyncio.run( run() )
+        cache.close()
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
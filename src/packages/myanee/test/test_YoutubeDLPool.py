@@ -0,0 +1,64 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import asyncio
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.YoutubeDLPool import YoutubeDLPool
+
+
+class TestYoutubeDLPool( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+        with open( self.directory / "explosion.webm", "wb" ) as file:
+            file.write( bytes(100000) )
+
+        # Local files instead of the network
+        self.settings = { "quiet" : True, "noprogress" : True, "enable_file_urls" : True }
+        self.url = (self.directory / "explosion.webm").as_uri()
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def test_YoutubeDLPool( self ):
+        async def run():
+            pool = YoutubeDLPool( numberOfProcesses=1 )
+            try:
+                info = await pool.extract( self.url, self.settings )
+                self.assertEqual( (info["title"], info["ext"]), ("explosion", "webm") )
+
+                # Progress is forwarded from the worker process
+                events = []
+                await pool.download( self.url, dict(self.settings, outtmpl=str(self.directory / "copy.webm")), onProgress=events.append )
+                self.assertEqual( (self.directory / "copy.webm").stat().st_size, 100000 )
+                self.assertEqual( events[-1]["status"], "finished" )
+
+                # Errors are raised in the main process and the worker stays usable
+                with self.assertRaises( Exception ):
+                    await pool.extract( "not a url", self.settings )
+
+                # An abandoned request takes its process down, which is replaced
+                task = asyncio.ensure_future( pool.extract(self.url, self.settings) )
+                await asyncio.sleep( 0 )
+                task.cancel()
+                with self.assertRaises( asyncio.CancelledError ):
+                    await task
+                self.assertEqual( (await pool.extract(self.url, self.settings))["id"], "explosion" )
+            finally:
+                pool.stop()
+
+        asyncio.run( run() )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
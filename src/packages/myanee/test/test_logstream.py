@@ -0,0 +1,118 @@
+# --- STL Imports ---
+import threading
+import unittest
+import pathlib
+import tempfile
+import gzip
+import json
+import io
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.logstream import LogWriter, ConsoleSink, RotatingFileSink, RateLimiter
+from myanee.stream import StreamMultiplex, DEBUG, WARNING
+from myanee.Loggee import Loggee
+
+
+class TestLogStream( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path( self._directory.name )
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    def readRecords( self, filePath: pathlib.Path ):
+        opener = gzip.open if filePath.suffix == ".gz" else open
+        with opener( filePath, "rt" ) as file:
+            return [ json.loads(line) for line in file ]
+
+
+    def test_LogWriter( self ):
+        console = io.StringIO()
+        writer = LogWriter( [
+            ConsoleSink( console, level=WARNING ),
+            RotatingFileSink( self.directory / "log.jsonl", level=DEBUG )
+        ] )
+
+        # Loggees keep working through a multiplex, their fields are kept in the file
+        loggee = Loggee( StreamMultiplex(writer), name="Guild" )
+        loggee.log( "Register command 'play'", command="play" )
+        loggee.debug( "details" )
+        with self.assertRaises( Exception ):
+            loggee.error( "No active voice channel!" )
+        writer.close()
+
+        records = self.readRecords( self.directory / "log.jsonl" )
+        self.assertEqual( [record["level"] for record in records], ["INFO", "DEBUG", "ERROR"] )
+        self.assertEqual( (records[0]["name"], records[0]["command"]), ("Guild", "play") )
+
+        # The console only gets what's severe enough
+        self.assertEqual( console.getvalue(), "[Guild] ERROR: No active voice channel!\n" )
+
+
+    def test_rotation( self ):
+        filePath = self.directory / "log.jsonl"
+        sink = RotatingFileSink( filePath, maxBytes=200, backupCount=2 )
+        writer = LogWriter( [sink] )
+        loggee = Loggee( writer, name="test" )
+        for index in range( 12 ):
+            loggee.log( "message {}".format(index) )
+            writer.flush()
+        writer.close()
+
+        # Older files are compressed, the oldest ones are dropped
+        self.assertEqual( sorted(path.name for path in self.directory.iterdir()), ["log.jsonl", "log.jsonl.1.gz", "log.jsonl.2.gz"] )
+        messages = [ record["message"] for name in ("log.jsonl.2.gz", "log.jsonl.1.gz", "log.jsonl") for record in self.readRecords(self.directory / name) ]
+        self.assertEqual( messages, [ "message {}".format(index) for index in range(12 - len(messages), 12) ] )
+        self.assertTrue( all(path.stat().st_size <= 200 for path in self.directory.iterdir() if path.suffix != ".gz") )
+
+
+    def test_rateLimit( self ):
+        now = [0.0]
+        limiter = RateLimiter( burst=2, interval=10.0, clock=lambda: now[0] )
+        self.assertEqual( [limiter.check("spam") for index in range(4)], [(True, 0), (True, 0), (False, 0), (False, 0)] )
+        self.assertEqual( limiter.check("other"), (True, 0) )
+
+        # The next interval reports how many were suppressed
+        now[0] = 10.0
+        self.assertEqual( limiter.check("spam"), (True, 2) )
+
+        console = io.StringIO()
+        writer = LogWriter( [ConsoleSink(console)], rateLimiter=RateLimiter(burst=1, interval=10.0, clock=lambda: now[0]) )
+        for index in range( 3 ):
+            writer.write( "spam\n" )
+        now[0] = 20.0
+        writer.write( "spam\n" )
+        writer.close()
+        self.assertEqual( console.getvalue(), "spam\nspam (2 repeats suppressed)\n" )
+
+
+    def test_overflow( self ):
+        # Records are dropped instead of blocking while the queue is full
+        class SlowSink( ConsoleSink ):
+            def write( sink, record: dict ):
+                self.assertTrue( release.wait(5) )
+                ConsoleSink.write( sink, record )
+
+        release = threading.Event()
+        console = io.StringIO()
+        writer = LogWriter( [SlowSink(console)], capacity=2, rateLimiter=RateLimiter(burst=100) )
+        for index in range( 10 ):
+            writer.write( "message {}".format(index) )
+        release.set()
+        writer.close()
+
+        self.assertTrue( 0 < writer.dropped )
+        self.assertIn( "[LogWriter] WARNING: dropped {} records\n".format(writer.dropped), console.getvalue() )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# --- STL Imports ---
+import urllib.request
+import urllib.error
+import unittest
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.metrics import Registry, MetricsServer
+
+
+class TestMetrics( unittest.TestCase ):
+
+    def test_render( self ):
+        registry = Registry()
+        commands = registry.counter( "commands_total", "Commands run", ("command",) )
+        commands.inc( command="play" )
+        commands.inc( 2, command='say "hi"' )
+        self.assertIs( registry.counter("commands_total", "Commands run", ("command",)), commands )
+        with self.assertRaises( KeyError ):
+            commands.inc( guild="x" )
+        with self.assertRaises( TypeError ):
+            registry.gauge( "commands_total", "Commands run" )
+
+        # Gauge functions are evaluated when rendering
+        queue = []
+        registry.gauge( "queue_length", "Queued items" ).setFunction( lambda: len(queue) )
+        queue.append( 1 )
+
+        self.assertEqual( registry.render(), "\n".join( [
+            "# HELP commands_total Commands run",
+            "# TYPE commands_total counter",
+            'commands_total{command="play"} 1',
+            'commands_total{command="say \\"hi\\""} 2',
+            "# HELP queue_length Queued items",
+            "# TYPE queue_length gauge",
+            "queue_length 1"
+        ] ) + "\n" )
+
+
+    def test_histogram( self ):
+        histogram = Registry().histogram( "latency_seconds", "Latency", buckets=(0.1, 1.0) )
+        for value in ( 0.05, 0.1, 0.5, 5.0 ):
+            histogram.observe( value )
+
+        self.assertEqual( histogram.count(), 4 )
+        self.assertEqual( histogram.render().split("\n")[2:], [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            "latency_seconds_sum 5.65",
+            "latency_seconds_count 4"
+        ] )
+
+
+    def test_MetricsServer( self ):
+        registry = Registry()
+        registry.counter( "requests_total", "Requests" ).inc()
+        server = MetricsServer( registry, 0 )
+        server.start()
+        try:
+            url = "http://127.0.0.1:{}".format( server.port )
+            with urllib.request.urlopen( url + "/metrics" ) as response:
+                self.assertTrue( response.headers["Content-Type"].startswith("text/plain; version=0.0.4") )
+                self.assertIn( "requests_total 1", response.read().decode() )
+
+            with self.assertRaises( urllib.error.HTTPError ):
+                urllib.request.urlopen( url + "/other" )
+        finally:
+            server.stop()
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
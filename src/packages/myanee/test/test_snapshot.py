@@ -0,0 +1,148 @@
+# --- STL Imports ---
+import unittest
+import datetime
+import math
+import pathlib
+import tempfile
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.snapshot import TrackSnapshot
+from myanee.storage import SQLiteTrackStorage
+from myanee.TrackList import TrackList
+from myanee.TrackSampler import TrackSampler
+from myanee.stream import DummyStream
+
+
+class TestTrackSnapshot( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        for fileName in self.fileNames:
+            open( self.directory / fileName, 'w' ).close()
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    @property
+    def directory( self ):
+        return pathlib.Path( self._directory.name )
+
+
+    @property
+    def fileNames( self ):
+        return ["explosion.mp3", "issoni_asobo.mp3", "kuroko_onee-sama_0.mp3", "kuroko_onee-sama_1.mp3"]
+
+
+    def makeTrackList( self, **kwargs ):
+        storage = SQLiteTrackStorage( self.directory / "track_list.sqlite" )
+        return TrackList( self.directory, DummyStream(), storage=storage, useSnapshot=True, **kwargs )
+
+
+    def test_readWrite( self ):
+        rows = [
+            ( "a", "/some/dir", "a.mp3", "", 100, 1, 100.0, math.nan ),
+            ( "b", "/some/dir", "b.webm", "https://www.youtube.com/watch?v=cSa1DJUbVSs", 200, 2, 50.0, -14.5 ),
+            ( "c", "/other/dir", "c.mp3", "", 300, 3, 75.5, -math.inf )
+        ]
+        TrackSnapshot.fromRows( 42, rows ).write( self.directory / "test.snapshot" )
+        snapshot = TrackSnapshot.read( self.directory / "test.snapshot" )
+
+        self.assertEqual( snapshot.revision, 42 )
+        self.assertEqual( snapshot.names, ["a", "b", "c"] )
+        self.assertEqual( snapshot.urls, ["", "https://www.youtube.com/watch?v=cSa1DJUbVSs", ""] )
+        self.assertEqual( snapshot.directories, ["/some/dir", "/other/dir"] )
+        self.assertEqual( snapshot.filePathString(2), "/other/dir/c.mp3" )
+        self.assertEqual( list(snapshot.columns.lastPlayed), [100, 200, 300] )
+        self.assertEqual( list(snapshot.columns.playCount), [1, 2, 3] )
+        self.assertEqual( list(snapshot.columns.volume), [100.0, 50.0, 75.5] )
+        self.assertTrue( math.isnan(snapshot.columns.loudness[0]) )
+        self.assertEqual( list(snapshot.columns.loudness[1:]), [-14.5, -math.inf] )
+
+        # Single empty url, no tracks, garbage
+        snapshot = TrackSnapshot.fromRows( 0, rows[:1] )
+        snapshot.write( self.directory / "test.snapshot" )
+        self.assertEqual( TrackSnapshot.read(self.directory / "test.snapshot").urls, [""] )
+        TrackSnapshot.fromRows( 0, [] ).write( self.directory / "test.snapshot" )
+        self.assertEqual( len(TrackSnapshot.read(self.directory / "test.snapshot")), 0 )
+        with open( self.directory / "test.snapshot", "wb" ) as file:
+            file.write( b"garbage" )
+        self.assertEqual( TrackSnapshot.read(self.directory / "test.snapshot"), None )
+        self.assertEqual( TrackSnapshot.read(self.directory / "missing.snapshot"), None )
+
+
+    def test_lazyLoading( self ):
+        for columnar in (False, True):
+            trackList = self.makeTrackList( columnar=columnar )
+            trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+            trackList.close()
+            self.assertTrue( trackList.snapshotPath.is_file() )
+
+            # Loading from the snapshot creates no tracks
+            trackList = self.makeTrackList( columnar=columnar )
+            self.assertEqual( len(trackList), len(self.fileNames) )
+            self.assertEqual( trackList._tracks.numberOfPendingRows, len(self.fileNames) )
+
+            # Tracks are created on access and behave like loaded ones
+            track = trackList.getTrackByFilePath( self.directory / "explosion.mp3" )
+            self.assertEqual( track.playCount, 1 )
+            self.assertEqual( len(trackList.getTracksByPartialName("onee-sama")), 2 )
+            self.assertEqual( trackList._tracks.numberOfPendingRows, 1 )
+
+            track.updateLastPlayed()
+            (self.directory / "issoni_asobo.mp3").unlink()
+            trackList.update()
+            trackList.close()
+
+            trackList = self.makeTrackList( columnar=columnar )
+            self.assertEqual( trackList.getTrackByFullName("explosion").playCount, 2 )
+            self.assertEqual( len(trackList), len(self.fileNames) - 1 )
+            trackList.close()
+
+            open( self.directory / "issoni_asobo.mp3", 'w' ).close()
+            (self.directory / "track_list.snapshot").unlink()
+            (self.directory / "track_list.sqlite").unlink()
+
+
+    def test_lazySampling( self ):
+        trackList = self.makeTrackList( columnar=True )
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.close()
+
+        # The sampler is built from the rows, only drawn tracks are created
+        trackList = self.makeTrackList( columnar=True )
+        sampler = TrackSampler( trackList, datetime.timedelta(days=2) )
+        self.assertEqual( trackList._tracks.numberOfPendingRows, len(self.fileNames) )
+        self.assertEqual( sampler.numberOfEligibleTracks, len(self.fileNames) - 1 )
+
+        track = sampler.sample()
+        self.assertNotEqual( track.name, "explosion" )
+        self.assertIs( track, trackList.getTrackByFullName(track.name) )
+        self.assertEqual( trackList._tracks.numberOfPendingRows, len(self.fileNames) - 1 )
+        sampler.close()
+        trackList.close()
+
+
+    def test_outdatedSnapshot( self ):
+        trackList = self.makeTrackList()
+        trackList.close()
+
+        # Changes that bypass the snapshot invalidate it
+        trackList = TrackList( self.directory, DummyStream(), storage=SQLiteTrackStorage(self.directory / "track_list.sqlite") )
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.close()
+
+        trackList = self.makeTrackList()
+        self.assertEqual( trackList._tracks.numberOfPendingRows, 0 )
+        self.assertEqual( trackList.getTrackByFullName("explosion").playCount, 1 )
+        trackList.close()
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+# --- STL Imports ---
+import unittest
+import pathlib
+import tempfile
+import sqlite3
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
+
+# --- Internal Imports ---
+from myanee.storage import JSONTrackStorage, SQLiteTrackStorage
+from myanee.TrackList import TrackList
+from myanee.stream import DummyStream
+
+
+class TestSQLiteTrackStorage( unittest.TestCase ):
+
+    def setUp( self ):
+        self._directory = tempfile.TemporaryDirectory()
+        for fileName in ["explosion.mp3", "issoni_asobo.mp3"]:
+            open( self.directory / fileName, 'w' ).close()
+
+
+    def tearDown( self ):
+        self._directory.cleanup()
+
+
+    @property
+    def directory( self ):
+        return pathlib.Path( self._directory.name )
+
+
+    def makeTrackList( self ):
+        storage = SQLiteTrackStorage(
+            self.directory / "track_list.sqlite",
+            jsonFilePath = self.directory / "track_list.json"
+        )
+        return TrackList( self.directory, DummyStream(), storage=storage )
+
+
+    def test_migration( self ):
+        # Write a json track list the old way
+        trackList = TrackList( self.directory, DummyStream(), storage=JSONTrackStorage(self.directory / "track_list.json") )
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.writeToFile()
+        lastPlayed = trackList.getTrackByFullName( "explosion" ).formattedLastPlayed
+
+        trackList = self.makeTrackList()
+        self.assertEqual( len(trackList), 2 )
+        self.assertEqual( trackList.getTrackByFullName("explosion").formattedLastPlayed, lastPlayed )
+
+        # The migration happens only once
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.getTrackByFullName( "explosion" ).updateLastPlayed()
+        trackList.close()
+
+        trackList = self.makeTrackList()
+        self.assertEqual( trackList.getTrackByFullName("explosion").dict()["playCount"], 3 )
+        trackList.close()
+
+        # The storage files are not tracks
+        self.assertEqual( trackList.getTracksByPartialName("track_list"), [] )
+
+
+    def test_incrementalWrite( self ):
+        trackList = self.makeTrackList()
+        trackList.writeToFile()
+        connection = trackList.storage._connection
+
+        # Nothing changed => nothing written
+        changes = connection.total_changes
+        trackList.writeToFile()
+        self.assertEqual( connection.total_changes, changes )
+
+        # Only the updated row (and the revision of the storage) is written
+        revision = trackList.storage.revision
+        trackList.getTrackByFullName( "issoni_asobo" ).updateLastPlayed()
+        trackList.writeToFile()
+        self.assertEqual( connection.total_changes, changes + 2 )
+        self.assertEqual( trackList.storage.revision, revision + 1 )
+
+        # Removed tracks are deleted
+        (self.directory / "explosion.mp3").unlink()
+        trackList.update()
+        trackList.writeToFile()
+        self.assertEqual( set(trackList.storage.load().keys()), {"issoni_asobo"} )
+        trackList.close()
+
+
+    def test_schemaUpgrade( self ):
+        # A database from before tracks had a loudness
+        connection = sqlite3.connect( self.directory / "track_list.sqlite" )
+        with connection:
+            connection.execute( "CREATE TABLE tracks (name TEXT PRIMARY KEY, filePath, lastPlayed, playCount, url, volume)" )
+            connection.execute( "INSERT INTO tracks VALUES ('explosion', ?, '01-01-2020_00:00', 2, '', 100)", (str(self.directory / "explosion.mp3"),) )
+        connection.close()
+
+        trackList = TrackList( self.directory, DummyStream(), storage=SQLiteTrackStorage(self.directory / "track_list.sqlite") )
+        track = trackList.getTrackByFullName( "explosion" )
+        self.assertEqual( track.playCount, 2 )
+        self.assertFalse( track.hasLoudness() )
+
+        track.setLoudness( -12.5 )
+        trackList.close()
+        self.assertEqual( SQLiteTrackStorage(self.directory / "track_list.sqlite").load()["explosion"]["loudness"], "-12.5" )
+
+
+
+
+if __name__ == "__main__":
+    unittest.main()
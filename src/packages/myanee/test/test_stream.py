@@ -1,12 +1,14 @@
 # --- STL Imports ---
 import unittest
 import pathlib
+import io
 import sys
 
 sys.path.append(str(pathlib.Path(__file__).absolute().parent.parent.parent)) # needed to run this script directly
 
 # --- Internal Imports ---
 from myanee.stream import StreamWrapper, StreamMultiplex
+from myanee.Loggee import Loggee
 
 
 class TestStreams( unittest.TestCase ):
@@ -56,6 +58,15 @@ class TestStreams( unittest.TestCase ):
         self.assertTrue( "1:tents;" in self._test )
 
 
+    def test_textStream( self ):
+        # Loggees also log to plain text streams (e.g.: sys.stderr)
+        stream = io.StringIO()
+        loggee = Loggee( stream, name="DownloadManager" )
+        loggee.log( "started" )
+        loggee.warning( "slow" )
+        self.assertEqual( stream.getvalue(), "[DownloadManager] started\n[DownloadManager] WARNING: slow\n" )
+
+
 
 
 if __name__ == "__main__":
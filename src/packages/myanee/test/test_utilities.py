@@ -30,6 +30,30 @@ class TestUtilities(unittest.TestCase):
             self.assertFalse(URLUtilities.isURL(string), msg=string)
 
 
+    def test_canonicalize(self):
+        canonical = "https://www.youtube.com/watch?v=cSa1DJUbVSs"
+        for url in [
+            canonical,
+            "https://youtube.com/watch?v=cSa1DJUbVSs&t=42",
+            "https://m.youtube.com/watch?feature=share&v=cSa1DJUbVSs",
+            "https://youtu.be/cSa1DJUbVSs",
+            "https://www.youtube.com/shorts/cSa1DJUbVSs",
+            " https://www.youtube.com/embed/cSa1DJUbVSs ",
+            "https://www.youtube.com/watch?v=cSa1DJUbVSs&list=PL0123456789&index=3",
+            "youtu.be/cSa1DJUbVSs?t=30"
+        ]:
+            self.assertEqual(URLUtilities.canonicalize(url), canonical, msg=url)
+            self.assertEqual(URLUtilities.videoKey(url), ("youtube", "cSa1DJUbVSs"), msg=url)
+            self.assertEqual(URLUtilities.cacheKey(url), "youtube:cSa1DJUbVSs", msg=url)
+
+        # Different videos, playlists and other sites
+        self.assertNotEqual(URLUtilities.cacheKey("https://youtu.be/cSa1DJUbVSt"), URLUtilities.cacheKey(canonical))
+        self.assertEqual(URLUtilities.videoKey("https://www.youtube.com/playlist?list=PL0123456789"), None)
+        self.assertEqual(URLUtilities.videoKey("https://www.youtube.com/watch?v=cSa1DJUbVSsX"), None)
+
+        self.assertEqual(URLUtilities.canonicalize("https://example.com/a?b=c"), "https://example.com/a?b=c")
+
+
     def test_chunks(self):
         baseList = [i for i in range(10)]
 
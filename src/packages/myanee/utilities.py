@@ -1,6 +1,7 @@
 # --- STL Imports ---
 import pathlib
 from urllib.parse import urlparse
+import multiprocessing
 import random
 import re
 
@@ -43,6 +44,41 @@ class URLUtilities:
         else:
             return url.group(0)
 
+    # Extractor => pattern of its video links, capturing the video id
+    _videoPatterns = {
+        "youtube" : re.compile(
+            r"^(?:https?://)?(?:(?:www|m|music)\.)?(?:(?:youtube(?:-nocookie)?\.com/(?:watch/?\?(?:[^#]*&)?v=|shorts/|embed/|live/|v/))|youtu\.be/)([A-Z0-9_-]{11})(?![A-Z0-9_-])",
+            re.IGNORECASE
+        )
+    }
+
+    # Extractor => canonical link of a video id
+    _canonicalFormats = {
+        "youtube" : "https://www.youtube.com/watch?v={}"
+    }
+
+    @staticmethod
+    def videoKey(url: str):
+        """Return the (extractor, video id) pair of a video link, or None if the url is not recognized"""
+        url = url.strip()
+        for extractor, pattern in URLUtilities._videoPatterns.items():
+            match = pattern.match(url)
+            if match is not None:
+                return (extractor, match.group(1))
+        return None
+
+    @staticmethod
+    def cacheKey(url: str):
+        """String that is shared by all forms of a video link ("extractor:id"), or the url itself if it is not recognized"""
+        key = URLUtilities.videoKey(url)
+        return "{}:{}".format(*key) if key is not None else url.strip()
+
+    @staticmethod
+    def canonicalize(url: str):
+        """Map the different forms of a video link to a single one, leave other urls as they are"""
+        key = URLUtilities.videoKey(url)
+        return URLUtilities._canonicalFormats[key[0]].format(key[1]) if key is not None else url.strip()
+
     @staticmethod
     def isURL(string: str):
         """Return True if the provided string is a valid URL"""
@@ -85,4 +121,12 @@ def stringChunks(items, prefixGenerator=indexGenerator, postfixGenerator=newLine
 def randomItem(items: list):
     """Return a random item from a list"""
     if items:
-        return items[ random.randint(0, len(items)-1) ]
\ No newline at end of file
+        return items[ random.randint(0, len(items)-1) ]
+
+
+def processContext():
+    """Multiprocessing context that starts workers from a clean process (forkserver, or spawn where it's unavailable).
+    Forking copies the locks held by the threads of this process (log writer, watchers, voice players),
+    which can deadlock the children."""
+    startMethod = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(startMethod)